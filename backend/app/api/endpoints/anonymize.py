@@ -3,19 +3,76 @@ Endpoint de anonimizacion de imagenes.
 """
 
 from fastapi import APIRouter, UploadFile, File, HTTPException, Form
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response
+from app.core.config import settings
+from app.core.tracing import traced
 from app.services.image_processor import get_image_processor
-import cv2
+from app.services.jpeg_region import get_jpeg_region_encoder
+from app.api.endpoints.classes import parse_class_ids
 import numpy as np
-import io
+import json
 import logging
-from typing import Literal
+from typing import BinaryIO, Literal, Optional, Tuple
 
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+def _encode_image(image: np.ndarray, filename: str) -> Tuple[memoryview, str]:
+    """
+    Codifica la imagen anonimizada manteniendo el formato original.
+
+    Devuelve el buffer de cv2.imencode sin copiarlo a bytes.
+
+    Args:
+        image: Imagen a codificar (BGR)
+        filename: Nombre del archivo original
+
+    Returns:
+        Tupla (buffer codificado, media type)
+
+    Raises:
+        HTTPException: Si no se puede codificar la imagen
+    """
+    try:
+        return get_image_processor().encode_image_buffer(image, filename)
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@traced("image.region_reencode")
+def _encode_jpeg_regions(
+    fileobj: BinaryIO,
+    filename: str,
+    image: np.ndarray,
+    detections: dict
+) -> Optional[bytes]:
+    """
+    Intenta recodificar solo las regiones anonimizadas de un JPEG.
+
+    Args:
+        fileobj: Fichero de subida con el JPEG original
+        filename: Nombre del archivo original
+        image: Imagen anonimizada (BGR)
+        detections: Detecciones por tipo (x1, y1, x2, y2, confidence)
+
+    Returns:
+        JPEG resultante o None si hay que recodificar la imagen completa
+    """
+    if not settings.JPEG_REGION_REENCODE or filename.lower().endswith('.png'):
+        return None
+
+    encoder = get_jpeg_region_encoder()
+    if not encoder.available:
+        return None
+
+    boxes = [det[:4] for dets in detections.values() for det in dets]
+
+    fileobj.seek(0)
+    return encoder.encode(fileobj.read(), image, boxes)
+
+
 @router.post("/anonymize", tags=["Anonymization"])
 async def anonymize_image(
     file: UploadFile = File(..., description="Imagen a anonimizar"),
@@ -24,7 +81,16 @@ async def anonymize_image(
     method: Literal["blur", "pixelate", "mask"] = Form("blur", description="Metodo de anonimizacion"),
     confidence_threshold: float = Form(0.25, ge=0.0, le=1.0, description="Umbral de confianza"),
     blur_kernel_size: int = Form(99, description="Tamano del kernel para blur"),
-    pixelate_blocks: int = Form(10, description="Numero de bloques para pixelacion")
+    pixelate_blocks: int = Form(10, description="Numero de bloques para pixelacion"),
+    imgsz: Optional[int] = Form(
+        None, ge=32, le=4096, description="Tamano de entrada del detector (ej: 320, 480, 640)"
+    ),
+    adaptive: bool = Form(
+        False, description="Deteccion en dos pasadas (baja resolucion + refinado)"
+    ),
+    region_reencode: bool = Form(
+        True, description="En JPEG, recodificar solo los bloques anonimizados"
+    )
 ):
     """
     Anonimiza rostros y/o matriculas en una imagen.
@@ -37,6 +103,11 @@ async def anonymize_image(
         confidence_threshold: Umbral de confianza para detecciones
         blur_kernel_size: Tamano del kernel para Gaussian Blur
         pixelate_blocks: Numero de bloques para pixelacion
+        imgsz: Tamano de entrada del detector (None = el configurado)
+        adaptive: Si usar deteccion adaptativa (se ignora imgsz)
+        region_reencode: Si el original es un JPEG baseline y jpegtran esta
+                         disponible, sustituir solo los bloques MCU de las
+                         regiones anonimizadas (el resto queda identico)
 
     Returns:
         Imagen anonimizada (formato original)
@@ -45,51 +116,40 @@ async def anonymize_image(
         HTTPException: Si hay error procesando la imagen
     """
     try:
-        # Leer imagen
-        contents = await file.read()
-
         # Obtener procesador
         processor = get_image_processor()
 
+        # Decodificar directamente desde el fichero de subida (sin copia a bytes)
+        image, _ = processor.decode_upload(file.file)
+
         # Procesar imagen
-        result_image, metadata = processor.process_image_bytes(
-            contents,
+        result_image, metadata = processor.process_image(
+            image,
             detect_faces=detect_faces,
             detect_plates=detect_plates,
             anonymization_method=method,
             confidence_threshold=confidence_threshold,
             blur_kernel_size=blur_kernel_size,
-            pixelate_blocks=pixelate_blocks
+            pixelate_blocks=pixelate_blocks,
+            imgsz=imgsz,
+            adaptive=adaptive
         )
 
-        logger.info(f"Imagen procesada: {metadata}")
+        logger.debug(f"Imagen procesada: {metadata}")
 
-        # Codificar imagen de vuelta a bytes
-        # Intentar mantener el formato original
-        ext = file.filename.split('.')[-1].lower() if '.' in file.filename else 'jpg'
+        # Codificar imagen de vuelta (manteniendo el formato original). En JPEG
+        # se intenta recodificar solo las regiones anonimizadas
+        image_bytes = None
+        if region_reencode:
+            image_bytes = _encode_jpeg_regions(
+                file.file, file.filename, result_image, metadata['detections']
+            )
 
-        if ext in ['jpg', 'jpeg']:
-            encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 95]
-            success, encoded_image = cv2.imencode('.jpg', result_image, encode_param)
+        region_encoded = image_bytes is not None
+        if region_encoded:
             media_type = 'image/jpeg'
-        elif ext == 'png':
-            encode_param = [int(cv2.IMWRITE_PNG_COMPRESSION), 3]
-            success, encoded_image = cv2.imencode('.png', result_image, encode_param)
-            media_type = 'image/png'
         else:
-            # Por defecto, usar JPEG
-            encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 95]
-            success, encoded_image = cv2.imencode('.jpg', result_image, encode_param)
-            media_type = 'image/jpeg'
-
-        if not success:
-            raise HTTPException(
-                status_code=500,
-                detail="Error al codificar la imagen anonimizada"
-            )
-
-        # Convertir a bytes
-        image_bytes = encoded_image.tobytes()
+            image_bytes, media_type = _encode_image(result_image, file.filename)
 
         # Crear nombre de archivo de salida
         output_filename = f"anonymized_{file.filename}"
@@ -101,12 +161,16 @@ async def anonymize_image(
             'X-Plates-Detected': str(metadata['plates_detected']),
             'X-Total-Detections': str(metadata['total_detections']),
             'X-Processing-Time-Ms': str(metadata['processing_time_ms']),
-            'X-Anonymization-Method': metadata['anonymization_method']
+            'X-Anonymization-Method': metadata['anonymization_method'],
+            'X-Region-Reencode': str(region_encoded).lower()
         }
+        if 'adaptive' in metadata:
+            headers['X-Adaptive-Refined'] = str(metadata['adaptive']['refined']).lower()
+            headers['X-Refine-Rate'] = str(metadata['adaptive']['refine_rate'])
 
-        # Devolver imagen como stream
-        return StreamingResponse(
-            io.BytesIO(image_bytes),
+        # Devolver el buffer codificado sin copias intermedias
+        return Response(
+            content=image_bytes,
             media_type=media_type,
             headers=headers
         )
@@ -119,3 +183,90 @@ async def anonymize_image(
             status_code=500,
             detail=f"Error procesando imagen: {str(e)}"
         )
+
+
+@router.post("/anonymize/classes", tags=["Anonymization"])
+async def anonymize_image_classes(
+    file: UploadFile = File(..., description="Imagen a anonimizar"),
+    classes: str = Form(
+        "face,plate", description="Ids de clase separados por comas (ver /api/classes)"
+    ),
+    method: Literal["blur", "pixelate", "mask"] = Form(
+        "blur", description="Metodo de anonimizacion"
+    ),
+    confidence_threshold: float = Form(0.25, ge=0.0, le=1.0, description="Umbral de confianza"),
+    blur_kernel_size: int = Form(99, description="Tamano del kernel para blur"),
+    pixelate_blocks: int = Form(10, description="Numero de bloques para pixelacion"),
+    imgsz: Optional[int] = Form(
+        None, ge=32, le=4096, description="Tamano de entrada del detector (ej: 320, 480, 640)"
+    )
+):
+    """
+    Anonimiza solo las clases indicadas del catalogo /api/classes.
+
+    Solo se invocan los modelos necesarios: si se piden unicamente
+    'face'/'plate' no se usa el modelo COCO.
+
+    Args:
+        file: Archivo de imagen
+        classes: Ids de clase separados por comas (ej: "face,plate,cell_phone")
+        method: Metodo de anonimizacion ('blur', 'pixelate', 'mask')
+        confidence_threshold: Umbral de confianza para detecciones
+        blur_kernel_size: Tamano del kernel para Gaussian Blur
+        pixelate_blocks: Numero de bloques para pixelacion
+        imgsz: Tamano de entrada del detector (None = el configurado)
+
+    Returns:
+        Imagen anonimizada (formato original)
+
+    Raises:
+        HTTPException: Si las clases no son validas o hay error procesando
+    """
+    class_ids = parse_class_ids(classes)
+
+    try:
+        processor = get_image_processor()
+
+        image, _ = processor.decode_upload(file.file)
+        result_image, metadata = processor.process_image_classes(
+            image,
+            class_ids,
+            anonymization_method=method,
+            confidence_threshold=confidence_threshold,
+            blur_kernel_size=blur_kernel_size,
+            pixelate_blocks=pixelate_blocks,
+            imgsz=imgsz
+        )
+
+        logger.debug(
+            f"Imagen procesada por clases: {metadata['detections_by_class']} "
+            f"(modelos: {metadata['models_used']})"
+        )
+
+        image_bytes, media_type = _encode_image(result_image, file.filename)
+
+        headers = {
+            'Content-Disposition': f'attachment; filename="anonymized_{file.filename}"',
+            'X-Total-Detections': str(metadata['total_detections']),
+            'X-Detections-By-Class': json.dumps(metadata['detections_by_class']),
+            'X-Models-Used': ",".join(metadata['models_used']),
+            'X-Processing-Time-Ms': str(metadata['processing_time_ms']),
+            'X-Anonymization-Method': metadata['anonymization_method']
+        }
+
+        return Response(
+            content=image_bytes,
+            media_type=media_type,
+            headers=headers
+        )
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error en anonimizacion por clases: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error procesando imagen: {str(e)}"
+        )
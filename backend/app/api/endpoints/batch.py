@@ -0,0 +1,141 @@
+"""
+Endpoint de anonimizacion de imagenes por lotes.
+"""
+
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from app.core.config import settings
+from app.services.batch_processor import (
+    count_zip_images,
+    get_batch_processor,
+    iter_zip_images,
+    iter_file_images,
+)
+from pathlib import Path
+from typing import Iterator, List, Literal, Optional
+import logging
+import shutil
+import tempfile
+
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+def _stage_upload(upload: UploadFile, destination: Path) -> None:
+    """Copia un archivo subido a disco por bloques, sin cargarlo entero en memoria."""
+    upload.file.seek(0)
+    with open(destination, "wb") as f:
+        shutil.copyfileobj(upload.file, f, length=1024 * 1024)
+
+
+@router.post("/anonymize/batch", tags=["Anonymization"])
+async def anonymize_batch(
+    archive: Optional[UploadFile] = File(None, description="Archivo ZIP con imagenes"),
+    files: Optional[List[UploadFile]] = File(None, description="Lista de imagenes"),
+    detect_faces: bool = Form(True, description="Detectar rostros"),
+    detect_plates: bool = Form(True, description="Detectar matriculas"),
+    method: Literal["blur", "pixelate", "mask"] = Form(
+        "blur", description="Metodo de anonimizacion"
+    ),
+    confidence_threshold: float = Form(0.25, ge=0.0, le=1.0, description="Umbral de confianza"),
+    blur_kernel_size: int = Form(99, description="Tamano del kernel para blur"),
+    pixelate_blocks: int = Form(10, description="Numero de bloques para pixelacion"),
+    imgsz: Optional[int] = Form(
+        None, ge=32, le=4096, description="Tamano de entrada del detector (ej: 320, 480, 640)"
+    )
+):
+    """
+    Anonimiza un lote de imagenes y devuelve un ZIP en streaming.
+
+    El ZIP de salida contiene las imagenes anonimizadas (mismo nombre y
+    formato) y un manifest.json con las detecciones de cada imagen.
+
+    Args:
+        archive: Archivo ZIP con imagenes (alternativa a files)
+        files: Lista de imagenes (alternativa a archive)
+        detect_faces: Si detectar rostros
+        detect_plates: Si detectar matriculas
+        method: Metodo de anonimizacion ('blur', 'pixelate', 'mask')
+        confidence_threshold: Umbral de confianza para detecciones
+        blur_kernel_size: Tamano del kernel para Gaussian Blur
+        pixelate_blocks: Numero de bloques para pixelacion
+        imgsz: Tamano de entrada del detector (None = el configurado)
+
+    Returns:
+        ZIP con imagenes anonimizadas y manifiesto (streaming)
+
+    Raises:
+        HTTPException: Si no se recibe ningun archivo, el ZIP no es valido o
+            hay mas de BATCH_MAX_FILES imagenes
+    """
+    if archive is None and not files:
+        raise HTTPException(
+            status_code=400,
+            detail="Debe enviarse un archivo ZIP (archive) o una lista de imagenes (files)"
+        )
+
+    if files and len(files) > settings.BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Demasiadas imagenes (maximo {settings.BATCH_MAX_FILES})"
+        )
+
+    # Los archivos subidos se cierran al terminar el endpoint, antes de que
+    # se consuma el stream de respuesta: se copian a un directorio temporal
+    # propio que se elimina al terminar el streaming.
+    staging_dir = Path(tempfile.mkdtemp(prefix="batch_", dir=settings.TEMP_DIR))
+
+    try:
+        if archive is not None:
+            archive_path = staging_dir / "input.zip"
+            await run_in_threadpool(_stage_upload, archive, archive_path)
+            # Validar el ZIP y su numero de imagenes antes de empezar a responder
+            count = await run_in_threadpool(count_zip_images, archive_path)
+            if count > settings.BATCH_MAX_FILES:
+                raise ValueError(f"Demasiadas imagenes (maximo {settings.BATCH_MAX_FILES})")
+            items = iter_zip_images(archive_path)
+        else:
+            staged = []
+            for index, upload in enumerate(files):
+                path = staging_dir / f"{index:06d}{Path(upload.filename or '').suffix}"
+                await run_in_threadpool(_stage_upload, upload, path)
+                staged.append((upload.filename or path.name, path))
+            items = iter_file_images(staged)
+
+    except ValueError as e:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    processor = get_batch_processor()
+
+    def stream() -> Iterator[bytes]:
+        try:
+            yield from processor.process_stream(
+                items,
+                detect_faces=detect_faces,
+                detect_plates=detect_plates,
+                anonymization_method=method,
+                confidence_threshold=confidence_threshold,
+                blur_kernel_size=blur_kernel_size,
+                pixelate_blocks=pixelate_blocks,
+                imgsz=imgsz
+            )
+        except Exception as e:
+            logger.error(f"Error en anonimizacion por lotes: {e}", exc_info=True)
+            raise
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    return StreamingResponse(
+        stream(),
+        media_type="application/zip",
+        headers={
+            'Content-Disposition': 'attachment; filename="anonymized_batch.zip"',
+            'X-Anonymization-Method': method
+        }
+    )
@@ -3,7 +3,7 @@ Classes Endpoints
 Endpoints para obtener información sobre clases disponibles para detección
 """
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from typing import Dict, List
 import logging
 
@@ -155,6 +155,43 @@ RGPD_CLASSES = {
 }
 
 
+def parse_class_ids(raw: str) -> List[str]:
+    """
+    Valida una lista de ids de clase recibida en una peticion.
+
+    Args:
+        raw: Ids separados por comas (ej: "face,plate,cell_phone")
+
+    Returns:
+        Lista de ids validos, sin duplicados y en el orden recibido
+
+    Raises:
+        HTTPException: Si la lista esta vacia o contiene ids desconocidos
+    """
+    known_ids = {
+        cls["id"] for category in RGPD_CLASSES.values()
+        for cls in category
+    }
+
+    class_ids = []
+    for class_id in raw.split(","):
+        class_id = class_id.strip()
+        if class_id and class_id not in class_ids:
+            class_ids.append(class_id)
+
+    if not class_ids:
+        raise HTTPException(status_code=400, detail="Debe indicarse al menos una clase")
+
+    unknown = [class_id for class_id in class_ids if class_id not in known_ids]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Clases no soportadas: {', '.join(unknown)}. Consulta /api/classes"
+        )
+
+    return class_ids
+
+
 @router.get("/classes")
 async def get_available_classes():
     """
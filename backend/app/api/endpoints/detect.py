@@ -2,11 +2,17 @@
 Endpoint de deteccion de rostros y matriculas.
 """
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form
-from app.schemas.detection import DetectionResponse, BoundingBox
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Request
+from app.schemas.detection import DetectionResponse, BoundingBox, ClassDetectionResponse
 from app.models import get_face_detector, get_plate_detector
-import cv2
-import numpy as np
+from app.models.unified_detector import get_unified_detector
+from app.services.image_processor import get_image_processor
+from app.api.endpoints.classes import parse_class_ids
+from app.core.config import settings
+from app.core.serialization import (
+    JSON_MEDIA_TYPE, FAST_JSON_MEDIA_TYPE, FastJSONResponse, box_dicts, negotiate, render_boxes
+)
+from app.utils.boxes import scale_detections
 import time
 import logging
 from typing import Optional
@@ -18,10 +24,15 @@ router = APIRouter()
 
 @router.post("/detect", response_model=DetectionResponse, tags=["Detection"])
 async def detect_objects(
+    request: Request,
     file: UploadFile = File(..., description="Imagen a procesar"),
     detect_faces: bool = Form(True, description="Detectar rostros"),
     detect_plates: bool = Form(True, description="Detectar matriculas"),
-    confidence_threshold: float = Form(0.25, ge=0.0, le=1.0, description="Umbral de confianza")
+    confidence_threshold: float = Form(0.25, ge=0.0, le=1.0, description="Umbral de confianza"),
+    imgsz: Optional[int] = Form(
+        None, ge=32, le=4096, description="Tamano de entrada del detector (ej: 320, 480, 640)"
+    ),
+    adaptive: bool = Form(False, description="Deteccion en dos pasadas con el detector unificado")
 ):
     """
     Detecta rostros y/o matriculas en una imagen.
@@ -31,9 +42,14 @@ async def detect_objects(
         detect_faces: Si se deben detectar rostros
         detect_plates: Si se deben detectar matriculas
         confidence_threshold: Umbral minimo de confianza para detecciones
+        imgsz: Tamano de entrada del detector (None = el configurado)
+        adaptive: Si usar deteccion adaptativa del detector unificado
+                  (pasada rapida a baja resolucion y refinado solo si hace falta)
 
     Returns:
-        DetectionResponse con las detecciones encontradas
+        DetectionResponse con las detecciones encontradas. Segun la cabecera
+        Accept tambien puede devolverse en JSON rapido, compacto o NDJSON
+        (ver app.core.serialization)
 
     Raises:
         HTTPException: Si hay error procesando la imagen
@@ -41,68 +57,80 @@ async def detect_objects(
     start_time = time.time()
 
     try:
-        # Leer imagen
-        contents = await file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-        if image is None:
+        # Decodificar desde el fichero de subida. Solo se detecta, asi que los
+        # JPEG grandes se decodifican reducidos (salvo en modo adaptativo, que
+        # refina sobre recortes a resolucion completa)
+        max_side = None if adaptive else (imgsz or settings.INFERENCE_IMGSZ)
+        try:
+            image, scale = get_image_processor().decode_upload(file.file, max_side=max_side)
+        except ValueError:
             raise HTTPException(
                 status_code=400,
                 detail="No se pudo decodificar la imagen. Formato invalido."
             )
 
-        logger.info(f"Imagen recibida: {image.shape}")
-
-        faces = []
-        plates = []
+        logger.debug(f"Imagen recibida: {image.shape} (escala {scale:.2f})")
 
-        # Detectar rostros
-        if detect_faces:
-            face_detector = get_face_detector()
-            face_detector.confidence = confidence_threshold
+        detections = {'faces': [], 'plates': []}
+        adaptive_info = None
 
-            face_detections = face_detector.detect(image)
-
-            for x1, y1, x2, y2, conf in face_detections:
-                faces.append(BoundingBox(
-                    x1=x1,
-                    y1=y1,
-                    x2=x2,
-                    y2=y2,
-                    confidence=conf,
-                    class_name="face"
-                ))
+        if adaptive:
+            unified_detector = get_unified_detector()
+            unified_detector.confidence = confidence_threshold
 
-            logger.info(f"Detectados {len(faces)} rostros")
+            detections, adaptive_info = unified_detector.detect_adaptive(
+                image,
+                detect_faces=detect_faces,
+                detect_plates=detect_plates
+            )
 
-        # Detectar matriculas
-        if detect_plates:
-            plate_detector = get_plate_detector()
-            plate_detector.confidence = confidence_threshold
+        else:
+            # Detectar rostros
+            if detect_faces:
+                face_detector = get_face_detector()
+                face_detector.confidence = confidence_threshold
+                detections['faces'] = face_detector.detect(image, imgsz=imgsz)
 
-            plate_detections = plate_detector.detect(image)
+            # Detectar matriculas
+            if detect_plates:
+                plate_detector = get_plate_detector()
+                plate_detector.confidence = confidence_threshold
+                detections['plates'] = plate_detector.detect(image, imgsz=imgsz)
 
-            for x1, y1, x2, y2, conf in plate_detections:
-                plates.append(BoundingBox(
-                    x1=x1,
-                    y1=y1,
-                    x2=x2,
-                    y2=y2,
-                    confidence=conf,
-                    class_name="plate"
-                ))
+        faces = scale_detections(detections['faces'], scale)
+        plates = scale_detections(detections['plates'], scale)
 
-            logger.info(f"Detectadas {len(plates)} matriculas")
+        logger.info(f"Detectados {len(faces)} rostros y {len(plates)} matriculas")
 
         # Calcular tiempo de procesamiento
         processing_time = (time.time() - start_time) * 1000  # ms
 
+        media_type = negotiate(request.headers.get("accept"))
+        summary = {
+            "total_detections": len(faces) + len(plates),
+            "processing_time_ms": processing_time,
+            "adaptive": adaptive_info
+        }
+
+        if media_type == FAST_JSON_MEDIA_TYPE:
+            return FastJSONResponse({
+                "faces": box_dicts(faces, "face"),
+                "plates": box_dicts(plates, "plate"),
+                **summary
+            })
+        if media_type != JSON_MEDIA_TYPE:
+            return render_boxes(media_type, {"face": faces, "plate": plates}, summary)
+
         return DetectionResponse(
-            faces=faces,
-            plates=plates,
-            total_detections=len(faces) + len(plates),
-            processing_time_ms=processing_time
+            faces=[
+                BoundingBox(x1=x1, y1=y1, x2=x2, y2=y2, confidence=conf, class_name="face")
+                for x1, y1, x2, y2, conf in faces
+            ],
+            plates=[
+                BoundingBox(x1=x1, y1=y1, x2=x2, y2=y2, confidence=conf, class_name="plate")
+                for x1, y1, x2, y2, conf in plates
+            ],
+            **summary
         )
 
     except HTTPException:
@@ -113,3 +141,105 @@ async def detect_objects(
             status_code=500,
             detail=f"Error procesando imagen: {str(e)}"
         )
+
+
+@router.post("/detect/classes", response_model=ClassDetectionResponse, tags=["Detection"])
+async def detect_classes(
+    request: Request,
+    file: UploadFile = File(..., description="Imagen a procesar"),
+    classes: str = Form(
+        "face,plate", description="Ids de clase separados por comas (ver /api/classes)"
+    ),
+    confidence_threshold: float = Form(0.25, ge=0.0, le=1.0, description="Umbral de confianza"),
+    imgsz: Optional[int] = Form(
+        None, ge=32, le=4096, description="Tamano de entrada del detector (ej: 320, 480, 640)"
+    )
+):
+    """
+    Detecta solo las clases indicadas del catalogo /api/classes.
+
+    Args:
+        file: Archivo de imagen (JPG, PNG, BMP)
+        classes: Ids de clase separados por comas (ej: "face,person")
+        confidence_threshold: Umbral minimo de confianza para detecciones
+        imgsz: Tamano de entrada del detector (None = el configurado)
+
+    Returns:
+        ClassDetectionResponse con las detecciones agrupadas por clase (o el
+        formato indicado en la cabecera Accept)
+
+    Raises:
+        HTTPException: Si las clases no son validas o hay error procesando
+    """
+    class_ids = parse_class_ids(classes)
+
+    try:
+        processor = get_image_processor()
+
+        try:
+            image, scale = processor.decode_upload(
+                file.file, max_side=imgsz or settings.INFERENCE_IMGSZ
+            )
+        except ValueError:
+            raise HTTPException(
+                status_code=400,
+                detail="No se pudo decodificar la imagen. Formato invalido."
+            )
+
+        _, metadata = processor.process_image_classes(
+            image,
+            class_ids,
+            confidence_threshold=confidence_threshold,
+            anonymize=False,
+            imgsz=imgsz
+        )
+
+        boxes_by_class = {
+            class_id: scale_detections(class_detections, scale)
+            for class_id, class_detections in metadata['detections'].items()
+        }
+
+        media_type = negotiate(request.headers.get("accept"))
+        summary = {
+            "classes_requested": metadata['classes_requested'],
+            "models_used": metadata['models_used'],
+            "total_detections": metadata['total_detections'],
+            "processing_time_ms": metadata['processing_time_ms']
+        }
+
+        if media_type == FAST_JSON_MEDIA_TYPE:
+            return FastJSONResponse({
+                "detections": {
+                    class_id: box_dicts(boxes, class_id)
+                    for class_id, boxes in boxes_by_class.items()
+                },
+                **summary
+            })
+        if media_type != JSON_MEDIA_TYPE:
+            return render_boxes(media_type, boxes_by_class, summary)
+
+        detections = {
+            class_id: [
+                BoundingBox(
+                    x1=x1,
+                    y1=y1,
+                    x2=x2,
+                    y2=y2,
+                    confidence=conf,
+                    class_name=class_id
+                )
+                for x1, y1, x2, y2, conf in boxes
+            ]
+            for class_id, boxes in boxes_by_class.items()
+        }
+
+        return ClassDetectionResponse(detections=detections, **summary)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error en deteccion por clases: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error procesando imagen: {str(e)}"
+        )
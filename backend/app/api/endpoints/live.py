@@ -0,0 +1,193 @@
+"""
+Live Stream Endpoints
+Anonimización en directo de cámaras RTSP/HTTP/v4l2 con salida MJPEG, HLS o RTSP
+"""
+
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import List, Optional
+import asyncio
+import logging
+import re
+
+from app.core.config import settings
+from app.api.endpoints.video import get_video_processor, resolve_source_path, source_url_allowed
+from app.services.live_stream import LiveStream, get_live_manager, source_kind
+from app.services.video_encoder import VideoEncoderError
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Ficheros que escribe ffmpeg en el directorio HLS de un stream
+_HLS_FILE = re.compile(r"^[\w-]+\.(m3u8|ts)$")
+
+_HLS_MEDIA_TYPES = {
+    "m3u8": "application/vnd.apple.mpegurl",
+    "ts": "video/mp2t",
+}
+
+
+class LiveStreamRequest(BaseModel):
+    """Request para iniciar un stream en directo"""
+    source: str  # rtsp://..., http://..., cámara (0, /dev/video0) o fichero
+    sinks: List[str] = ["mjpeg"]  # mjpeg, hls, rtsp
+    rtsp_url: Optional[str] = None  # Destino de la salida rtsp
+    realtime: Optional[bool] = None  # None = ritmo nativo solo para ficheros
+    loop: bool = False  # Repetir un fichero al terminar
+    detect_faces: bool = True
+    detect_plates: bool = True
+    anonymization_method: str = "blur"
+    blur_kernel_size: int = 51
+    pixelate_blocks: int = 10
+
+
+@router.post("/live/streams", status_code=201)
+async def start_live_stream(request: LiveStreamRequest):
+    """
+    Inicia la anonimización en directo de una fuente
+
+    Las URLs deben empezar por uno de los prefijos de
+    VIDEO_SOURCE_URL_PREFIXES, los ficheros estar dentro de
+    VIDEO_SOURCE_ROOTS y las cámaras locales requieren LIVE_ALLOW_DEVICES.
+    El destino rtsp_url debe empezar por uno de los prefijos de
+    LIVE_RTSP_OUTPUT_PREFIXES.
+
+    Args:
+        request: Fuente, salidas y opciones de anonimización
+
+    Returns:
+        JSON con el estado del stream y las URLs de sus salidas
+    """
+    source = request.source
+    kind = source_kind(source)
+    if kind == "url" and not source_url_allowed(source):
+        raise HTTPException(status_code=403, detail="URL no permitida")
+    if kind == "device" and not settings.LIVE_ALLOW_DEVICES:
+        raise HTTPException(status_code=403, detail="Cámaras locales no permitidas")
+    if kind == "file":
+        source = str(resolve_source_path(source))
+    if request.rtsp_url is not None and not rtsp_output_allowed(request.rtsp_url):
+        raise HTTPException(status_code=403, detail="Destino RTSP no permitido")
+
+    try:
+        stream = await run_in_threadpool(
+            get_live_manager().start, source, get_video_processor(),
+            sinks=request.sinks,
+            rtsp_url=request.rtsp_url,
+            realtime=request.realtime,
+            loop=request.loop,
+            detect_faces=request.detect_faces,
+            detect_plates=request.detect_plates,
+            anonymization_method=request.anonymization_method,
+            blur_kernel_size=request.blur_kernel_size,
+            pixelate_blocks=request.pixelate_blocks
+        )
+    except VideoEncoderError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return _stream_response(stream)
+
+
+@router.get("/live/streams")
+async def list_live_streams():
+    """Lista los streams en directo con sus contadores"""
+    return {'streams': [_stream_response(stream) for stream in get_live_manager().list()]}
+
+
+@router.get("/live/streams/{stream_id}")
+async def get_live_stream(stream_id: str):
+    """
+    Estado de un stream: frames capturados, procesados y descartados,
+    latencia de extremo a extremo (última, p50, p95, máxima) y detecciones
+    """
+    return _stream_response(_get_stream(stream_id))
+
+
+@router.delete("/live/streams/{stream_id}")
+async def stop_live_stream(stream_id: str):
+    """Para un stream y devuelve sus contadores finales"""
+    stream = await run_in_threadpool(get_live_manager().stop, stream_id)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="Stream no encontrado")
+    return _stream_response(stream)
+
+
+@router.get("/live/streams/{stream_id}/mjpeg")
+async def live_stream_mjpeg(stream_id: str):
+    """
+    Salida MJPEG (multipart/x-mixed-replace): se puede abrir en un <img> o
+    en VLC. Cada cliente recibe el último frame anonimizado; los clientes
+    lentos se saltan frames en lugar de acumular retraso.
+    """
+    stream = _get_stream(stream_id)
+    if stream.broadcaster is None:
+        raise HTTPException(status_code=404, detail="El stream no tiene salida mjpeg")
+
+    return StreamingResponse(
+        _mjpeg_frames(stream),
+        media_type="multipart/x-mixed-replace; boundary=frame",
+        headers={"Cache-Control": "no-store"}
+    )
+
+
+@router.get("/live/streams/{stream_id}/hls/{name}")
+async def live_stream_hls(stream_id: str, name: str):
+    """Playlist (index.m3u8) y segmentos de la salida HLS"""
+    stream = _get_stream(stream_id)
+    match = _HLS_FILE.match(name)
+    path = stream.directory / name
+    if "hls" not in stream.sinks or match is None or not path.is_file():
+        raise HTTPException(status_code=404, detail="Fichero HLS no encontrado")
+
+    return FileResponse(
+        path,
+        media_type=_HLS_MEDIA_TYPES[match.group(1)],
+        headers={"Cache-Control": "no-cache"} if match.group(1) == "m3u8" else None
+    )
+
+
+def rtsp_output_allowed(url: str) -> bool:
+    """Si la URL empieza por uno de los prefijos de LIVE_RTSP_OUTPUT_PREFIXES."""
+    return any(url.startswith(prefix) for prefix in settings.LIVE_RTSP_OUTPUT_PREFIXES)
+
+
+def _get_stream(stream_id: str) -> LiveStream:
+    stream = get_live_manager().get(stream_id)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="Stream no encontrado")
+    return stream
+
+
+def _stream_response(stream: LiveStream) -> dict:
+    """Estado del stream con las URLs de sus salidas."""
+    base = f"/api/live/streams/{stream.id}"
+    urls = {'status': base}
+    if "mjpeg" in stream.sinks:
+        urls['mjpeg'] = f"{base}/mjpeg"
+    if "hls" in stream.sinks:
+        urls['hls'] = f"{base}/hls/index.m3u8"
+    return {**stream.status(), 'urls': urls}
+
+
+async def _mjpeg_frames(stream: LiveStream):
+    """Partes multipart con el último JPEG publicado (sondeo a medio frame)."""
+    broadcaster = stream.broadcaster
+    interval = 0.5 / stream.fps
+    last_sequence = 0
+
+    while not broadcaster.closed:
+        sequence, jpeg = broadcaster.latest()
+        if sequence != last_sequence and jpeg is not None:
+            last_sequence = sequence
+            yield (
+                b"--frame\r\nContent-Type: image/jpeg\r\n"
+                + f"Content-Length: {len(jpeg)}\r\n\r\n".encode()
+                + jpeg + b"\r\n"
+            )
+        await asyncio.sleep(interval)
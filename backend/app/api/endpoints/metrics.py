@@ -0,0 +1,23 @@
+"""
+Endpoint de metricas en formato de exposicion de Prometheus.
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.core.metrics import CONTENT_TYPE, REGISTRY
+
+
+router = APIRouter()
+
+
+@router.get("/metrics", tags=["Metrics"], include_in_schema=False)
+async def metrics():
+    """
+    Devuelve las metricas registradas (latencias por etapa, contadores,
+    cargas de modelo y accesos a cache).
+
+    Returns:
+        Texto en formato de exposicion de Prometheus
+    """
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
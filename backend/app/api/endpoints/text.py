@@ -4,12 +4,14 @@ Endpoints para análisis y anonimización de texto
 """
 
 import time
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import List, Optional
 import logging
 
+from app.core.metrics import record_cache_lookup
+from app.core.serialization import JSON_MEDIA_TYPE, negotiate, render_records
 from app.services.text_analyzer import TextAnalyzer
 
 router = APIRouter()
@@ -22,6 +24,7 @@ _text_analyzer = None
 def get_text_analyzer() -> TextAnalyzer:
     """Obtiene instancia singleton del analizador de texto"""
     global _text_analyzer
+    record_cache_lookup("text_analyzer", _text_analyzer is not None)
     if _text_analyzer is None:
         _text_analyzer = TextAnalyzer()
         logger.info("TextAnalyzer inicializado")
@@ -35,12 +38,17 @@ class TextAnalysisRequest(BaseModel):
     categories: Optional[List[str]] = None  # None = todas
     anonymization_method: str = 'replace'  # replace, mask, remove
     detection_mode: str = 'regex'  # regex, llm, both
+    omit_input: bool = False  # No devolver original_text en la respuesta
+
+
+# Campos de cada deteccion en el formato compacto
+TEXT_DETECTION_FIELDS = ['type', 'start', 'end', 'confidence', 'source', 'text']
 
 
 class TextAnalysisResponse(BaseModel):
     """Response con texto anonimizado y detecciones"""
     success: bool
-    original_text: str
+    original_text: Optional[str] = None
     anonymized_text: str
     detections: List[dict]
     total_detections: int
@@ -127,21 +135,24 @@ async def get_text_categories(mode: str = 'regex'):
 
 
 @router.post("/analyze-text")
-async def analyze_text(request: TextAnalysisRequest):
+async def analyze_text(request: TextAnalysisRequest, http_request: Request):
     """
     Analiza texto y detecta/anonimiza datos sensibles
 
     Args:
         request: TextAnalysisRequest con texto y opciones
+        http_request: Peticion HTTP (cabecera Accept para elegir el formato)
 
     Returns:
-        TextAnalysisResponse con texto anonimizado y detecciones
+        TextAnalysisResponse con texto anonimizado y detecciones. Con
+        omit_input=true no se devuelve original_text. Segun la cabecera
+        Accept tambien puede devolverse en JSON rapido, compacto o NDJSON
     """
     start_time = time.perf_counter()
     
-    logger.info(f"Analizando texto de {len(request.text)} caracteres")
-    logger.info(f"Categorías solicitadas: {request.categories or 'todas'}")
-    logger.info(f"Método: {request.anonymization_method}")
+    logger.debug(f"Analizando texto de {len(request.text)} caracteres")
+    logger.debug(f"Categorías solicitadas: {request.categories or 'todas'}")
+    logger.debug(f"Método: {request.anonymization_method}")
 
     if not request.text or len(request.text.strip()) == 0:
         raise HTTPException(status_code=400, detail="El texto no puede estar vacío")
@@ -166,14 +177,13 @@ async def analyze_text(request: TextAnalysisRequest):
         processing_time_ms = (time.perf_counter() - start_time) * 1000
         
         logger.info(f"Análisis completado: {result['total_detections']} detecciones en {processing_time_ms:.2f}ms")
-        logger.info(f"Estadísticas: {result['stats']}")
-        logger.info(f"Modo usado: {result['mode']}")
+        logger.debug(f"Estadísticas: {result['stats']}")
+        logger.debug(f"Modo usado: {result['mode']}")
 
         response_data = {
             "success": True,
             "original_text": result['original_text'],
             "anonymized_text": result['anonymized_text'],
-            "detections": result['detections'],
             "total_detections": result['total_detections'],
             "stats": result['stats'],
             "method": result['method'],
@@ -181,11 +191,20 @@ async def analyze_text(request: TextAnalysisRequest):
             "value_map": result['value_map'],
             "processing_time_ms": round(processing_time_ms, 2)
         }
-        
-        return JSONResponse(
-            content=response_data,
-            headers={"X-Processing-Time-Ms": str(round(processing_time_ms, 2))}
-        )
+        if request.omit_input:
+            del response_data["original_text"]
+
+        headers = {"X-Processing-Time-Ms": str(round(processing_time_ms, 2))}
+
+        media_type = negotiate(http_request.headers.get("accept"))
+        if media_type != JSON_MEDIA_TYPE:
+            return render_records(
+                media_type, result['detections'], TEXT_DETECTION_FIELDS, response_data, headers
+            )
+
+        response_data["detections"] = result['detections']
+
+        return JSONResponse(content=response_data, headers=headers)
 
     except Exception as e:
         logger.error(f"Error analizando texto: {e}", exc_info=True)
@@ -193,17 +212,18 @@ async def analyze_text(request: TextAnalysisRequest):
 
 
 @router.post("/detect-text")
-async def detect_text_only(request: TextAnalysisRequest):
+async def detect_text_only(request: TextAnalysisRequest, http_request: Request):
     """
     Solo detecta datos sensibles sin anonimizar (para preview)
 
     Args:
         request: TextAnalysisRequest con texto y categorías
+        http_request: Peticion HTTP (cabecera Accept para elegir el formato)
 
     Returns:
-        JSON con detecciones
+        JSON con detecciones (o el formato indicado en la cabecera Accept)
     """
-    logger.info(f"Detectando en texto de {len(request.text)} caracteres")
+    logger.debug(f"Detectando en texto de {len(request.text)} caracteres")
 
     if not request.text or len(request.text.strip()) == 0:
         raise HTTPException(status_code=400, detail="El texto no puede estar vacío")
@@ -224,14 +244,19 @@ async def detect_text_only(request: TextAnalysisRequest):
             dtype = detection['type']
             stats[dtype] = stats.get(dtype, 0) + 1
 
-        return {
+        summary = {
             "success": True,
-            "detections": detections,
             "total_detections": len(detections),
             "stats": stats,
             "mode": request.detection_mode
         }
 
+        media_type = negotiate(http_request.headers.get("accept"))
+        if media_type != JSON_MEDIA_TYPE:
+            return render_records(media_type, detections, TEXT_DETECTION_FIELDS, summary)
+
+        return {**summary, "detections": detections}
+
     except Exception as e:
         logger.error(f"Error detectando en texto: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
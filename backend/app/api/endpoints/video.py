@@ -4,7 +4,8 @@ Endpoints para procesamiento de videos con anonimización
 """
 
 from fastapi import APIRouter, File, UploadFile, WebSocket, WebSocketDisconnect, Form, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 from typing import Optional
 import logging
 import tempfile
@@ -13,16 +14,55 @@ from pathlib import Path
 import time
 import asyncio
 import base64
-
+import hashlib
+from urllib.parse import quote
+
+from app.core.config import settings
+from app.core.profiling import get_profile_gate
+from app.services import video_reader
+from app.services.output_store import STATE_PROCESSING, get_output_store
+from app.services.video_encoder import supports_fragmented
 from app.services.video_processor import VideoProcessor
+from app.services.video_reader import is_url
+from app.utils.file_handler import FileHandler, UploadTooLargeError
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+ALLOWED_VIDEO_EXTENSIONS = ['.mp4', '.avi', '.mov', '.mkv']
+
+# Bytes por lectura al servir un MP4 que aun se esta escribiendo
+OUTPUT_STREAM_CHUNK = 1024 * 1024
+
 # Instancia del procesador de video (singleton)
 _video_processor = None
 
 
+def content_disposition(filename: str, disposition_type: str = "attachment") -> str:
+    """
+    Cabecera Content-Disposition para un nombre de fichero cualquiera.
+
+    Como FileResponse, usa filename*=utf-8'' cuando el nombre no es ASCII
+    simple, y además añade un filename ASCII de respaldo (sin comillas ni
+    barras invertidas) para los clientes que no entienden filename*.
+
+    Args:
+        filename: Nombre con el que se descargará el fichero
+        disposition_type: 'attachment' o 'inline'
+
+    Returns:
+        Valor de la cabecera (siempre codificable en latín-1)
+    """
+    quoted = quote(filename)
+    fallback = "".join(
+        char if char.isascii() and char.isprintable() and char not in '"\\' else "_"
+        for char in filename
+    )
+    if quoted == filename:
+        return f'{disposition_type}; filename="{filename}"'
+    return f"{disposition_type}; filename=\"{fallback}\"; filename*=utf-8''{quoted}"
+
+
 def get_video_processor() -> VideoProcessor:
     """Obtiene instancia singleton del procesador de video"""
     global _video_processor
@@ -44,6 +84,14 @@ async def process_video(
     """
     Procesa un video aplicando detección y anonimización
 
+    Con VIDEO_TRACK_CACHE se guarda la pista de detecciones del video; si se
+    vuelve a pedir el mismo video (por ejemplo con otro método) se
+    re-anonimiza desde la pista sin ejecutar el detector.
+
+    El video procesado queda en el almacén de salidas: las cabeceras
+    X-Output-Id y X-Output-URL indican dónde volver a descargarlo (con
+    Range) hasta que caduque.
+
     Args:
         file: Archivo de video (MP4, AVI, MOV)
         detect_faces: Si detectar rostros
@@ -53,7 +101,7 @@ async def process_video(
         pixelate_blocks: Número de bloques para pixelate (ej: 10)
 
     Returns:
-        FileResponse con el video procesado
+        FileResponse con el video procesado (admite Range)
     """
     logger.info(f"Recibida solicitud de procesamiento de video: {file.filename}")
     logger.info(f"Detectar rostros: {detect_faces}, Detectar matrículas: {detect_plates}")
@@ -62,129 +110,287 @@ async def process_video(
     start_time = time.time()
 
     # Validar tipo de archivo
-    allowed_extensions = ['.mp4', '.avi', '.mov', '.mkv']
     file_extension = Path(file.filename).suffix.lower()
 
-    if file_extension not in allowed_extensions:
+    if file_extension not in ALLOWED_VIDEO_EXTENSIONS:
         raise HTTPException(
             status_code=400,
-            detail=f"Tipo de archivo no soportado. Permitidos: {', '.join(allowed_extensions)}"
+            detail=(
+                "Tipo de archivo no soportado. "
+                f"Permitidos: {', '.join(ALLOWED_VIDEO_EXTENSIONS)}"
+            )
         )
 
-    # Crear archivos temporales
-    temp_input = tempfile.NamedTemporaryFile(delete=False, suffix=file_extension)
-    temp_output = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
+    # Reservar la salida en el almacen (caduca a las OUTPUT_TTL_HOURS)
+    store = get_output_store()
+    output_filename = f"anonymized_{Path(file.filename).stem}.mp4"
+    output_id, output_path = store.create(output_filename)
+    completed = False
+    temp_input = None
 
     try:
-        # Guardar video subido
-        content = await file.read()
-        temp_input.write(content)
-        temp_input.close()
+        # Volcar la subida a disco por bloques (nunca entera en memoria),
+        # calculando a la vez el hash para la pista de detecciones
+        content_hash = hashlib.sha256()
+        try:
+            temp_input = await run_in_threadpool(
+                FileHandler.save_upload, file.file, file_extension,
+                settings.VIDEO_MAX_UPLOAD_MB * 1024 * 1024, None, content_hash
+            )
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
 
-        logger.info(f"Video guardado temporalmente: {temp_input.name}")
+        logger.info(f"Video guardado temporalmente: {temp_input}")
 
         # Obtener procesador
         processor = get_video_processor()
 
         # Obtener info del video
-        video_info = processor.get_video_info(temp_input.name)
+        video_info = processor.get_video_info(str(temp_input))
         logger.info(f"Info del video: {video_info}")
 
-        # Procesar video
-        result = processor.process_video(
-            video_path=temp_input.name,
-            output_path=temp_output.name,
+        # Pista de detecciones del video (por hash del contenido)
+        track_path = None
+        render_only = False
+        if settings.VIDEO_TRACK_CACHE:
+            track_path = str(settings.VIDEO_TRACKS_DIR / f"{content_hash.hexdigest()}.npz")
+            render_only = processor.track_matches(track_path, detect_faces, detect_plates)
+
+        options = dict(
+            video_path=str(temp_input),
+            output_path=str(output_path),
             detect_faces=detect_faces,
             detect_plates=detect_plates,
             anonymization_method=anonymization_method,
             blur_kernel_size=blur_kernel_size,
-            pixelate_blocks=pixelate_blocks
+            pixelate_blocks=pixelate_blocks,
+            video_info=video_info
         )
 
+        # Procesar video (o re-anonimizar desde la pista, sin detector)
+        if render_only:
+            logger.info(f"Pista de detecciones encontrada: re-render sin inferencia ({track_path})")
+            # La caducidad de la pista cuenta desde su ultimo uso
+            Path(track_path).touch()
+            result = processor.render_video(track_path=track_path, **options)
+        else:
+            result = processor.process_video(track_path=track_path, **options)
+
+        store.complete(output_id)
+        completed = True
+
         processing_time = time.time() - start_time
         logger.info(f"Video procesado en {processing_time:.2f}s")
 
-        # Preparar respuesta
-        output_filename = f"anonymized_{Path(file.filename).stem}.mp4"
-
         return FileResponse(
-            path=temp_output.name,
+            path=output_path,
             media_type="video/mp4",
-            filename=output_filename,
             headers={
+                "Content-Disposition": content_disposition(output_filename),
                 "X-Processing-Time": str(round(processing_time, 2)),
                 "X-Total-Faces": str(result['stats']['total_faces']),
                 "X-Total-Plates": str(result['stats']['total_plates']),
                 "X-Frames-Processed": str(result['stats']['frames_processed']),
-                "X-Frames-With-Detections": str(result['stats']['frames_with_detections'])
+                "X-Frames-With-Detections": str(result['stats']['frames_with_detections']),
+                "X-Frames-Detected": str(result['stats']['frames_detected']),
+                "X-Frames-Skipped": str(result['stats']['frames_skipped']),
+                "X-Render-Only": str(render_only).lower(),
+                "X-Output-Id": output_id,
+                "X-Output-URL": store.url(output_id)
             }
         )
 
+    except HTTPException:
+        raise
+
     except Exception as e:
         logger.error(f"Error procesando video: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
     finally:
-        # Limpiar archivo de entrada
-        try:
-            if os.path.exists(temp_input.name):
-                os.unlink(temp_input.name)
-        except Exception as e:
-            logger.warning(f"No se pudo eliminar archivo temporal: {e}")
+        # Limpiar archivo de entrada (y la salida si no se termino)
+        if temp_input is not None:
+            FileHandler.delete_file(temp_input)
+        if not completed:
+            store.fail(output_id)
+
+
+@router.api_route("/outputs/{output_id}", methods=["GET", "HEAD"])
+async def get_output(output_id: str):
+    """
+    Descarga un video procesado
+
+    Los videos terminados se sirven con soporte de Range (los reproductores
+    pueden buscar). Un MP4 fragmentado que aún se está procesando se envía
+    según se escribe, hasta terminar; si no es fragmentado, se responde 409
+    hasta que esté listo.
+
+    Args:
+        output_id: Id de la salida (X-Output-Id o mensaje 'output' del WebSocket)
+
+    Returns:
+        El video procesado
+    """
+    store = get_output_store()
+    info = store.info(output_id)
+    if info is None or (info['state'] != STATE_PROCESSING and not info['path'].is_file()):
+        raise HTTPException(status_code=404, detail="Salida no encontrada o caducada")
+
+    disposition = content_disposition(info['filename'], "inline")
+
+    if info['state'] == STATE_PROCESSING:
+        if not info['progressive']:
+            raise HTTPException(status_code=409, detail="El video aún se está procesando")
+        return StreamingResponse(
+            _follow_output(store, output_id, info['path']),
+            media_type="video/mp4",
+            headers={
+                "Content-Disposition": disposition,
+                "Cache-Control": "no-store",
+                "Accept-Ranges": "none"
+            }
+        )
+
+    return FileResponse(
+        path=info['path'],
+        media_type="video/mp4",
+        headers={"Content-Disposition": disposition}
+    )
+
+
+async def _follow_output(store, output_id: str, path: Path):
+    """Envía un MP4 fragmentado mientras crece, hasta que termina su procesamiento."""
+    handle = None
+    try:
+        while True:
+            # El estado se lee antes de vaciar el fichero: si ya había
+            # terminado, lo leído hasta EOF es el video completo
+            info = store.info(output_id)
+            finished = info is None or info['state'] != STATE_PROCESSING
+
+            if handle is None and path.exists():
+                handle = open(path, 'rb')
+            if handle is not None:
+                while True:
+                    chunk = await run_in_threadpool(handle.read, OUTPUT_STREAM_CHUNK)
+                    if not chunk:
+                        break
+                    yield chunk
+
+            if finished:
+                return
+            await asyncio.sleep(settings.OUTPUT_POLL_INTERVAL_S)
+    finally:
+        if handle is not None:
+            handle.close()
 
 
 @router.post("/video-info")
-async def get_video_info(file: UploadFile = File(...)):
+async def get_video_info(
+    file: Optional[UploadFile] = File(None),
+    path: Optional[str] = Form(None),
+    url: Optional[str] = Form(None)
+):
     """
     Obtiene información de un video sin procesarlo
 
+    Solo se leen las cabeceras del contenedor. El video se puede indicar
+    subiéndolo, o sin volver a subirlo con la ruta de un fichero ya subido
+    (dentro de VIDEO_SOURCE_ROOTS) o una URL (con uno de los prefijos de
+    VIDEO_SOURCE_URL_PREFIXES).
+
     Args:
         file: Archivo de video
+        path: Ruta de un video ya subido
+        url: URL http(s) de un video ya subido
 
     Returns:
         JSON con información del video (fps, frames, dimensiones, duración)
     """
+    sources = [source for source in (file, path, url) if source]
+    if len(sources) != 1:
+        raise HTTPException(status_code=400, detail="Indica exactamente uno de: file, path o url")
+
+    if url:
+        logger.info(f"Obteniendo info de video por URL: {url}")
+        if not is_url(url) or not source_url_allowed(url):
+            raise HTTPException(status_code=403, detail="URL no permitida")
+        return await _probe_response(url, url, "url")
+
+    if path:
+        logger.info(f"Obteniendo info de video por ruta: {path}")
+        resolved = resolve_source_path(path)
+        return await _probe_response(str(resolved), resolved.name, "path")
+
     logger.info(f"Obteniendo info de video: {file.filename}")
 
     # Validar extensión
-    allowed_extensions = ['.mp4', '.avi', '.mov', '.mkv']
     file_extension = Path(file.filename).suffix.lower()
 
-    if file_extension not in allowed_extensions:
+    if file_extension not in ALLOWED_VIDEO_EXTENSIONS:
         raise HTTPException(
             status_code=400,
-            detail=f"Tipo de archivo no soportado. Permitidos: {', '.join(allowed_extensions)}"
+            detail=(
+                "Tipo de archivo no soportado. "
+                f"Permitidos: {', '.join(ALLOWED_VIDEO_EXTENSIONS)}"
+            )
         )
 
-    # Crear archivo temporal
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=file_extension)
+    # Con PyAV las cabeceras se leen directamente de la subida, sin copiarla
+    if video_reader.av is not None:
+        file.file.seek(0)
+        return await _probe_response(file.file, file.filename, "upload")
 
+    temp_input = None
     try:
-        # Guardar video
-        content = await file.read()
-        temp_file.write(content)
-        temp_file.close()
+        temp_input = await run_in_threadpool(
+            FileHandler.save_upload, file.file, file_extension,
+            settings.VIDEO_MAX_UPLOAD_MB * 1024 * 1024
+        )
+        return await _probe_response(str(temp_input), file.filename, "upload")
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    finally:
+        if temp_input is not None:
+            FileHandler.delete_file(temp_input)
 
-        # Obtener info
-        processor = get_video_processor()
-        info = processor.get_video_info(temp_file.name)
 
-        return {
-            'success': True,
-            'filename': file.filename,
-            'info': info
-        }
+def source_url_allowed(url: str) -> bool:
+    """Si la URL empieza por uno de los prefijos de VIDEO_SOURCE_URL_PREFIXES."""
+    return any(url.startswith(prefix) for prefix in settings.VIDEO_SOURCE_URL_PREFIXES)
+
 
+def resolve_source_path(path: str) -> Path:
+    """
+    Resuelve la ruta de un video ya subido dentro de VIDEO_SOURCE_ROOTS.
+
+    Raises:
+        HTTPException: 403 si la ruta esta fuera de las raices, 404 si no existe
+    """
+    resolved = Path(path).resolve()
+    roots = [Path(root).resolve() for root in settings.VIDEO_SOURCE_ROOTS]
+    if not any(resolved == root or root in resolved.parents for root in roots):
+        raise HTTPException(status_code=403, detail="Ruta no permitida")
+    if not resolved.is_file():
+        raise HTTPException(status_code=404, detail="El video no existe")
+    return resolved
+
+
+async def _probe_response(source, filename: str, kind: str) -> dict:
+    """Lee las propiedades del video en el threadpool y arma la respuesta de /video-info."""
+    try:
+        info = await run_in_threadpool(VideoProcessor.get_video_info, source)
     except Exception as e:
         logger.error(f"Error obteniendo info del video: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
-
-    finally:
-        try:
-            if os.path.exists(temp_file.name):
-                os.unlink(temp_file.name)
-        except Exception as e:
-            logger.warning(f"No se pudo eliminar archivo temporal: {e}")
+        status = 400 if isinstance(e, ValueError) else 500
+        raise HTTPException(status_code=status, detail=str(e))
+
+    return {
+        'success': True,
+        'filename': filename,
+        'source': kind,
+        'info': info
+    }
 
 
 @router.websocket("/ws/process-video")
@@ -200,7 +406,17 @@ async def websocket_process_video(websocket: WebSocket):
         "detect_plates": true,
         "anonymization_method": "blur",
         "blur_kernel_size": 51,
-        "pixelate_blocks": 10
+        "pixelate_blocks": 10,
+        "fragmented": false,  (opcional, MP4 descargable mientras se procesa)
+        "profile_token": "..."  (opcional, perfila el procesamiento)
+    }
+
+    Antes de procesar se envía dónde quedará el video:
+    {
+        "type": "output",
+        "output_id": "...",
+        "url": "/api/outputs/...",
+        "progressive": true  (la URL ya se puede reproducir mientras avanza)
     }
 
     El servidor enviará actualizaciones de progreso:
@@ -213,17 +429,21 @@ async def websocket_process_video(websocket: WebSocket):
         "plates_in_frame": 1
     }
 
-    Y resultado final:
+    Y resultado final (el video se descarga de la URL, con Range):
     {
-        "type": "complete",
-        "result": {...}
+        "type": "video",
+        "output_id": "...",
+        "url": "/api/outputs/...",
+        "stats": {...}
     }
     """
     await websocket.accept()
     logger.info("WebSocket conectado para procesamiento de video")
 
     temp_input = None
-    temp_output = None
+    store = get_output_store()
+    output_id = None
+    completed = False
 
     try:
         # Recibir datos del video
@@ -239,7 +459,9 @@ async def websocket_process_video(websocket: WebSocket):
         anonymization_method = data.get('anonymization_method', 'blur')
         blur_kernel_size = data.get('blur_kernel_size', 51)
         pixelate_blocks = data.get('pixelate_blocks', 10)
-        enable_preview = data.get('enable_preview', True) 
+        enable_preview = data.get('enable_preview', True)
+        fragmented = bool(data.get('fragmented', settings.VIDEO_FRAGMENTED_MP4))
+        profile_token = data.get('profile_token')
         if not video_base64:
             await websocket.send_json({
                 'type': 'error',
@@ -254,11 +476,22 @@ async def websocket_process_video(websocket: WebSocket):
         # Crear archivos temporales
         file_extension = Path(filename).suffix or '.mp4'
         temp_input = tempfile.NamedTemporaryFile(delete=False, suffix=file_extension)
-        temp_output = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
 
         temp_input.write(video_bytes)
         temp_input.close()
 
+        # Reservar la salida: con MP4 fragmentado se puede descargar ya
+        progressive = fragmented and supports_fragmented()
+        output_id, output_path = store.create(
+            f"anonymized_{Path(filename).stem}.mp4", progressive=progressive
+        )
+        await websocket.send_json({
+            'type': 'output',
+            'output_id': output_id,
+            'url': store.url(output_id),
+            'progressive': progressive
+        })
+
         # Enviar confirmación
         await websocket.send_json({
             'type': 'info',
@@ -268,32 +501,37 @@ async def websocket_process_video(websocket: WebSocket):
         # Obtener procesador
         processor = get_video_processor()
 
-        # Procesar con streaming
-        result = await processor.process_video_stream(
-            video_path=temp_input.name,
-            output_path=temp_output.name,
-            websocket=websocket,
-            detect_faces=detect_faces,
-            detect_plates=detect_plates,
-            anonymization_method=anonymization_method,
-            blur_kernel_size=blur_kernel_size,
-            pixelate_blocks=pixelate_blocks,
-            send_preview_frames=enable_preview
-        )
-
-        # Dar tiempo a que todos los mensajes de progreso se envíen
-        await asyncio.sleep(1.0)
-
-        # Leer video procesado
-        with open(temp_output.name, 'rb') as f:
-            processed_video = f.read()
-
-        # Enviar video procesado (en chunks si es muy grande)
-        processed_base64 = base64.b64encode(processed_video).decode('utf-8')
+        # Perfilado bajo demanda (token de administracion, limitado en frecuencia)
+        gate = get_profile_gate()
+        profiled = gate.acquire(profile_token)
 
+        # Procesar con streaming
+        try:
+            result = await processor.process_video_stream(
+                video_path=temp_input.name,
+                output_path=str(output_path),
+                websocket=websocket,
+                detect_faces=detect_faces,
+                detect_plates=detect_plates,
+                anonymization_method=anonymization_method,
+                blur_kernel_size=blur_kernel_size,
+                pixelate_blocks=pixelate_blocks,
+                send_preview_frames=enable_preview,
+                profile_name=f"ws_video_{Path(filename).stem}" if profiled else None,
+                fragmented=progressive
+            )
+        finally:
+            if profiled:
+                gate.release()
+
+        store.complete(output_id)
+        completed = True
+
+        # El video no viaja por el WebSocket: se descarga de su URL
         await websocket.send_json({
             'type': 'video',
-            'video_data': processed_base64,
+            'output_id': output_id,
+            'url': store.url(output_id),
             'stats': result['stats']
         })
 
@@ -313,11 +551,11 @@ async def websocket_process_video(websocket: WebSocket):
             pass
 
     finally:
-        # Limpiar archivos temporales
+        # Limpiar archivos temporales (y la salida si no se termino)
         try:
             if temp_input and os.path.exists(temp_input.name):
                 os.unlink(temp_input.name)
-            if temp_output and os.path.exists(temp_output.name):
-                os.unlink(temp_output.name)
+            if output_id is not None and not completed:
+                store.fail(output_id)
         except Exception as e:
             logger.warning(f"No se pudo eliminar archivos temporales: {e}")
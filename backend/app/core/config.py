@@ -6,7 +6,7 @@ Define paths, parametros de modelos, y configuraciones globales.
 
 from pathlib import Path
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 
 
 class Settings(BaseSettings):
@@ -36,6 +36,21 @@ class Settings(BaseSettings):
     DETECTION_CONFIDENCE: float = 0.5  # Confianza minima para detecciones
     DETECTION_IOU: float = 0.45  # IoU threshold para NMS
 
+    # Parametros de inferencia
+    INFERENCE_IMGSZ: int = 640  # Tamano de entrada (320/480/640...)
+    INFERENCE_HALF: bool = False  # FP16 (solo se aplica en GPU)
+    INFERENCE_DEVICE: Optional[str] = None  # 'cpu', 'cuda:0', 'mps'... None = auto
+    INFERENCE_CPU_THREADS: Optional[int] = None  # Hilos de PyTorch en CPU (None = por defecto)
+
+    # Deteccion adaptativa (pasada rapida a baja resolucion + refinado)
+    ADAPTIVE_COARSE_IMGSZ: int = 320  # Tamano de entrada de la pasada rapida
+    ADAPTIVE_CANDIDATE_CONFIDENCE: float = 0.15  # Confianza minima de un candidato
+    ADAPTIVE_REFINE_BELOW: float = 0.6  # Candidatos por debajo se refinan
+    ADAPTIVE_SMALL_BOX_RATIO: float = 0.04  # Lado menor / lado mayor de imagen considerado pequeno
+    ADAPTIVE_REFINE_MODE: str = "crops"  # 'crops' (recortes) o 'frame' (imagen completa)
+    ADAPTIVE_CROP_MARGIN: float = 0.5  # Margen de los recortes (fraccion de la box)
+    ADAPTIVE_MAX_CROPS: int = 8  # Con mas candidatos se refina la imagen completa
+
     # Parametros de anonimizacion
     BLUR_KERNEL_SIZE: int = 99  # Tamano del kernel para Gaussian Blur
     PIXELATE_BLOCKS: int = 10  # Numero de bloques para pixelacion
@@ -43,6 +58,114 @@ class Settings(BaseSettings):
     # Limites de archivos
     MAX_FILE_SIZE_MB: int = 10
     ALLOWED_EXTENSIONS: set = {".jpg", ".jpeg", ".png", ".bmp"}
+    DECODE_REDUCED_JPEG: bool = True  # Decodificar JPEG a resolucion reducida si solo se detecta
+
+    # Recodificacion JPEG solo de las regiones anonimizadas (jpegtran -drop)
+    JPEG_REGION_REENCODE: bool = True  # Usar si jpegtran esta disponible
+    JPEGTRAN_PATH: Optional[str] = None  # None = buscar jpegtran en el PATH
+    JPEG_REGION_MAX_BOXES: int = 4  # Con mas detecciones se recodifica la imagen completa
+    JPEG_REGION_TIMEOUT_S: float = 10.0  # Tiempo maximo por llamada a jpegtran
+
+    # Logging (sinks en segundo plano y muestreo por punto de llamada)
+    LOG_ENQUEUE: bool = True  # Escribir los logs desde un hilo en segundo plano
+    LOG_RATE_LIMIT_PER_S: float = 10.0  # DEBUG/INFO por segundo y punto de llamada (0 = sin limite)
+    LOG_DEBUG_SAMPLE_EVERY: int = 100  # Emitir 1 de cada N mensajes DEBUG por punto de llamada
+
+    # Metricas (GET /metrics, formato Prometheus)
+    METRICS_ENABLED: bool = True  # Registrar latencias y contadores por etapa
+
+    # Trazas por peticion (spans por etapa, exportacion OTLP/JSON)
+    TRACING_ENABLED: bool = True
+    TRACE_SERVICE_NAME: str = "anonymizer-api"
+    TRACE_SLOW_MS: float = 2000.0  # Peticiones mas lentas vuelcan su arbol de spans al log
+    TRACE_SAMPLE_RATE: float = 1.0  # Fraccion de trazas exportadas (las lentas siempre)
+    TRACE_MAX_CHILDREN: int = 100  # Spans hijos por span; el resto solo se cuentan
+    TRACE_EXPORT_PATH: Optional[Path] = None  # Fichero OTLP/JSON (una traza por linea)
+    # Colector OTLP/HTTP, p. ej. http://localhost:4318/v1/traces
+    TRACE_EXPORT_URL: Optional[str] = None
+
+    # Perfilado bajo demanda (desactivado por defecto)
+    PROFILING_ENABLED: bool = False
+    PROFILING_TOKEN: Optional[str] = None  # Valor de la cabecera X-Profile o ?profile=
+    PROFILING_DIR: Path = PROJECT_ROOT / "profiles"
+    PROFILING_FORMAT: str = "speedscope"  # 'speedscope' o 'collapsed' (flamegraph.pl)
+    PROFILING_INTERVAL_MS: float = 5.0  # Intervalo de muestreo
+    PROFILING_MIN_INTERVAL_S: float = 60.0  # Como maximo un perfil por intervalo
+
+    # Lectura de video (decodificacion)
+    VIDEO_READER: str = "auto"  # 'auto' (PyAV > ffmpeg > cv2), 'pyav', 'ffmpeg' u 'opencv'
+    FFPROBE_PATH: Optional[str] = None  # None = buscar ffprobe en el PATH
+    VIDEO_DECODE_THREADS: int = 0  # Hilos del decodificador (0 = automatico)
+    VIDEO_DUAL_RESOLUTION: bool = True  # Detectar sobre una copia al tamano de entrada del detector
+    # Lado mayor de la copia para deteccion (None = segun VIDEO_DUAL_RESOLUTION)
+    VIDEO_DETECT_MAX_SIDE: Optional[int] = None
+
+    # Filtro de movimiento (reutilizar boxes en frames casi identicos, camaras fijas)
+    VIDEO_MOTION_GATE: bool = False  # Activar el filtro
+    VIDEO_MOTION_PIXEL_THRESHOLD: int = 12  # Diferencia de gris (0-255) de un pixel cambiado
+    VIDEO_MOTION_MIN_CHANGED: float = 0.002  # Por debajo de esta fraccion cambiada se reutiliza
+    VIDEO_MOTION_SCENE_CHANGE: float = 0.3  # Caida de correlacion del histograma => detectar
+    VIDEO_MOTION_MAX_SKIP: int = 30  # Deteccion completa al menos cada N frames
+    VIDEO_MOTION_REGIONS: bool = True  # Detectar solo en las regiones cambiadas
+    VIDEO_MOTION_REGION_MAX_AREA: float = 0.4  # Con mas area cambiada se detecta todo el frame
+    VIDEO_MOTION_MAX_REGIONS: int = 8  # Con mas regiones se detecta el frame completo
+    VIDEO_MOTION_REGION_MARGIN: float = 0.25  # Margen de los recortes (fraccion de la region)
+
+    # Codificacion del video de salida
+    VIDEO_ENCODER: str = "auto"  # 'auto' (ffmpeg si esta disponible), 'ffmpeg' u 'opencv' (mp4v)
+    FFMPEG_PATH: Optional[str] = None  # None = buscar ffmpeg en el PATH
+    VIDEO_CODEC: str = "libx264"  # libx264, libx265, h264_nvenc, h264_qsv...
+    VIDEO_PRESET: Optional[str] = "veryfast"  # Preset del codec (None = por defecto)
+    VIDEO_CRF: Optional[int] = 23  # Calidad constante (-crf, o -cq en nvenc)
+    VIDEO_ENCODER_THREADS: int = 0  # Hilos de ffmpeg (0 = automatico)
+    VIDEO_COPY_AUDIO: bool = True  # Copiar la pista de audio del original
+    VIDEO_ENCODER_TIMEOUT_S: float = 300.0  # Espera maxima al cierre de ffmpeg
+
+    # Progreso y previews del WebSocket de video
+    VIDEO_PREVIEW_FPS: float = 5.0  # Previews JPEG por segundo (0 = sin previews)
+    VIDEO_PREVIEW_MAX_SIDE: int = 480  # Lado mayor de los previews
+    VIDEO_PREVIEW_QUALITY: int = 70  # Calidad JPEG de los previews
+    VIDEO_PROGRESS_INTERVAL_S: float = 0.2  # Los mensajes de progreso se agrupan en este intervalo
+
+    # Subidas de video (volcado a disco por bloques)
+    VIDEO_MAX_UPLOAD_MB: int = 4096  # Tamano maximo de un video subido (se corta al superarlo)
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # Bloque de copia de las subidas a disco
+    VIDEO_SOURCE_ROOTS: List[Path] = []  # Raices de las rutas de video-info y live
+    # Prefijos de URL aceptados (p. ej. rtsp://camaras.local/)
+    VIDEO_SOURCE_URL_PREFIXES: List[str] = []
+
+    # Trabajos de video reanudables (checkpoints por segmentos)
+    VIDEO_JOBS_DIR: Path = PROJECT_ROOT / "temp" / "video_jobs"  # Trabajos por defecto
+    VIDEO_SEGMENT_SECONDS: float = 60.0  # Duracion aproximada de cada segmento (desde keyframe)
+    VIDEO_CHECKPOINT_FRAMES: int = 100  # Volcar las detecciones a disco cada N frames
+
+    # Pistas de detecciones (re-render con otro metodo sin volver a detectar)
+    VIDEO_TRACK_CACHE: bool = True  # Guardar y reutilizar la pista de cada video
+    VIDEO_TRACKS_DIR: Path = PROJECT_ROOT / "temp" / "video_tracks"  # Pistas .npz por hash
+    VIDEO_TRACK_TTL_HOURS: float = 24.0  # Las pistas sin usar se borran pasado este tiempo
+
+    # Videos procesados (GET /api/outputs/{id}, con Range)
+    OUTPUT_TTL_HOURS: float = 24.0  # Las salidas se borran pasado este tiempo
+    OUTPUT_CLEANUP_INTERVAL_S: float = 600.0  # Periodo de la limpieza de salidas y pistas caducadas
+    OUTPUT_POLL_INTERVAL_S: float = 0.25  # Espera entre lecturas al servir un MP4 que aun crece
+    VIDEO_FRAGMENTED_MP4: bool = False  # MP4 descargable mientras se procesa (ffmpeg)
+
+    # Anonimizacion en directo (camaras RTSP/HTTP/v4l2, /api/live)
+    LIVE_MAX_STREAMS: int = 4  # Streams simultaneos
+    LIVE_ALLOW_DEVICES: bool = False  # Aceptar camaras locales (indice o /dev/videoN)
+    LIVE_RTSP_OUTPUT_PREFIXES: List[str] = []  # Prefijos aceptados para rtsp_url (vacio = sin rtsp)
+    LIVE_DIR: Path = PROJECT_ROOT / "temp" / "live"  # Segmentos HLS de cada stream
+    LIVE_OPEN_TIMEOUT_S: float = 10.0  # Espera maxima al abrir o leer la fuente
+    LIVE_RECONNECT_DELAY_S: float = 2.0  # Espera antes de reconectar una fuente caida
+    LIVE_JPEG_QUALITY: int = 80  # Calidad de los frames MJPEG
+    LIVE_HLS_SEGMENT_SECONDS: float = 2.0  # Duracion de los segmentos HLS
+    LIVE_HLS_LIST_SIZE: int = 6  # Segmentos en la playlist HLS (los antiguos se borran)
+    LIVE_LATENCY_WINDOW: int = 300  # Frames usados para los percentiles de latencia
+
+    # Procesamiento por lotes (/api/anonymize/batch)
+    BATCH_SIZE: int = 8  # Imagenes por llamada al detector
+    BATCH_DECODE_WORKERS: int = 4  # Hilos para decodificar/codificar imagenes
+    BATCH_MAX_FILES: int = 10000  # Maximo de imagenes por peticion
 
     # Configuración Ollama (LLM para análisis de texto)
     OLLAMA_URL: str = "http://localhost:11434"
@@ -2,15 +2,114 @@
 Configuración de logging estructurado con Loguru.
 
 Proporciona logging JSON para producción y formato legible para desarrollo.
+
+Los sinks se escriben desde un hilo en segundo plano (enqueue=True), de
+modo que la E/S de logs no bloquea el procesamiento. Los mensajes de los
+loggers estandar (logging.getLogger) se redirigen a Loguru pasando antes
+por un muestreo por punto de llamada (LogSampler).
 """
 
+import logging
 import sys
+import threading
+import time
 from pathlib import Path
+from typing import Dict, List, Tuple
 from loguru import logger
 
 from app.core.config import settings
 
 
+class LogSampler:
+    """
+    Muestreo y limitacion de mensajes por punto de llamada (logger + linea).
+
+    - DEBUG: se emite el primer mensaje y despues uno de cada `debug_every`
+    - DEBUG e INFO: como maximo `rate_per_s` mensajes por segundo (token bucket)
+    - WARNING o superior: siempre se emiten
+
+    Al volver a emitir un punto de llamada se indica cuantos mensajes se
+    suprimieron desde el anterior.
+    """
+
+    def __init__(self, rate_per_s: float, debug_every: int):
+        """
+        Args:
+            rate_per_s: Mensajes por segundo por punto de llamada (<= 0 sin limite)
+            debug_every: Emitir uno de cada N mensajes DEBUG (<= 1 todos)
+        """
+        self.rate_per_s = rate_per_s
+        self.debug_every = max(1, debug_every)
+        # clave -> [tokens, ultimo instante, vistos, suprimidos]
+        self._state: Dict[Tuple[str, int], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key: Tuple[str, int], levelno: int) -> Tuple[bool, int]:
+        """
+        Decide si se emite un mensaje.
+
+        Args:
+            key: Punto de llamada (nombre del logger, linea)
+            levelno: Nivel del mensaje
+
+        Returns:
+            Tupla (emitir, mensajes suprimidos desde el ultimo emitido)
+        """
+        if levelno >= logging.WARNING:
+            return True, 0
+
+        with self._lock:
+            now = time.monotonic()
+            state = self._state.get(key)
+            if state is None:
+                state = self._state[key] = [self.rate_per_s, now, 0, 0]
+            state[2] += 1
+
+            if levelno < logging.INFO and (state[2] - 1) % self.debug_every:
+                state[3] += 1
+                return False, 0
+
+            if self.rate_per_s > 0:
+                tokens = min(self.rate_per_s, state[0] + (now - state[1]) * self.rate_per_s)
+                state[1] = now
+                if tokens < 1:
+                    state[0] = tokens
+                    state[3] += 1
+                    return False, 0
+                state[0] = tokens - 1
+
+            suppressed = int(state[3])
+            state[3] = 0
+            return True, suppressed
+
+
+class InterceptHandler(logging.Handler):
+    """Handler de logging estandar que reenvia los mensajes a Loguru."""
+
+    def __init__(self, sampler: LogSampler):
+        super().__init__()
+        self.sampler = sampler
+
+    def emit(self, record: logging.LogRecord) -> None:
+        allowed, suppressed = self.sampler.allow((record.name, record.lineno), record.levelno)
+        if not allowed:
+            return
+
+        message = record.getMessage()
+        if suppressed:
+            message = f"{message} (+{suppressed} suprimidos)"
+
+        try:
+            level = logger.level(record.levelname).name
+        except ValueError:
+            level = record.levelno
+
+        # Conservar el origen del mensaje original en el formato
+        logger.patch(
+            lambda r: r.update(name=record.name, function=record.funcName, line=record.lineno)
+        ).opt(exception=record.exc_info).log(level, message)
+
+
 def setup_logging():
     """
     Configura el sistema de logging con Loguru.
@@ -20,6 +119,7 @@ def setup_logging():
     - Formato legible para desarrollo
     - Rotación de archivos por tamaño
     - Niveles configurables
+    - Escritura en segundo plano y muestreo de mensajes repetidos
     """
     # Remover handler por defecto
     logger.remove()
@@ -41,7 +141,8 @@ def setup_logging():
             level="DEBUG",
             colorize=True,
             backtrace=True,
-            diagnose=True
+            diagnose=True,
+            enqueue=settings.LOG_ENQUEUE
         )
     else:
         # Formato JSON para producción
@@ -51,7 +152,8 @@ def setup_logging():
             level="INFO",
             serialize=True,  # Salida JSON
             backtrace=False,
-            diagnose=False
+            diagnose=False,
+            enqueue=settings.LOG_ENQUEUE
         )
     
     # Archivo de log con rotación
@@ -65,7 +167,8 @@ def setup_logging():
         compression="zip",  # Comprimir logs antiguos
         format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} | {message}",
         level="INFO",
-        encoding="utf-8"
+        encoding="utf-8",
+        enqueue=settings.LOG_ENQUEUE
     )
     
     # Log de errores separado
@@ -76,9 +179,17 @@ def setup_logging():
         compression="zip",
         format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} | {message}",
         level="ERROR",
-        encoding="utf-8"
+        encoding="utf-8",
+        enqueue=settings.LOG_ENQUEUE
     )
     
+    # Redirigir los loggers estandar a Loguru. Las librerias de terceros
+    # solo aportan WARNING o superior; los modulos de la app, DEBUG en modo
+    # desarrollo e INFO en produccion
+    sampler = LogSampler(settings.LOG_RATE_LIMIT_PER_S, settings.LOG_DEBUG_SAMPLE_EVERY)
+    logging.basicConfig(handlers=[InterceptHandler(sampler)], level=logging.WARNING, force=True)
+    logging.getLogger("app").setLevel(logging.DEBUG if settings.DEBUG else logging.INFO)
+
     logger.info("Sistema de logging configurado correctamente")
     
     return logger
@@ -0,0 +1,360 @@
+"""
+Metricas de la aplicacion en formato de exposicion de Prometheus.
+
+Registro propio y minimo (contadores, gauges e histogramas con etiquetas)
+para no depender de prometheus_client. Registrar una muestra es una
+busqueda binaria y un incremento bajo un lock por serie; el texto de
+exposicion solo se genera cuando se consulta /metrics.
+
+Uso:
+    from app.core.metrics import IMAGE_STAGE_SECONDS, timed
+
+    with timed(IMAGE_STAGE_SECONDS, stage="inference"):
+        ...
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from app.core.config import settings
+
+
+# Buckets por defecto en segundos (de 1 ms a 30 s)
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    """Escapa el valor de una etiqueta segun el formato de exposicion."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """Formatea las etiquetas de una serie: {a="1",b="2"}."""
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    """Formatea un valor numerico (enteros sin decimales)."""
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Base de las metricas: series por combinacion de etiquetas."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_series(self):
+        raise NotImplementedError
+
+    def labels(self, **labels: str):
+        """
+        Obtiene la serie para una combinacion de etiquetas.
+
+        Args:
+            **labels: Valor de cada etiqueta declarada
+
+        Returns:
+            Serie (se crea la primera vez)
+        """
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(key, self._new_series())
+        return series
+
+    def _items(self) -> List[Tuple[Tuple[str, ...], object]]:
+        with self._lock:
+            return list(self._series.items())
+
+    def collect(self) -> Iterator[str]:
+        """Genera las lineas de exposicion de la metrica."""
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for key, series in self._items():
+            yield from series.collect(self.name, self.labelnames, key)
+
+
+class _ValueSeries:
+    """Serie con un unico valor (contador o gauge)."""
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        if not settings.METRICS_ENABLED:
+            return
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float) -> None:
+        if not settings.METRICS_ENABLED:
+            return
+        self.value = value
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+    def collect(self, name, labelnames, key) -> Iterator[str]:
+        yield f"{name}{_format_labels(labelnames, key)} {_format_value(self.value)}"
+
+
+class Counter(_Metric):
+    """Contador monotono."""
+
+    kind = "counter"
+
+    def _new_series(self):
+        return _ValueSeries()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Incrementa la serie indicada por las etiquetas."""
+        self.labels(**labels).inc(amount)
+
+
+class Gauge(_Metric):
+    """Valor que puede subir y bajar."""
+
+    kind = "gauge"
+
+    def _new_series(self):
+        return _ValueSeries()
+
+    def set(self, value: float, **labels: str) -> None:
+        """Fija el valor de la serie indicada por las etiquetas."""
+        self.labels(**labels).set(value)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Suma a la serie indicada por las etiquetas."""
+        self.labels(**labels).inc(amount)
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        """Resta a la serie indicada por las etiquetas."""
+        self.labels(**labels).dec(amount)
+
+
+class _HistogramSeries:
+    """Serie de histograma: cuentas por bucket, suma y total."""
+
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        if not settings.METRICS_ENABLED:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def collect(self, name, labelnames, key) -> Iterator[str]:
+        with self._lock:
+            counts = list(self.counts)
+            total_sum = self.sum
+            total = self.count
+
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            yield f"{name}_bucket{_format_labels(labelnames, key, le)} {cumulative}"
+        yield f"{name}_sum{_format_labels(labelnames, key)} {_format_value(total_sum)}"
+        yield f"{name}_count{_format_labels(labelnames, key)} {total}"
+
+
+class Histogram(_Metric):
+    """Histograma de latencias (segundos)."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_series(self):
+        return _HistogramSeries(self.buckets)
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Registra una muestra en la serie indicada por las etiquetas."""
+        self.labels(**labels).observe(value)
+
+
+class Registry:
+    """Conjunto de metricas exportadas por /metrics."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Registra una metrica (el nombre debe ser unico)."""
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metrica duplicada: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Genera el texto de exposicion de todas las metricas."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels: str) -> Iterator[None]:
+    """
+    Mide la duracion del bloque y la registra en el histograma.
+
+    Args:
+        histogram: Histograma destino
+        **labels: Etiquetas de la serie
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+
+def record_cache_lookup(component: str, hit: bool) -> None:
+    """
+    Registra un acceso a una instancia singleton (modelos, procesadores).
+
+    Args:
+        component: Nombre del componente
+        hit: True si la instancia ya estaba creada
+    """
+    CACHE_LOOKUPS_TOTAL.inc(component=component, result="hit" if hit else "miss")
+
+
+# ===== Imagen =====
+IMAGE_STAGE_SECONDS = REGISTRY.register(Histogram(
+    "anonymizer_image_stage_seconds",
+    "Duracion de cada etapa del pipeline de imagen",
+    ["stage"]
+))
+IMAGES_PROCESSED_TOTAL = REGISTRY.register(Counter(
+    "anonymizer_images_processed_total",
+    "Imagenes procesadas",
+    ["pipeline"]
+))
+DETECTIONS_TOTAL = REGISTRY.register(Counter(
+    "anonymizer_detections_total",
+    "Detecciones por clase",
+    ["class_name"]
+))
+
+# ===== Video =====
+VIDEO_STAGE_SECONDS = REGISTRY.register(Histogram(
+    "anonymizer_video_stage_seconds",
+    "Duracion por frame de cada etapa del pipeline de video",
+    ["stage"]
+))
+VIDEO_FRAMES_TOTAL = REGISTRY.register(Counter(
+    "anonymizer_video_frames_total",
+    "Frames de video procesados"
+))
+VIDEO_FPS = REGISTRY.register(Gauge(
+    "anonymizer_video_fps",
+    "Frames por segundo del ultimo video procesado"
+))
+VIDEO_GATE_DECISIONS_TOTAL = REGISTRY.register(Counter(
+    "anonymizer_video_gate_decisions_total",
+    "Frames por decision del filtro de movimiento (detect/regions/reuse)",
+    ["decision"]
+))
+VIDEO_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "anonymizer_video_queue_depth",
+    "Mensajes de progreso pendientes de enviar, sumando todos los WebSocket"
+))
+VIDEO_PREVIEWS_DROPPED_TOTAL = REGISTRY.register(Counter(
+    "anonymizer_video_previews_dropped_total",
+    "Previews del WebSocket descartados porque el cliente no los habia recibido aun"
+))
+
+# ===== Video en directo =====
+LIVE_LATENCY_SECONDS = REGISTRY.register(Histogram(
+    "anonymizer_live_latency_seconds",
+    "Latencia de extremo a extremo de los streams en directo (captura -> salida)",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+))
+LIVE_FRAMES_DROPPED_TOTAL = REGISTRY.register(Counter(
+    "anonymizer_live_frames_dropped_total",
+    "Frames capturados en directo y descartados sin procesar (carga)"
+))
+LIVE_STREAMS = REGISTRY.register(Gauge(
+    "anonymizer_live_streams",
+    "Streams en directo activos"
+))
+
+# ===== Texto =====
+TEXT_REGEX_SECONDS = REGISTRY.register(Histogram(
+    "anonymizer_text_regex_seconds",
+    "Duracion de la deteccion regex por categoria",
+    ["category"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+))
+TEXT_LLM_SECONDS = REGISTRY.register(Histogram(
+    "anonymizer_text_llm_seconds",
+    "Duracion de las peticiones al LLM (ida y vuelta)",
+    ["status"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+))
+
+# ===== Modelos y cache =====
+MODEL_LOAD_SECONDS = REGISTRY.register(Histogram(
+    "anonymizer_model_load_seconds",
+    "Duracion de la carga de modelos",
+    ["model"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+))
+CACHE_LOOKUPS_TOTAL = REGISTRY.register(Counter(
+    "anonymizer_cache_lookups_total",
+    "Accesos a instancias singleton por resultado (hit/miss)",
+    ["component", "result"]
+))
@@ -0,0 +1,388 @@
+"""
+Perfilado por muestreo bajo demanda.
+
+Un hilo en segundo plano toma cada PROFILING_INTERVAL_MS la pila del hilo
+perfilado (sys._current_frames) y acumula las pilas repetidas. Al terminar
+se escribe un fichero speedscope (https://www.speedscope.app) o en formato
+"collapsed" (flamegraph.pl) en PROFILING_DIR.
+
+En la API el perfilado esta desactivado por defecto. Con
+PROFILING_ENABLED=true y PROFILING_TOKEN definido, una peticion a las rutas
+de PROFILED_PATHS con la cabecera `X-Profile: <token>` (o `?profile=<token>`)
+se ejecuta bajo el perfilador, como maximo una cada
+PROFILING_MIN_INTERVAL_S segundos. La respuesta indica el fichero generado
+en `X-Profile-File`.
+
+Uso offline (CLI, benchmarks):
+    from app.core.profiling import profile
+
+    with profile("benchmark", output_dir=Path("profiles")) as profiler:
+        ...
+    print(profiler.path)
+"""
+
+import hmac
+import json
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs
+import logging
+
+import anyio
+
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_FILE_HEADER = "X-Profile-File"
+PROFILE_QUERY_PARAM = "profile"
+
+# Rutas HTTP que se pueden perfilar bajo demanda
+PROFILED_PATHS = ("/api/anonymize", "/api/analyze-text", "/api/process-video")
+
+PROFILE_FORMATS = ("speedscope", "collapsed")
+
+# Profundidad maxima de pila registrada por muestra
+MAX_STACK_DEPTH = 256
+
+FrameKey = Tuple[str, str, int]
+
+
+class SamplingProfiler:
+    """
+    Perfilador por muestreo de un hilo.
+
+    Attributes:
+        thread_id: Hilo perfilado (por defecto, el que llama a start())
+        interval_s: Intervalo entre muestras en segundos
+        samples: Numero de muestras por pila (tupla de frames, raiz primero)
+        path: Fichero generado por write() (None hasta entonces)
+    """
+
+    def __init__(self, interval_s: Optional[float] = None, thread_id: Optional[int] = None):
+        self.interval_s = interval_s or settings.PROFILING_INTERVAL_MS / 1000.0
+        self.thread_id = thread_id
+        self.samples: Counter = Counter()
+        self.path: Optional[Path] = None
+        self._frame_keys: Dict[object, FrameKey] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+        self._elapsed = 0.0
+
+    def start(self) -> "SamplingProfiler":
+        """Empieza a muestrear el hilo indicado (o el actual)."""
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Detiene el muestreo."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._elapsed = time.perf_counter() - self._started
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[self._stack(frame)] += 1
+
+    def _stack(self, frame) -> Tuple[FrameKey, ...]:
+        """Pila del frame como tupla de (funcion, fichero, linea), raiz primero."""
+        stack: List[FrameKey] = []
+        while frame is not None and len(stack) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            key = self._frame_keys.get(code)
+            if key is None:
+                key = self._frame_keys[code] = (code.co_name, code.co_filename, code.co_firstlineno)
+            stack.append(key)
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    @property
+    def total_samples(self) -> int:
+        """Numero total de muestras tomadas."""
+        return sum(self.samples.values())
+
+    def to_speedscope(self, name: str) -> dict:
+        """
+        Convierte las muestras al formato de fichero de speedscope.
+
+        Args:
+            name: Nombre del perfil
+
+        Returns:
+            Diccionario con el esquema de speedscope (perfil 'sampled')
+        """
+        frames: List[dict] = []
+        index: Dict[FrameKey, int] = {}
+        stacks: List[List[int]] = []
+        weights: List[float] = []
+
+        for stack, count in self.samples.most_common():
+            indices = []
+            for key in stack:
+                if key not in index:
+                    index[key] = len(frames)
+                    func, filename, line = key
+                    frames.append({"name": func, "file": filename, "line": line})
+                indices.append(index[key])
+            stacks.append(indices)
+            weights.append(round(count * self.interval_s, 6))
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": settings.APP_NAME,
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": round(sum(weights), 6),
+                "samples": stacks,
+                "weights": weights,
+            }],
+        }
+
+    def to_collapsed(self) -> str:
+        """
+        Convierte las muestras al formato 'collapsed' de flamegraph.pl.
+
+        Returns:
+            Una linea 'raiz;...;hoja cuenta' por pila
+        """
+        lines = []
+        for stack, count in self.samples.most_common():
+            names = ";".join(
+                f"{func} ({Path(filename).name}:{line})" for func, filename, line in stack
+            )
+            lines.append(f"{names} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write(
+        self,
+        output_dir: Path,
+        name: str,
+        fmt: Optional[str] = None,
+        filename: Optional[str] = None
+    ) -> Path:
+        """
+        Escribe el perfil en un fichero.
+
+        Args:
+            output_dir: Directorio de salida
+            name: Nombre del perfil
+            fmt: 'speedscope' o 'collapsed'. Si None, usa settings.PROFILING_FORMAT
+            filename: Nombre del fichero. Si None, se genera con profile_filename()
+
+        Returns:
+            Ruta del fichero generado
+        """
+        fmt = fmt or settings.PROFILING_FORMAT
+        if fmt not in PROFILE_FORMATS:
+            raise ValueError(f"Formato de perfil invalido: {fmt}")
+
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        path = output_dir / (filename or profile_filename(name, fmt))
+
+        if fmt == "speedscope":
+            path.write_text(json.dumps(self.to_speedscope(name)), encoding="utf-8")
+        else:
+            path.write_text(self.to_collapsed(), encoding="utf-8")
+
+        self.path = path
+        logger.info(
+            f"Perfil guardado en {path} ({self.total_samples} muestras, {self._elapsed:.2f}s)"
+        )
+        return path
+
+
+def profile_filename(name: str, fmt: Optional[str] = None) -> str:
+    """
+    Nombre de fichero para un perfil: <nombre>_<fecha>.<extension>.
+
+    Args:
+        name: Nombre del perfil (se normaliza a caracteres seguros)
+        fmt: Formato del perfil
+
+    Returns:
+        Nombre del fichero
+    """
+    fmt = fmt or settings.PROFILING_FORMAT
+    safe_name = re.sub(r"[^A-Za-z0-9._-]+", "_", name).strip("_") or "profile"
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    extension = "speedscope.json" if fmt == "speedscope" else "folded"
+    return f"{safe_name}_{timestamp}.{extension}"
+
+
+@contextmanager
+def profile(
+    name: str,
+    output_dir: Optional[Path] = None,
+    interval_s: Optional[float] = None,
+    fmt: Optional[str] = None
+) -> Iterator[SamplingProfiler]:
+    """
+    Perfila el hilo actual durante el bloque y escribe el resultado.
+
+    Args:
+        name: Nombre del perfil
+        output_dir: Directorio de salida. Si None, usa settings.PROFILING_DIR
+        interval_s: Intervalo de muestreo. Si None, usa settings.PROFILING_INTERVAL_MS
+        fmt: Formato de salida. Si None, usa settings.PROFILING_FORMAT
+
+    Yields:
+        Perfilador (su atributo `path` se rellena al salir del bloque)
+    """
+    profiler = SamplingProfiler(interval_s=interval_s).start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        try:
+            profiler.write(output_dir or settings.PROFILING_DIR, name, fmt)
+        except (OSError, ValueError) as e:
+            logger.warning(f"No se pudo guardar el perfil {name}: {e}")
+
+
+class ProfileGate:
+    """
+    Controla quien puede perfilar y con que frecuencia.
+
+    Solo se concede con PROFILING_ENABLED, un token valido y si no hay otro
+    perfil en curso ni se perfilo hace menos de PROFILING_MIN_INTERVAL_S.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = False
+        self._last_start = float("-inf")
+
+    def acquire(self, token: Optional[str]) -> bool:
+        """
+        Intenta reservar el perfilador.
+
+        Args:
+            token: Token recibido en la peticion
+
+        Returns:
+            True si la peticion debe perfilarse (hay que llamar a release())
+        """
+        expected = settings.PROFILING_TOKEN
+        if not settings.PROFILING_ENABLED or not expected or not token:
+            return False
+        if not hmac.compare_digest(token.encode(), expected.encode()):
+            logger.warning("Token de perfilado invalido")
+            return False
+
+        with self._lock:
+            now = time.monotonic()
+            if self._active or now - self._last_start < settings.PROFILING_MIN_INTERVAL_S:
+                return False
+            self._active = True
+            self._last_start = now
+            return True
+
+    def release(self) -> None:
+        """Libera el perfilador."""
+        with self._lock:
+            self._active = False
+
+
+# Instancia global del control de perfilado
+_profile_gate_instance: Optional[ProfileGate] = None
+
+
+def get_profile_gate() -> ProfileGate:
+    """
+    Obtiene la instancia global del control de perfilado.
+
+    Returns:
+        Instancia de ProfileGate (singleton)
+    """
+    global _profile_gate_instance
+
+    if _profile_gate_instance is None:
+        _profile_gate_instance = ProfileGate()
+
+    return _profile_gate_instance
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI que perfila bajo demanda las peticiones de PROFILED_PATHS.
+
+    Los endpoints perfilados procesan la imagen o el texto en el hilo del
+    bucle de eventos, que es el que se muestrea; el fichero se escribe en
+    un hilo aparte al terminar la respuesta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["path"] not in PROFILED_PATHS
+            or not settings.PROFILING_ENABLED
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        token = headers.get(PROFILE_HEADER.lower().encode(), b"").decode("latin-1")
+        if not token:
+            query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+            token = (query.get(PROFILE_QUERY_PARAM) or [""])[0]
+
+        gate = get_profile_gate()
+        if not gate.acquire(token):
+            await self.app(scope, receive, send)
+            return
+
+        name = f"{scope['method']}{scope['path']}"
+        filename = profile_filename(name)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (PROFILE_FILE_HEADER.lower().encode(), filename.encode())
+                ]
+            await send(message)
+
+        profiler = SamplingProfiler().start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            try:
+                await anyio.to_thread.run_sync(self._write, profiler, name, filename)
+            finally:
+                gate.release()
+
+    @staticmethod
+    def _write(profiler: SamplingProfiler, name: str, filename: str) -> None:
+        try:
+            profiler.write(settings.PROFILING_DIR, name, filename=filename)
+        except (OSError, ValueError) as e:
+            logger.warning(f"No se pudo guardar el perfil {name}: {e}")
@@ -0,0 +1,234 @@
+"""
+Codificaciones alternativas de las respuestas de deteccion.
+
+El formato se elige con la cabecera Accept:
+- application/json (por defecto): modelos Pydantic, sin cambios
+- application/vnd.anonymizer+json: mismo JSON generado con orjson, sin
+  construir un modelo Pydantic por deteccion
+- application/vnd.anonymizer.packed+json: detecciones como arrays
+  compactos con la lista de campos en 'fields'
+- application/x-ndjson: una linea de resumen seguida de una linea por
+  deteccion, en streaming
+
+orjson es opcional; si no esta instalado se usa json con separadores
+compactos.
+"""
+
+import json
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from fastapi.responses import Response, StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+
+JSON_MEDIA_TYPE = "application/json"
+FAST_JSON_MEDIA_TYPE = "application/vnd.anonymizer+json"
+PACKED_MEDIA_TYPE = "application/vnd.anonymizer.packed+json"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+SUPPORTED_MEDIA_TYPES = (
+    JSON_MEDIA_TYPE,
+    FAST_JSON_MEDIA_TYPE,
+    PACKED_MEDIA_TYPE,
+    NDJSON_MEDIA_TYPE,
+)
+
+# Campos de cada box en el formato compacto
+BOX_FIELDS = ["x1", "y1", "x2", "y2", "confidence", "class"]
+
+# Lineas NDJSON por fragmento enviado
+NDJSON_CHUNK_LINES = 256
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Serializa a JSON compacto (orjson si esta disponible).
+
+    Args:
+        obj: Objeto serializable (dict, list, tipos basicos, numpy con orjson)
+
+    Returns:
+        JSON codificado en UTF-8
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """
+    Elige el formato de respuesta a partir de la cabecera Accept.
+
+    Se respeta el orden de la cabecera y los tipos con q=0; los tipos no
+    soportados (incluido */*) se ignoran.
+
+    Args:
+        accept: Valor de la cabecera Accept
+
+    Returns:
+        Uno de SUPPORTED_MEDIA_TYPES (JSON_MEDIA_TYPE por defecto)
+    """
+    if not accept:
+        return JSON_MEDIA_TYPE
+
+    candidates: List[Tuple[float, int, str]] = []
+    for index, part in enumerate(accept.split(",")):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if media_type.lower() in SUPPORTED_MEDIA_TYPES and quality > 0:
+            candidates.append((-quality, index, media_type.lower()))
+
+    if not candidates:
+        return JSON_MEDIA_TYPE
+
+    return min(candidates)[2]
+
+
+class FastJSONResponse(Response):
+    """Respuesta JSON serializada con orjson."""
+
+    media_type = FAST_JSON_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def box_dicts(boxes: Sequence[tuple], class_name: str) -> List[dict]:
+    """
+    Convierte detecciones (x1, y1, x2, y2, confidence) al formato BoundingBox.
+
+    Args:
+        boxes: Detecciones en tuplas
+        class_name: Clase de las detecciones
+
+    Returns:
+        Lista de diccionarios con las claves de BoundingBox
+    """
+    return [
+        {"x1": x1, "y1": y1, "x2": x2, "y2": y2, "confidence": conf, "class_name": class_name}
+        for x1, y1, x2, y2, conf in boxes
+    ]
+
+
+def pack_boxes(boxes_by_class: Dict[str, Sequence[tuple]]) -> dict:
+    """
+    Empaqueta las detecciones como arrays [x1, y1, x2, y2, confidence, clase].
+
+    Args:
+        boxes_by_class: Detecciones por nombre de clase
+
+    Returns:
+        Diccionario con 'fields', 'classes' (indice -> nombre) y 'boxes'
+    """
+    classes = list(boxes_by_class)
+    packed = [
+        [x1, y1, x2, y2, round(conf, 4), index]
+        for index, class_name in enumerate(classes)
+        for x1, y1, x2, y2, conf in boxes_by_class[class_name]
+    ]
+
+    return {"fields": BOX_FIELDS, "classes": classes, "boxes": packed}
+
+
+async def _ndjson_lines(summary: dict, records: Iterator[dict]) -> AsyncIterator[bytes]:
+    """
+    Genera la linea de resumen y una linea por registro.
+
+    Generador asincrono para que Starlette no pase cada fragmento por el
+    pool de hilos; las lineas se agrupan en bloques de NDJSON_CHUNK_LINES.
+    """
+    yield dumps(summary) + b"\n"
+
+    chunk = []
+    for record in records:
+        chunk.append(dumps(record))
+        if len(chunk) >= NDJSON_CHUNK_LINES:
+            yield b"\n".join(chunk) + b"\n"
+            chunk = []
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
+
+
+def render_boxes(
+    media_type: str,
+    boxes_by_class: Dict[str, Sequence[tuple]],
+    summary: dict,
+    headers: Optional[dict] = None
+) -> Response:
+    """
+    Codifica detecciones de imagen en formato compacto o NDJSON.
+
+    Args:
+        media_type: PACKED_MEDIA_TYPE o NDJSON_MEDIA_TYPE
+        boxes_by_class: Detecciones (x1, y1, x2, y2, confidence) por clase
+        summary: Campos de resumen (totales, tiempos...)
+        headers: Cabeceras adicionales
+
+    Returns:
+        Respuesta codificada
+    """
+    if media_type == NDJSON_MEDIA_TYPE:
+        records = (
+            {"class": class_name, "box": [x1, y1, x2, y2], "confidence": conf}
+            for class_name, boxes in boxes_by_class.items()
+            for x1, y1, x2, y2, conf in boxes
+        )
+        return StreamingResponse(
+            _ndjson_lines(summary, records),
+            media_type=NDJSON_MEDIA_TYPE,
+            headers=headers
+        )
+
+    return Response(
+        content=dumps({**summary, **pack_boxes(boxes_by_class)}),
+        media_type=PACKED_MEDIA_TYPE,
+        headers=headers
+    )
+
+
+def render_records(
+    media_type: str,
+    records: List[dict],
+    fields: List[str],
+    summary: dict,
+    headers: Optional[dict] = None
+) -> Response:
+    """
+    Codifica una lista de detecciones (diccionarios) en el formato elegido.
+
+    Args:
+        media_type: FAST_JSON_MEDIA_TYPE, PACKED_MEDIA_TYPE o NDJSON_MEDIA_TYPE
+        records: Detecciones
+        fields: Campos de cada deteccion en el formato compacto
+        summary: Campos de resumen. En JSON las detecciones van en 'detections'
+        headers: Cabeceras adicionales
+
+    Returns:
+        Respuesta codificada
+    """
+    if media_type == NDJSON_MEDIA_TYPE:
+        return StreamingResponse(
+            _ndjson_lines(summary, iter(records)),
+            media_type=NDJSON_MEDIA_TYPE,
+            headers=headers
+        )
+
+    if media_type == PACKED_MEDIA_TYPE:
+        packed = [[record.get(field) for field in fields] for record in records]
+        return Response(
+            content=dumps({**summary, "fields": fields, "detections": packed}),
+            media_type=PACKED_MEDIA_TYPE,
+            headers=headers
+        )
+
+    return FastJSONResponse({**summary, "detections": records}, headers=headers)
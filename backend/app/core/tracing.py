@@ -0,0 +1,464 @@
+"""
+Trazas por peticion con spans por etapa.
+
+Cada peticion HTTP abre un span raiz (RequestTracingMiddleware) con su
+request id; los servicios y modelos abren spans hijos con `span()`. El
+span activo se propaga con contextvars, por lo que no hace falta pasarlo
+como argumento entre endpoints, servicios y modelos. Fuera de una peticion
+(scripts, procesamiento por lotes) `span()` no hace nada.
+
+Al terminar la peticion:
+- si supera TRACE_SLOW_MS se escribe el arbol completo de spans en el log
+- si hay exportador configurado (TRACE_EXPORT_PATH o TRACE_EXPORT_URL), la
+  traza se exporta en formato OTLP/JSON desde un hilo en segundo plano
+
+Cada span guarda como mucho TRACE_MAX_CHILDREN hijos; los siguientes se
+ejecutan igual pero solo se cuentan, para que un bucle por frame (p. ej. la
+deteccion de cada frame de /api/process-video) no haga crecer la traza sin
+limite.
+
+Uso:
+    from app.core.tracing import span
+
+    with span("image.decode", bytes=len(data)):
+        ...
+"""
+
+import contextvars
+import json
+import logging
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Request ids aceptados desde el cliente (el resto se sustituye por uno nuevo)
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+# Tipos de span OTLP
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+
+# Codigos de estado OTLP
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+
+class Span:
+    """
+    Intervalo de tiempo de una etapa dentro de una traza.
+
+    Attributes:
+        name: Nombre de la etapa (p. ej. 'image.decode')
+        trace_id: Identificador de la traza (32 hex)
+        span_id: Identificador del span (16 hex)
+        parent: Span padre (None en el raiz)
+        attributes: Atributos de la etapa
+        children: Spans hijos en orden de creacion
+        dropped_children: Spans hijos descartados por TRACE_MAX_CHILDREN
+    """
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent", "kind", "attributes",
+        "children", "dropped_children", "start_ns", "end_ns", "error"
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent: Optional["Span"] = None,
+        kind: int = SPAN_KIND_INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent = parent
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.children: List["Span"] = []
+        self.dropped_children = 0
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Anade o sustituye un atributo del span."""
+        self.attributes[key] = value
+
+    def end(self) -> None:
+        """Cierra el span (idempotente)."""
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+
+    @property
+    def duration_ms(self) -> float:
+        """Duracion del span en milisegundos (hasta ahora si sigue abierto)."""
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def walk(self) -> Iterator["Span"]:
+        """Recorre el span y sus descendientes en profundidad."""
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def format_tree(self, depth: int = 0) -> str:
+        """
+        Representa el arbol de spans con duraciones, para el log.
+
+        Args:
+            depth: Nivel de indentacion inicial
+
+        Returns:
+            Una linea por span
+        """
+        attributes = " ".join(f"{key}={value}" for key, value in self.attributes.items())
+        status = f" ERROR({self.error})" if self.error else ""
+        line = f"{'  ' * depth}{self.name} {self.duration_ms:.1f}ms{status} {attributes}"
+        lines = [line.rstrip()]
+        for child in self.children:
+            lines.append(child.format_tree(depth + 1))
+        if self.dropped_children:
+            lines.append(f"{'  ' * (depth + 1)}... {self.dropped_children} spans descartados")
+        return "\n".join(lines)
+
+
+# Span activo en el contexto actual (peticion, tarea o hilo)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+def current_span() -> Optional[Span]:
+    """Devuelve el span activo o None fuera de una traza."""
+    return _current_span.get()
+
+
+def current_request_id() -> Optional[str]:
+    """Devuelve el request id de la traza activa o None."""
+    active = _current_span.get()
+    if active is None:
+        return None
+    while active.parent is not None:
+        active = active.parent
+    return active.attributes.get("request.id")
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Abre un span hijo del span activo durante el bloque.
+
+    Si no hay una traza activa no se crea nada y se devuelve None. Si el
+    padre ya tiene TRACE_MAX_CHILDREN hijos, el span se crea pero no se
+    anade al arbol (solo se cuenta en `dropped_children` del padre).
+
+    Args:
+        name: Nombre de la etapa
+        **attributes: Atributos del span
+
+    Yields:
+        Span creado (o None)
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(name, parent.trace_id, parent=parent, attributes=attributes)
+    if len(parent.children) < settings.TRACE_MAX_CHILDREN:
+        parent.children.append(child)
+    else:
+        parent.dropped_children += 1
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = type(e).__name__
+        raise
+    finally:
+        child.end()
+        _current_span.reset(token)
+
+
+def traced(name: str) -> Callable:
+    """
+    Decorador que ejecuta la funcion dentro de un span.
+
+    Fuera de una traza llama a la funcion directamente, sin coste adicional.
+
+    Args:
+        name: Nombre del span
+    """
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def resolve_request_id(value: Optional[str]) -> str:
+    """
+    Usa el request id recibido si es valido o genera uno nuevo.
+
+    Args:
+        value: Valor de la cabecera X-Request-ID
+
+    Returns:
+        Request id
+    """
+    if value and _REQUEST_ID_PATTERN.match(value):
+        return value
+    return uuid.uuid4().hex
+
+
+# ===== Exportacion OTLP/JSON =====
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    """Convierte un atributo al AnyValue de OTLP/JSON."""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+def to_otlp(root: Span) -> Dict[str, Any]:
+    """
+    Convierte una traza al formato OTLP/JSON (ExportTraceServiceRequest).
+
+    Args:
+        root: Span raiz de la traza
+
+    Returns:
+        Diccionario listo para serializar
+    """
+    spans = []
+    for item in root.walk():
+        attributes = dict(item.attributes)
+        if item.dropped_children:
+            attributes["span.dropped_children"] = item.dropped_children
+        record = {
+            "traceId": item.trace_id,
+            "spanId": item.span_id,
+            "name": item.name,
+            "kind": item.kind,
+            "startTimeUnixNano": str(item.start_ns),
+            "endTimeUnixNano": str(item.end_ns or item.start_ns),
+            "attributes": _otlp_attributes(attributes),
+            "status": (
+                {"code": STATUS_ERROR, "message": item.error}
+                if item.error else {"code": STATUS_UNSET}
+            ),
+        }
+        if item.parent is not None:
+            record["parentSpanId"] = item.parent.span_id
+        spans.append(record)
+
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({
+                "service.name": settings.TRACE_SERVICE_NAME,
+                "service.version": settings.APP_VERSION,
+            })},
+            "scopeSpans": [{
+                "scope": {"name": "app.core.tracing"},
+                "spans": spans,
+            }],
+        }]
+    }
+
+
+class TraceExporter:
+    """
+    Exporta trazas en OTLP/JSON a un fichero (una traza por linea) y/o a
+    un colector OTLP/HTTP, desde un hilo en segundo plano para no anadir
+    latencia a las peticiones.
+
+    Attributes:
+        path: Fichero de salida (JSON lines) o None
+        url: Endpoint OTLP/HTTP (p. ej. http://localhost:4318/v1/traces) o None
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        url: Optional[str] = None,
+        max_pending: int = 1000
+    ):
+        self.path = Path(path) if path else None
+        self.url = url
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, root: Span) -> None:
+        """Encola una traza terminada (se descarta si la cola esta llena)."""
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(root)
+        except queue.Full:
+            logger.debug("Cola de trazas llena: traza descartada")
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Espera a que se exporten las trazas encoladas."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="trace-exporter", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            root = self._queue.get()
+            try:
+                self._write(to_otlp(root))
+            except Exception as e:
+                logger.warning(f"No se pudo exportar la traza {root.trace_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, payload: Dict[str, Any]) -> None:
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(payload, separators=(",", ":")) + "\n")
+
+        if self.url:
+            import requests
+
+            response = requests.post(self.url, json=payload, timeout=5)
+            if response.status_code >= 400:
+                logger.warning(f"El colector de trazas respondio {response.status_code}")
+
+
+# Instancia global del exportador
+_trace_exporter_instance: Optional[TraceExporter] = None
+
+
+def get_trace_exporter() -> Optional[TraceExporter]:
+    """
+    Obtiene la instancia global del exportador de trazas.
+
+    Returns:
+        TraceExporter (singleton) o None si no hay destino configurado
+    """
+    global _trace_exporter_instance
+
+    exporting = settings.TRACE_EXPORT_PATH or settings.TRACE_EXPORT_URL
+    if _trace_exporter_instance is None and exporting:
+        _trace_exporter_instance = TraceExporter(
+            path=settings.TRACE_EXPORT_PATH,
+            url=settings.TRACE_EXPORT_URL
+        )
+
+    return _trace_exporter_instance
+
+
+def finish_trace(root: Span) -> None:
+    """
+    Cierra la traza: vuelca el arbol si es lenta y la exporta si procede.
+
+    Las trazas lentas se exportan siempre; el resto segun TRACE_SAMPLE_RATE.
+
+    Args:
+        root: Span raiz de la peticion
+    """
+    root.end()
+    slow = root.duration_ms >= settings.TRACE_SLOW_MS
+
+    if slow:
+        logger.warning(
+            f"Peticion lenta ({root.duration_ms:.1f}ms >= {settings.TRACE_SLOW_MS:.0f}ms) "
+            f"request_id={root.attributes.get('request.id')}\n{root.format_tree()}"
+        )
+
+    exporter = get_trace_exporter()
+    if exporter is not None and (slow or random.random() < settings.TRACE_SAMPLE_RATE):
+        exporter.export(root)
+
+
+class RequestTracingMiddleware:
+    """
+    Middleware ASGI que abre el span raiz de cada peticion HTTP.
+
+    Asigna el request id (cabecera X-Request-ID del cliente o uno nuevo), lo
+    devuelve en la respuesta y cierra la traza cuando se ha enviado el cuerpo
+    completo, de modo que las respuestas en streaming quedan incluidas.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        request_id = resolve_request_id(
+            headers.get(REQUEST_ID_HEADER.lower().encode(), b"").decode("latin-1")
+        )
+
+        root = Span(
+            f"{scope['method']} {scope['path']}",
+            trace_id=uuid.uuid4().hex,
+            kind=SPAN_KIND_SERVER,
+            attributes={
+                "request.id": request_id,
+                "http.method": scope["method"],
+                "http.target": scope["path"],
+            }
+        )
+        token = _current_span.set(root)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set_attribute("http.status_code", message["status"])
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (REQUEST_ID_HEADER.lower().encode(), request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            root.error = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            finish_trace(root)
@@ -0,0 +1,115 @@
+"""
+Limite de tamano de las subidas, aplicado mientras llega el cuerpo.
+
+UploadLimitMiddleware rechaza con 413 las peticiones a UPLOAD_LIMITED_PATHS
+cuyo cuerpo supera el limite:
+
+- Con Content-Length mayor que el limite, antes de leer el cuerpo.
+- Sin Content-Length (transferencia por bloques), en cuanto los bytes
+  recibidos superan el limite: se corta la lectura y no se sigue volcando
+  la subida a disco.
+"""
+
+import json
+from typing import Callable, Dict, Optional
+import logging
+
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Ruta -> limite en bytes (se evalua en cada peticion: sigue a settings)
+UPLOAD_LIMITED_PATHS: Dict[str, Callable[[], int]] = {
+    "/api/process-video": lambda: settings.VIDEO_MAX_UPLOAD_MB * 1024 * 1024,
+    "/api/video-info": lambda: settings.VIDEO_MAX_UPLOAD_MB * 1024 * 1024,
+}
+
+
+class UploadTooLargeError(Exception):
+    """El cuerpo de la peticion supera el limite de subida."""
+
+
+def upload_limit(path: str) -> Optional[int]:
+    """Limite en bytes del cuerpo de una ruta (None = sin limite)."""
+    limit = UPLOAD_LIMITED_PATHS.get(path)
+    return limit() if limit is not None else None
+
+
+class UploadLimitMiddleware:
+    """
+    Middleware ASGI que corta las subidas que superan el limite de su ruta.
+
+    Si el limite se supera a mitad del cuerpo, la lectura falla y la
+    respuesta de error de la aplicacion se sustituye por un 413.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = upload_limit(scope["path"])
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        length = headers.get(b"content-length", b"")
+        if length.isdigit() and int(length) > limit:
+            await self._reject(send, limit)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    raise UploadTooLargeError(f"Subida de mas de {limit} bytes")
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if exceeded and not response_started:
+                # La respuesta de error de la aplicacion se sustituye por el 413
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadTooLargeError:
+            pass
+        except Exception:
+            if not exceeded or response_started:
+                raise
+
+        if exceeded and not response_started:
+            logger.warning(f"Subida a {scope['path']} cortada: supera {limit} bytes")
+            await self._reject(send, limit)
+
+    @staticmethod
+    async def _reject(send, limit: int) -> None:
+        body = json.dumps({
+            "detail": f"Archivo demasiado grande (maximo {limit // (1024 * 1024)} MB)"
+        }).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
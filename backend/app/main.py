@@ -4,12 +4,21 @@ Aplicacion principal de FastAPI.
 Sistema automatico de anonimizacion de rostros y matriculas en imagenes.
 """
 
+import asyncio
+
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.config import settings
 from app.core.logging_config import get_logger
-from app.api.endpoints import health, detect, anonymize, video, classes, text
+from app.core.profiling import ProfilingMiddleware
+from app.core.tracing import RequestTracingMiddleware
+from app.core.upload_limits import UploadLimitMiddleware
+from app.api.endpoints import health, detect, anonymize, batch, video, live, classes, text, metrics
+from app.services.detection_track import cleanup_tracks
+from app.services.live_stream import get_live_manager
+from app.services.output_store import get_output_store
 
 
 logger = get_logger(__name__)
@@ -38,24 +47,52 @@ app.add_middleware(
         "X-Total-Detections",
         "X-Processing-Time-Ms",
         "X-Anonymization-Method",
+        "X-Detections-By-Class",
+        "X-Models-Used",
+        "X-Adaptive-Refined",
+        "X-Refine-Rate",
+        "X-Region-Reencode",
         "X-Total-Faces",
         "X-Total-Plates",
         "X-Processing-Time",
         "X-Frames-Processed",
         "X-Frames-With-Detections",
-        "Content-Disposition"
+        "X-Frames-Detected",
+        "X-Frames-Skipped",
+        "X-Render-Only",
+        "X-Output-Id",
+        "X-Output-URL",
+        "Content-Range",
+        "Accept-Ranges",
+        "Content-Disposition",
+        "X-Request-ID",
+        "X-Profile-File"
     ],
 )
 
+# Perfilado bajo demanda de peticiones concretas (ver app/core/profiling.py)
+app.add_middleware(ProfilingMiddleware)
+
+# Limite de tamano de las subidas de video (ver app/core/upload_limits.py)
+app.add_middleware(UploadLimitMiddleware)
+
+# Span raiz y request id de cada peticion (ver app/core/tracing.py)
+app.add_middleware(RequestTracingMiddleware)
+
 
 # Registrar routers
 app.include_router(health.router, prefix="/api")
 app.include_router(detect.router, prefix="/api")
 app.include_router(anonymize.router, prefix="/api")
+app.include_router(batch.router, prefix="/api")
 app.include_router(video.router, prefix="/api")
+app.include_router(live.router, prefix="/api")
 app.include_router(classes.router, prefix="/api")
 app.include_router(text.router, prefix="/api")
 
+# /metrics fuera de /api (ruta habitual de los scrapers de Prometheus)
+app.include_router(metrics.router)
+
 
 @app.on_event("startup")
 async def startup_event():
@@ -67,13 +104,34 @@ async def startup_event():
     logger.info(f"Documentacion en http://{settings.HOST}:{settings.PORT}/docs")
     logger.info("=" * 60)
 
+    app.state.output_cleanup = asyncio.create_task(_cleanup_outputs())
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Evento de cierre de la aplicacion."""
+    cleanup = getattr(app.state, "output_cleanup", None)
+    if cleanup is not None:
+        cleanup.cancel()
+    await run_in_threadpool(get_live_manager().stop_all)
     logger.info("Servidor detenido")
 
 
+async def _cleanup_outputs():
+    """
+    Borra periodicamente los videos procesados (OUTPUT_TTL_HOURS) y las
+    pistas de detecciones (VIDEO_TRACK_TTL_HOURS) caducados.
+    """
+    store = get_output_store()
+    while True:
+        try:
+            await run_in_threadpool(store.cleanup)
+            await run_in_threadpool(cleanup_tracks)
+        except Exception as e:
+            logger.warning(f"Error limpiando salidas caducadas: {e}")
+        await asyncio.sleep(settings.OUTPUT_CLEANUP_INTERVAL_S)
+
+
 @app.get("/", tags=["Root"])
 async def root():
     """Endpoint raiz."""
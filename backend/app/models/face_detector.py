@@ -12,6 +12,9 @@ from ultralytics import YOLO
 import logging
 
 from app.core.config import settings
+from app.core.metrics import MODEL_LOAD_SECONDS, record_cache_lookup, timed
+from app.core.tracing import span, traced
+from app.models.inference import build_inference_kwargs, configure_cpu_threads, with_imgsz
 
 
 logger = logging.getLogger(__name__)
@@ -31,7 +34,10 @@ class FaceDetector:
         self,
         model_path: Optional[Path] = None,
         confidence: float = 0.5,
-        iou: float = 0.45
+        iou: float = 0.45,
+        imgsz: Optional[int] = None,
+        half: Optional[bool] = None,
+        device: Optional[str] = None
     ):
         """
         Inicializa el detector de rostros.
@@ -40,27 +46,34 @@ class FaceDetector:
             model_path: Ruta al modelo entrenado (.pt). Si None, usa el de config
             confidence: Umbral de confianza minima (0-1)
             iou: Umbral de IoU para NMS (0-1)
+            imgsz: Tamano de entrada. Si None, usa settings.INFERENCE_IMGSZ
+            half: Si usar FP16 (solo GPU). Si None, usa settings.INFERENCE_HALF
+            device: Dispositivo de inferencia. Si None, usa settings.INFERENCE_DEVICE
         """
         self.model_path = model_path or settings.FACE_MODEL_PATH
         self.confidence = confidence
         self.iou = iou
+        self.inference = build_inference_kwargs(imgsz, half, device)
         self.model = None
 
         self._load_model()
 
     def _load_model(self) -> None:
         """Carga el modelo YOLOv8 entrenado."""
+        configure_cpu_threads()
+
         try:
-            if not self.model_path.exists():
-                logger.warning(
-                    f"Modelo de rostros no encontrado en {self.model_path}. "
-                    "Usando modelo pre-entrenado base."
-                )
-                # Si no existe el modelo entrenado, usar YOLOv8n base
-                self.model = YOLO('yolov8n.pt')
-            else:
-                logger.info(f"Cargando modelo de rostros desde {self.model_path}")
-                self.model = YOLO(str(self.model_path))
+            with span("model.face.load"), timed(MODEL_LOAD_SECONDS, model="face"):
+                if not self.model_path.exists():
+                    logger.warning(
+                        f"Modelo de rostros no encontrado en {self.model_path}. "
+                        "Usando modelo pre-entrenado base."
+                    )
+                    # Si no existe el modelo entrenado, usar YOLOv8n base
+                    self.model = YOLO('yolov8n.pt')
+                else:
+                    logger.info(f"Cargando modelo de rostros desde {self.model_path}")
+                    self.model = YOLO(str(self.model_path))
 
             logger.info("Modelo de rostros cargado correctamente")
 
@@ -68,15 +81,18 @@ class FaceDetector:
             logger.error(f"Error al cargar modelo de rostros: {e}")
             raise
 
+    @traced("model.face.detect")
     def detect(
         self,
-        image: Union[str, Path, np.ndarray]
+        image: Union[str, Path, np.ndarray],
+        imgsz: Optional[int] = None
     ) -> List[Tuple[int, int, int, int, float]]:
         """
         Detecta rostros en una imagen.
 
         Args:
             image: Ruta a la imagen o array numpy (BGR)
+            imgsz: Tamano de entrada para esta llamada (None = el del detector)
 
         Returns:
             Lista de tuplas (x1, y1, x2, y2, confidence) para cada rostro detectado
@@ -91,7 +107,8 @@ class FaceDetector:
                 image,
                 conf=self.confidence,
                 iou=self.iou,
-                verbose=False
+                verbose=False,
+                **with_imgsz(self.inference, imgsz)
             )
 
             # Extraer bounding boxes
@@ -113,22 +130,25 @@ class FaceDetector:
                         conf
                     ))
 
-            logger.info(f"Detectados {len(detections)} rostros")
+            logger.debug(f"Detectados {len(detections)} rostros")
             return detections
 
         except Exception as e:
             logger.error(f"Error en deteccion de rostros: {e}")
             raise ValueError(f"Error procesando imagen: {e}")
 
+    @traced("model.face.detect_batch")
     def detect_batch(
         self,
-        images: List[Union[str, Path, np.ndarray]]
+        images: List[Union[str, Path, np.ndarray]],
+        imgsz: Optional[int] = None
     ) -> List[List[Tuple[int, int, int, int, float]]]:
         """
         Detecta rostros en multiples imagenes.
 
         Args:
             images: Lista de rutas a imagenes o arrays numpy
+            imgsz: Tamano de entrada para esta llamada (None = el del detector)
 
         Returns:
             Lista de listas de detecciones, una por imagen
@@ -136,7 +156,7 @@ class FaceDetector:
         results = []
 
         for image in images:
-            detections = self.detect(image)
+            detections = self.detect(image, imgsz=imgsz)
             results.append(detections)
 
         return results
@@ -154,6 +174,7 @@ class FaceDetector:
             "task": "face_detection",
             "confidence_threshold": self.confidence,
             "iou_threshold": self.iou,
+            "inference": self.inference,
             "classes": ["face"]
         }
 
@@ -171,6 +192,7 @@ def get_face_detector() -> FaceDetector:
     """
     global _face_detector_instance
 
+    record_cache_lookup("face_detector", _face_detector_instance is not None)
     if _face_detector_instance is None:
         _face_detector_instance = FaceDetector(
             confidence=settings.DETECTION_CONFIDENCE,
@@ -0,0 +1,123 @@
+"""
+Parametros de inferencia compartidos por los detectores YOLOv8.
+
+Resuelve tamano de entrada, precision (FP16) y dispositivo a partir de la
+configuracion global y de los valores indicados por peticion.
+"""
+
+from typing import Optional
+import logging
+
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+# Hilos de CPU ya configurados (torch.set_num_threads es global al proceso)
+_configured_cpu_threads: Optional[int] = None
+
+
+def resolve_device(device: Optional[str] = None) -> str:
+    """
+    Determina el dispositivo de inferencia.
+
+    Args:
+        device: Dispositivo solicitado ('cpu', 'cuda', 'cuda:0', 'mps'...).
+                Si None, usa settings.INFERENCE_DEVICE o, si tampoco esta
+                definido, GPU si esta disponible y CPU en caso contrario.
+
+    Returns:
+        Nombre del dispositivo
+    """
+    device = device or settings.INFERENCE_DEVICE
+    if device:
+        return device
+
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return "cuda:0"
+    except ImportError:
+        pass
+
+    return "cpu"
+
+
+def supports_half(device: str) -> bool:
+    """FP16 solo esta soportado en GPU CUDA."""
+    return device.startswith("cuda") or device.isdigit()
+
+
+def configure_cpu_threads(threads: Optional[int] = None) -> None:
+    """
+    Limita los hilos de PyTorch para inferencia en CPU.
+
+    Args:
+        threads: Numero de hilos. Si None, usa settings.INFERENCE_CPU_THREADS
+                 (si tampoco esta definido no se modifica nada)
+    """
+    global _configured_cpu_threads
+
+    threads = threads or settings.INFERENCE_CPU_THREADS
+    if not threads or threads == _configured_cpu_threads:
+        return
+
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        _configured_cpu_threads = threads
+        logger.info(f"Hilos de CPU para inferencia: {threads}")
+    except ImportError:
+        pass
+
+
+def build_inference_kwargs(
+    imgsz: Optional[int] = None,
+    half: Optional[bool] = None,
+    device: Optional[str] = None
+) -> dict:
+    """
+    Construye los argumentos de inferencia para una llamada a YOLO.
+
+    Args:
+        imgsz: Tamano de entrada (lado mayor, multiplo de 32)
+        half: Si usar FP16. Se ignora si el dispositivo no lo soporta
+        device: Dispositivo de inferencia
+
+    Returns:
+        Diccionario con imgsz, half y device
+    """
+    device = resolve_device(device)
+
+    if half is None:
+        half = settings.INFERENCE_HALF
+    if half and not supports_half(device):
+        half = False
+
+    return {
+        "imgsz": imgsz or settings.INFERENCE_IMGSZ,
+        "half": half,
+        "device": device,
+    }
+
+
+def with_imgsz(inference_kwargs: dict, imgsz: Optional[int] = None) -> dict:
+    """
+    Aplica un tamano de entrada indicado por peticion.
+
+    FP16 y dispositivo se fijan al cargar el modelo (Ultralytics los aplica
+    al preparar el predictor), por lo que solo imgsz se puede cambiar en
+    cada llamada.
+
+    Args:
+        inference_kwargs: Argumentos base del detector
+        imgsz: Tamano de entrada para esta llamada (None = el del detector)
+
+    Returns:
+        Copia de los argumentos con el tamano aplicado
+    """
+    kwargs = dict(inference_kwargs)
+    if imgsz:
+        kwargs["imgsz"] = imgsz
+    return kwargs
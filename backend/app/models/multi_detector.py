@@ -13,6 +13,9 @@ from ultralytics import YOLO
 import logging
 
 from app.core.config import settings
+from app.core.metrics import MODEL_LOAD_SECONDS, record_cache_lookup, timed
+from app.core.tracing import span, traced
+from app.models.inference import build_inference_kwargs, configure_cpu_threads, with_imgsz
 
 logger = logging.getLogger(__name__)
 
@@ -124,6 +127,12 @@ COCO_CLASSES = {
     'toothbrush': 79
 }
 
+# Clases del modelo unificado entrenado (faces + plates)
+UNIFIED_CLASSES = {
+    'face': 0,
+    'plate': 1
+}
+
 # Categorías para organizar en UI
 COCO_CATEGORIES = {
     'sensitive': {
@@ -172,7 +181,10 @@ class MultiDetector:
         self,
         unified_model_path: Optional[Path] = None,
         confidence: float = 0.5,
-        iou: float = 0.45
+        iou: float = 0.45,
+        imgsz: Optional[int] = None,
+        half: Optional[bool] = None,
+        device: Optional[str] = None
     ):
         """
         Inicializa el detector multi-modelo.
@@ -181,9 +193,15 @@ class MultiDetector:
             unified_model_path: Ruta al modelo unificado. Si None, usa configuración
             confidence: Umbral de confianza mínima (0-1)
             iou: Umbral de IoU para NMS (0-1)
+            imgsz: Tamano de entrada. Si None, usa settings.INFERENCE_IMGSZ
+            half: Si usar FP16 (solo GPU). Si None, usa settings.INFERENCE_HALF
+            device: Dispositivo de inferencia. Si None, usa settings.INFERENCE_DEVICE
         """
         self.confidence = confidence
         self.iou = iou
+        self.inference = build_inference_kwargs(imgsz, half, device)
+
+        configure_cpu_threads()
 
         # Modelo unificado (faces + plates)
         self.unified_model = None
@@ -192,20 +210,78 @@ class MultiDetector:
 
         if unified_model_path and unified_model_path.exists():
             logger.info(f"Cargando modelo unificado: {unified_model_path}")
-            self.unified_model = YOLO(str(unified_model_path))
+            with span("model.multi_unified.load"), timed(MODEL_LOAD_SECONDS, model="multi_unified"):
+                self.unified_model = YOLO(str(unified_model_path))
         else:
             logger.warning("Modelo unificado no encontrado")
 
-        # Modelo COCO base (80 clases)
-        logger.info("Cargando YOLOv8n base (COCO)")
-        self.coco_model = YOLO('yolov8n.pt')
+        # Modelo COCO base (80 clases). Se carga bajo demanda la primera vez
+        # que se solicita una clase COCO, para no pagar su coste en peticiones
+        # que solo piden rostros/matriculas.
+        self.coco_model = None
 
         logger.info("MultiDetector inicializado correctamente")
 
+    def _get_coco_model(self) -> YOLO:
+        """Obtiene el modelo COCO base, cargandolo si es necesario."""
+        if self.coco_model is None:
+            logger.info("Cargando YOLOv8n base (COCO)")
+            with span("model.coco.load"), timed(MODEL_LOAD_SECONDS, model="coco"):
+                self.coco_model = YOLO('yolov8n.pt')
+        return self.coco_model
+
+    @staticmethod
+    def resolve_class_name(class_id: str) -> Optional[str]:
+        """
+        Traduce un id de clase del catalogo (/api/classes) al nombre interno.
+
+        Los ids del catalogo usan guion bajo ('cell_phone') mientras que
+        COCO usa espacios ('cell phone').
+
+        Args:
+            class_id: Id de la clase
+
+        Returns:
+            Nombre de la clase en el modelo correspondiente, o None si no existe
+        """
+        if class_id in UNIFIED_CLASSES or class_id in COCO_CLASSES:
+            return class_id
+
+        name = class_id.replace('_', ' ')
+        if name in COCO_CLASSES:
+            return name
+
+        return None
+
+    @classmethod
+    def plan_models(cls, classes_to_detect: List[str]) -> Dict[str, List[str]]:
+        """
+        Reparte las clases solicitadas entre los modelos disponibles.
+
+        Args:
+            classes_to_detect: Ids de clases a detectar
+
+        Returns:
+            Diccionario {'unified': [...], 'coco': [...]} con los ids que
+            debe resolver cada modelo. Un modelo sin clases no se invoca.
+        """
+        plan = {'unified': [], 'coco': []}
+
+        for class_id in classes_to_detect:
+            name = cls.resolve_class_name(class_id)
+            if name in UNIFIED_CLASSES:
+                plan['unified'].append(class_id)
+            elif name in COCO_CLASSES:
+                plan['coco'].append(class_id)
+
+        return plan
+
+    @traced("model.multi.detect")
     def detect(
         self,
         image: Union[str, Path, np.ndarray],
-        classes_to_detect: Optional[List[str]] = None
+        classes_to_detect: Optional[List[str]] = None,
+        imgsz: Optional[int] = None
     ) -> Dict[str, List[Tuple[int, int, int, int, float]]]:
         """
         Detecta objetos en una imagen usando los modelos apropiados.
@@ -213,7 +289,8 @@ class MultiDetector:
         Args:
             image: Ruta a la imagen o array numpy (BGR)
             classes_to_detect: Lista de clases a detectar. Si None, detecta faces + plates
-                              Ejemplos: ['face', 'plate', 'car', 'person']
+                              Ejemplos: ['face', 'plate', 'car', 'cell_phone']
+            imgsz: Tamano de entrada para esta llamada (None = el del detector)
 
         Returns:
             Diccionario con detecciones por clase:
@@ -230,16 +307,22 @@ class MultiDetector:
         detections = {cls: [] for cls in classes_to_detect}
 
         # Separar clases por modelo
-        unified_classes = [cls for cls in classes_to_detect if cls in ['face', 'plate']]
-        coco_classes = [cls for cls in classes_to_detect if cls in COCO_CLASSES]
+        plan = self.plan_models(classes_to_detect)
+        unified_classes = plan['unified']
+        coco_classes = plan['coco']
 
         # Detectar con modelo unificado (faces + plates)
         if unified_classes and self.unified_model:
+            # Filtrar en el propio modelo para no gastar NMS en clases no pedidas
+            unified_ids = {UNIFIED_CLASSES[cls]: cls for cls in unified_classes}
+
             unified_results = self.unified_model(
                 image,
                 conf=self.confidence,
                 iou=self.iou,
-                verbose=False
+                classes=list(unified_ids.keys()),
+                verbose=False,
+                **with_imgsz(self.inference, imgsz)
             )
 
             if len(unified_results) > 0:
@@ -250,25 +333,28 @@ class MultiDetector:
                     conf = float(box.conf[0].cpu().numpy())
                     cls_id = int(box.cls[0].cpu().numpy())
 
-                    detection = (int(x1), int(y1), int(x2), int(y2), conf)
-
-                    # Clase 0: face, Clase 1: plate
-                    if cls_id == 0 and 'face' in unified_classes:
-                        detections['face'].append(detection)
-                    elif cls_id == 1 and 'plate' in unified_classes:
-                        detections['plate'].append(detection)
+                    class_id = unified_ids.get(cls_id)
+                    if class_id is not None:
+                        detections[class_id].append(
+                            (int(x1), int(y1), int(x2), int(y2), conf)
+                        )
 
-        # Detectar con modelo COCO (otras clases)
+        # Detectar con modelo COCO (otras clases). Si solo se piden
+        # rostros/matriculas el modelo COCO ni siquiera se carga.
         if coco_classes:
             # Obtener IDs de clases COCO a detectar
-            coco_class_ids = [COCO_CLASSES[cls] for cls in coco_classes]
+            coco_ids = {
+                COCO_CLASSES[self.resolve_class_name(cls)]: cls
+                for cls in coco_classes
+            }
 
-            coco_results = self.coco_model(
+            coco_results = self._get_coco_model()(
                 image,
                 conf=self.confidence,
                 iou=self.iou,
-                classes=coco_class_ids,  # Filtrar solo las clases solicitadas
-                verbose=False
+                classes=list(coco_ids.keys()),  # Filtrar solo las clases solicitadas
+                verbose=False,
+                **with_imgsz(self.inference, imgsz)
             )
 
             if len(coco_results) > 0:
@@ -279,24 +365,18 @@ class MultiDetector:
                     conf = float(box.conf[0].cpu().numpy())
                     cls_id = int(box.cls[0].cpu().numpy())
 
-                    detection = (int(x1), int(y1), int(x2), int(y2), conf)
-
-                    # Encontrar nombre de la clase
-                    class_name = None
-                    for name, coco_id in COCO_CLASSES.items():
-                        if coco_id == cls_id:
-                            class_name = name
-                            break
-
-                    if class_name and class_name in coco_classes:
-                        detections[class_name].append(detection)
+                    class_id = coco_ids.get(cls_id)
+                    if class_id is not None:
+                        detections[class_id].append(
+                            (int(x1), int(y1), int(x2), int(y2), conf)
+                        )
 
         # Log de resultados
         total_detections = sum(len(dets) for dets in detections.values())
-        logger.info(f"Total detecciones: {total_detections}")
+        logger.debug(f"Total detecciones: {total_detections}")
         for cls, dets in detections.items():
             if dets:
-                logger.info(f"  - {cls}: {len(dets)}")
+                logger.debug(f"  - {cls}: {len(dets)}")
 
         return detections
 
@@ -327,7 +407,7 @@ class MultiDetector:
                 }
             },
             "coco_model": {
-                "loaded": True,
+                "loaded": self.coco_model is not None,
                 "classes": list(COCO_CLASSES.keys()),
                 "total_classes": len(COCO_CLASSES)
             },
@@ -349,6 +429,7 @@ def get_multi_detector() -> MultiDetector:
     """
     global _multi_detector_instance
 
+    record_cache_lookup("multi_detector", _multi_detector_instance is not None)
     if _multi_detector_instance is None:
         _multi_detector_instance = MultiDetector(
             confidence=settings.DETECTION_CONFIDENCE,
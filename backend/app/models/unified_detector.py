@@ -6,13 +6,19 @@ Este modulo carga el modelo unificado que detecta ambas clases:
 - Clase 1: plate (matriculas)
 """
 
+import cv2
 import numpy as np
 from pathlib import Path
 from typing import List, Tuple, Optional, Union, Dict
 from ultralytics import YOLO
 import logging
+import threading
 
 from app.core.config import settings
+from app.core.metrics import MODEL_LOAD_SECONDS, record_cache_lookup, timed
+from app.core.tracing import span, traced
+from app.models.inference import build_inference_kwargs, configure_cpu_threads, with_imgsz
+from app.utils.boxes import expand_box, merge_detections, offset_detections
 
 
 logger = logging.getLogger(__name__)
@@ -32,7 +38,10 @@ class UnifiedDetector:
         self,
         model_path: Optional[Path] = None,
         confidence: float = 0.5,
-        iou: float = 0.45
+        iou: float = 0.45,
+        imgsz: Optional[int] = None,
+        half: Optional[bool] = None,
+        device: Optional[str] = None
     ):
         """
         Inicializa el detector unificado.
@@ -41,6 +50,9 @@ class UnifiedDetector:
             model_path: Ruta al modelo entrenado (.pt). Si None, usa el de config
             confidence: Umbral de confianza minima (0-1)
             iou: Umbral de IoU para NMS (0-1)
+            imgsz: Tamano de entrada. Si None, usa settings.INFERENCE_IMGSZ
+            half: Si usar FP16 (solo GPU). Si None, usa settings.INFERENCE_HALF
+            device: Dispositivo de inferencia. Si None, usa settings.INFERENCE_DEVICE
         """
         # Ruta al modelo unificado
         if model_path is None:
@@ -55,21 +67,29 @@ class UnifiedDetector:
         self.model_path = model_path
         self.confidence = confidence
         self.iou = iou
+        self.inference = build_inference_kwargs(imgsz, half, device)
         self.model = None
 
+        # Estadisticas del modo adaptativo (tasa de segunda pasada)
+        self._adaptive_lock = threading.Lock()
+        self._adaptive_stats = {"images": 0, "refined": 0, "crops": 0}
+
         self._load_model()
 
     def _load_model(self) -> None:
         """Carga el modelo YOLOv8 entrenado."""
+        configure_cpu_threads()
+
         try:
-            if self.model_path is None or not self.model_path.exists():
-                logger.warning(
-                    "Modelo unificado no encontrado. Usando modelo pre-entrenado base."
-                )
-                self.model = YOLO('yolov8n.pt')
-            else:
-                logger.info(f"Cargando modelo unificado desde {self.model_path}")
-                self.model = YOLO(str(self.model_path))
+            with span("model.unified.load"), timed(MODEL_LOAD_SECONDS, model="unified"):
+                if self.model_path is None or not self.model_path.exists():
+                    logger.warning(
+                        "Modelo unificado no encontrado. Usando modelo pre-entrenado base."
+                    )
+                    self.model = YOLO('yolov8n.pt')
+                else:
+                    logger.info(f"Cargando modelo unificado desde {self.model_path}")
+                    self.model = YOLO(str(self.model_path))
 
             logger.info("Modelo unificado cargado correctamente")
 
@@ -77,11 +97,13 @@ class UnifiedDetector:
             logger.error(f"Error al cargar modelo unificado: {e}")
             raise
 
+    @traced("model.unified.detect")
     def detect(
         self,
         image: Union[str, Path, np.ndarray],
         detect_faces: bool = True,
-        detect_plates: bool = True
+        detect_plates: bool = True,
+        imgsz: Optional[int] = None
     ) -> Dict[str, List[Tuple[int, int, int, int, float]]]:
         """
         Detecta rostros y/o matriculas en una imagen.
@@ -90,6 +112,7 @@ class UnifiedDetector:
             image: Ruta a la imagen o array numpy (BGR)
             detect_faces: Si se deben detectar rostros
             detect_plates: Si se deben detectar matriculas
+            imgsz: Tamano de entrada para esta llamada (None = el del detector)
 
         Returns:
             Diccionario con keys 'faces' y 'plates', cada uno con lista de
@@ -104,52 +127,77 @@ class UnifiedDetector:
                 image,
                 conf=self.confidence,
                 iou=self.iou,
-                verbose=False
+                verbose=False,
+                **with_imgsz(self.inference, imgsz)
             )
 
-            # Extraer bounding boxes
-            faces = []
-            plates = []
-
+            detections = {'faces': [], 'plates': []}
             if len(results) > 0:
-                boxes = results[0].boxes
-
-                for box in boxes:
-                    # Obtener coordenadas, confianza y clase
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    conf = float(box.conf[0].cpu().numpy())
-                    cls = int(box.cls[0].cpu().numpy())
-
-                    detection = (
-                        int(x1),
-                        int(y1),
-                        int(x2),
-                        int(y2),
-                        conf
-                    )
-
-                    # Clase 0: face, Clase 1: plate
-                    if cls == 0 and detect_faces:
-                        faces.append(detection)
-                    elif cls == 1 and detect_plates:
-                        plates.append(detection)
+                detections = self._parse_result(results[0], detect_faces, detect_plates)
 
-            logger.info(f"Detectados {len(faces)} rostros y {len(plates)} matriculas")
+            logger.debug(
+                f"Detectados {len(detections['faces'])} rostros y "
+                f"{len(detections['plates'])} matriculas"
+            )
 
-            return {
-                'faces': faces,
-                'plates': plates
-            }
+            return detections
 
         except Exception as e:
             logger.error(f"Error en deteccion unificada: {e}")
             raise ValueError(f"Error procesando imagen: {e}")
 
+    @staticmethod
+    def _parse_result(
+        result,
+        detect_faces: bool = True,
+        detect_plates: bool = True
+    ) -> Dict[str, List[Tuple[int, int, int, int, float]]]:
+        """
+        Extrae las bounding boxes de un resultado de YOLO.
+
+        Args:
+            result: Resultado de Ultralytics para una imagen
+            detect_faces: Si incluir rostros
+            detect_plates: Si incluir matriculas
+
+        Returns:
+            Diccionario con keys 'faces' y 'plates'
+        """
+        faces = []
+        plates = []
+
+        for box in result.boxes:
+            # Obtener coordenadas, confianza y clase
+            x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
+            conf = float(box.conf[0].cpu().numpy())
+            cls = int(box.cls[0].cpu().numpy())
+
+            detection = (
+                int(x1),
+                int(y1),
+                int(x2),
+                int(y2),
+                conf
+            )
+
+            # Clase 0: face, Clase 1: plate
+            if cls == 0 and detect_faces:
+                faces.append(detection)
+            elif cls == 1 and detect_plates:
+                plates.append(detection)
+
+        return {
+            'faces': faces,
+            'plates': plates
+        }
+
+    @traced("model.unified.detect_batch")
     def detect_batch(
         self,
         images: List[Union[str, Path, np.ndarray]],
         detect_faces: bool = True,
-        detect_plates: bool = True
+        detect_plates: bool = True,
+        imgsz: Optional[int] = None
     ) -> List[Dict[str, List[Tuple[int, int, int, int, float]]]]:
         """
         Detecta rostros y matriculas en multiples imagenes.
@@ -158,17 +206,218 @@ class UnifiedDetector:
             images: Lista de rutas a imagenes o arrays numpy
             detect_faces: Si se deben detectar rostros
             detect_plates: Si se deben detectar matriculas
+            imgsz: Tamano de entrada para esta llamada (None = el del detector)
+
+        Returns:
+            Lista de diccionarios con detecciones, una por imagen
+
+        Raises:
+            ValueError: Si alguna imagen no es valida
+        """
+        if not images:
+            return []
+
+        try:
+            # Una sola llamada al modelo: YOLO agrupa las imagenes en un batch
+            results = self.model(
+                images,
+                conf=self.confidence,
+                iou=self.iou,
+                verbose=False,
+                **with_imgsz(self.inference, imgsz)
+            )
+
+            return [
+                self._parse_result(result, detect_faces, detect_plates)
+                for result in results
+            ]
+
+        except Exception as e:
+            logger.error(f"Error en deteccion unificada por lotes: {e}")
+            raise ValueError(f"Error procesando lote de imagenes: {e}")
+
+    @traced("model.unified.detect_adaptive")
+    def detect_adaptive(
+        self,
+        image: Union[str, Path, np.ndarray],
+        detect_faces: bool = True,
+        detect_plates: bool = True,
+        refine_mode: Optional[str] = None
+    ) -> Tuple[Dict[str, List[Tuple[int, int, int, int, float]]], dict]:
+        """
+        Deteccion en dos pasadas: rapida a baja resolucion y refinado.
+
+        La primera pasada se hace a settings.ADAPTIVE_COARSE_IMGSZ con un
+        umbral de confianza bajo para obtener candidatos. Si todos son
+        grandes y seguros se devuelven directamente. Si aparecen candidatos
+        pequenos o de baja confianza se hace una segunda pasada a la
+        resolucion completa del detector, sobre recortes alrededor de los
+        candidatos o sobre la imagen completa.
+
+        Args:
+            image: Ruta a la imagen o array numpy (BGR)
+            detect_faces: Si se deben detectar rostros
+            detect_plates: Si se deben detectar matriculas
+            refine_mode: 'crops' o 'frame'. Si None, usa settings.ADAPTIVE_REFINE_MODE
 
         Returns:
-            Lista de diccionarios con detecciones, uno por imagen
+            Tupla (detecciones, info). Las detecciones estan en coordenadas
+            de la imagen original. info describe las pasadas realizadas e
+            incluye la tasa acumulada de segunda pasada ('refine_rate').
+
+        Raises:
+            ValueError: Si la imagen no es valida
         """
-        results = []
+        if not isinstance(image, np.ndarray):
+            image = cv2.imread(str(image))
+            if image is None:
+                raise ValueError("No se pudo leer la imagen")
+
+        refine_mode = refine_mode or settings.ADAPTIVE_REFINE_MODE
+        if refine_mode not in ("crops", "frame"):
+            raise ValueError(f"Modo de refinado no valido: {refine_mode}")
 
-        for image in images:
-            detections = self.detect(image, detect_faces, detect_plates)
-            results.append(detections)
+        height, width = image.shape[:2]
+        coarse_imgsz = settings.ADAPTIVE_COARSE_IMGSZ
+        refine_imgsz = self.inference["imgsz"]
+        accept_conf = max(self.confidence, settings.ADAPTIVE_REFINE_BELOW)
+        min_side = settings.ADAPTIVE_SMALL_BOX_RATIO * max(height, width)
 
-        return results
+        try:
+            # Pasada rapida con umbral bajo para recoger candidatos
+            results = self.model(
+                image,
+                conf=min(self.confidence, settings.ADAPTIVE_CANDIDATE_CONFIDENCE),
+                iou=self.iou,
+                verbose=False,
+                **with_imgsz(self.inference, coarse_imgsz)
+            )
+            coarse = {'faces': [], 'plates': []}
+            if len(results) > 0:
+                coarse = self._parse_result(results[0], detect_faces, detect_plates)
+
+            uncertain = [
+                det for dets in coarse.values() for det in dets
+                if det[4] < accept_conf or min(det[2] - det[0], det[3] - det[1]) < min_side
+            ]
+
+            info = {
+                "coarse_imgsz": coarse_imgsz,
+                "refine_imgsz": refine_imgsz,
+                "candidates": len(uncertain),
+                "refined": bool(uncertain),
+                "refine_mode": None,
+                "crops": 0,
+            }
+
+            if not uncertain:
+                detections = coarse
+            elif refine_mode == "frame" or len(uncertain) > settings.ADAPTIVE_MAX_CROPS:
+                info["refine_mode"] = "frame"
+                detections = self.detect(image, detect_faces, detect_plates)
+            else:
+                info["refine_mode"] = "crops"
+                info["crops"] = len(uncertain)
+                detections = self._refine_crops(
+                    image, coarse, uncertain, detect_faces, detect_plates
+                )
+
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"Error en deteccion adaptativa: {e}")
+            raise ValueError(f"Error procesando imagen: {e}")
+
+        with self._adaptive_lock:
+            self._adaptive_stats["images"] += 1
+            self._adaptive_stats["refined"] += int(info["refined"])
+            self._adaptive_stats["crops"] += info["crops"]
+            info["refine_rate"] = round(
+                self._adaptive_stats["refined"] / self._adaptive_stats["images"], 4
+            )
+
+        logger.debug(
+            f"Deteccion adaptativa: {info['candidates']} candidatos a refinar, "
+            f"modo={info['refine_mode']}"
+        )
+
+        return detections, info
+
+    @traced("model.unified.refine_crops")
+    def _refine_crops(
+        self,
+        image: np.ndarray,
+        coarse: Dict[str, List[Tuple[int, int, int, int, float]]],
+        uncertain: List[Tuple[int, int, int, int, float]],
+        detect_faces: bool,
+        detect_plates: bool
+    ) -> Dict[str, List[Tuple[int, int, int, int, float]]]:
+        """
+        Segunda pasada sobre recortes alrededor de los candidatos dudosos.
+
+        Los recortes se procesan en un solo batch a la resolucion completa
+        del detector; sus boxes se desplazan a coordenadas de la imagen y
+        se fusionan con las detecciones seguras de la primera pasada.
+
+        Args:
+            image: Imagen original (BGR)
+            coarse: Detecciones de la primera pasada
+            uncertain: Candidatos a refinar
+            detect_faces: Si incluir rostros
+            detect_plates: Si incluir matriculas
+
+        Returns:
+            Diccionario con keys 'faces' y 'plates'
+        """
+        height, width = image.shape[:2]
+
+        regions = []
+        for x1, y1, x2, y2, _ in uncertain:
+            region = expand_box(
+                (x1, y1, x2, y2), settings.ADAPTIVE_CROP_MARGIN, width, height, min_size=32
+            )
+            if region[2] > region[0] and region[3] > region[1]:
+                regions.append(region)
+
+        crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in regions]
+        results = self.model(
+            crops,
+            conf=self.confidence,
+            iou=self.iou,
+            verbose=False,
+            **self.inference
+        ) if crops else []
+
+        # Las detecciones seguras de la primera pasada se conservan
+        merged = {
+            key: [det for det in dets if det[4] >= self.confidence]
+            for key, dets in coarse.items()
+        }
+        for (x1, y1, _, _), result in zip(regions, results):
+            refined = self._parse_result(result, detect_faces, detect_plates)
+            for key, dets in refined.items():
+                merged[key].extend(offset_detections(dets, x1, y1))
+
+        return {
+            key: merge_detections(dets, self.iou)
+            for key, dets in merged.items()
+        }
+
+    def get_adaptive_stats(self) -> dict:
+        """
+        Estadisticas acumuladas del modo adaptativo.
+
+        Returns:
+            Diccionario con imagenes procesadas, imagenes refinadas,
+            recortes refinados y tasa de segunda pasada
+        """
+        with self._adaptive_lock:
+            stats = dict(self._adaptive_stats)
+
+        stats["refine_rate"] = (
+            round(stats["refined"] / stats["images"], 4) if stats["images"] else 0.0
+        )
+        return stats
 
     def get_model_info(self) -> dict:
         """
@@ -183,6 +432,8 @@ class UnifiedDetector:
             "task": "unified_detection",
             "confidence_threshold": self.confidence,
             "iou_threshold": self.iou,
+            "inference": self.inference,
+            "adaptive": self.get_adaptive_stats(),
             "classes": {
                 0: "face",
                 1: "plate"
@@ -203,6 +454,7 @@ def get_unified_detector() -> UnifiedDetector:
     """
     global _unified_detector_instance
 
+    record_cache_lookup("unified_detector", _unified_detector_instance is not None)
     if _unified_detector_instance is None:
         _unified_detector_instance = UnifiedDetector(
             confidence=settings.DETECTION_CONFIDENCE,
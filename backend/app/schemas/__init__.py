@@ -2,7 +2,12 @@
 Schemas de datos para la API (DTOs con Pydantic).
 """
 
-from app.schemas.detection import DetectionRequest, DetectionResponse, BoundingBox
+from app.schemas.detection import (
+    DetectionRequest,
+    DetectionResponse,
+    BoundingBox,
+    ClassDetectionResponse,
+)
 from app.schemas.health import HealthResponse
 
 
@@ -10,5 +15,6 @@ __all__ = [
     "DetectionRequest",
     "DetectionResponse",
     "BoundingBox",
+    "ClassDetectionResponse",
     "HealthResponse",
 ]
@@ -3,7 +3,7 @@ Schemas para deteccion de rostros y matriculas.
 """
 
 from pydantic import BaseModel, Field
-from typing import List, Literal
+from typing import Any, Dict, List, Literal, Optional
 
 
 class BoundingBox(BaseModel):
@@ -54,8 +54,28 @@ class DetectionResponse(BaseModel):
         plates: Lista de bounding boxes de matriculas detectadas
         total_detections: Numero total de detecciones
         processing_time_ms: Tiempo de procesamiento en milisegundos
+        adaptive: Informacion de las pasadas en modo adaptativo (si se uso)
     """
     faces: List[BoundingBox] = Field(default_factory=list)
     plates: List[BoundingBox] = Field(default_factory=list)
     total_detections: int = Field(..., description="Numero total de detecciones")
     processing_time_ms: float = Field(..., description="Tiempo de procesamiento en ms")
+    adaptive: Optional[Dict[str, Any]] = Field(None, description="Pasadas del modo adaptativo")
+
+
+class ClassDetectionResponse(BaseModel):
+    """
+    Response de deteccion selectiva por clases.
+
+    Attributes:
+        detections: Bounding boxes agrupadas por id de clase
+        classes_requested: Ids de clase solicitados
+        models_used: Modelos invocados para resolver la peticion
+        total_detections: Numero total de detecciones
+        processing_time_ms: Tiempo de procesamiento en milisegundos
+    """
+    detections: Dict[str, List[BoundingBox]] = Field(default_factory=dict)
+    classes_requested: List[str] = Field(default_factory=list)
+    models_used: List[str] = Field(default_factory=list)
+    total_detections: int = Field(..., description="Numero total de detecciones")
+    processing_time_ms: float = Field(..., description="Tiempo de procesamiento en ms")
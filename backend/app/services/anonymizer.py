@@ -58,7 +58,7 @@ class Anonymizer:
             # Reemplazar region
             result[y1:y2, x1:x2] = blurred
 
-        logger.info(f"Aplicado blur a {len(boxes)} regiones")
+        logger.debug(f"Aplicado blur a {len(boxes)} regiones")
         return result
 
     @staticmethod
@@ -97,7 +97,7 @@ class Anonymizer:
             # Reemplazar region
             result[y1:y2, x1:x2] = pixelated
 
-        logger.info(f"Aplicado pixelate a {len(boxes)} regiones")
+        logger.debug(f"Aplicado pixelate a {len(boxes)} regiones")
         return result
 
     @staticmethod
@@ -122,7 +122,7 @@ class Anonymizer:
         for x1, y1, x2, y2 in boxes:
             cv2.rectangle(result, (x1, y1), (x2, y2), color, -1)
 
-        logger.info(f"Aplicado mask a {len(boxes)} regiones")
+        logger.debug(f"Aplicado mask a {len(boxes)} regiones")
         return result
 
     @staticmethod
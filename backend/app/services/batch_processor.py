@@ -0,0 +1,403 @@
+"""
+Servicio de anonimizacion de imagenes por lotes.
+
+Recibe un conjunto de imagenes (ZIP o lista de archivos), las decodifica en
+un pool de hilos, detecta por lotes con el detector unificado y devuelve un
+ZIP en streaming con las imagenes anonimizadas y un manifiesto JSON.
+
+Las entradas del manifiesto se escriben segun se procesa cada imagen en un
+fichero temporal (en memoria hasta MANIFEST_SPOOL_BYTES) y se copian al ZIP
+al final, de modo que la memoria no crece con el numero de imagenes.
+"""
+
+import io
+import json
+import tempfile
+import zipfile
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import record_cache_lookup
+from app.services.anonymizer import Anonymizer, AnonymizationMethod
+from app.services.image_processor import ImageProcessor, get_image_processor
+
+
+logger = logging.getLogger(__name__)
+
+
+# Nombre del manifiesto dentro del ZIP de salida
+MANIFEST_NAME = "manifest.json"
+
+# Bytes de entradas del manifiesto que se mantienen en memoria antes de pasar a disco
+MANIFEST_SPOOL_BYTES = 1024 * 1024
+
+# Entradas del manifiesto copiadas al ZIP entre cada vaciado del buffer de salida
+MANIFEST_DRAIN_EVERY = 1000
+
+
+class _ZipStreamBuffer(io.RawIOBase):
+    """
+    Destino de escritura no posicionable para zipfile.
+
+    zipfile detecta que no puede hacer seek y escribe cada entrada de forma
+    secuencial, de modo que el contenido se puede ir vaciando tras cada
+    imagen sin mantener el ZIP completo en memoria.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        """Devuelve y descarta los bytes escritos hasta ahora."""
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _open_zip(archive_path: Path) -> zipfile.ZipFile:
+    """Abre un ZIP convirtiendo BadZipFile en ValueError."""
+    try:
+        return zipfile.ZipFile(archive_path)
+    except zipfile.BadZipFile:
+        raise ValueError("El archivo no es un ZIP valido")
+
+
+def _zip_image_entries(archive: zipfile.ZipFile) -> Iterator[zipfile.ZipInfo]:
+    """Entradas del ZIP que son imagenes con extension permitida y tamano aceptado."""
+    max_size_bytes = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+
+    for info in archive.infolist():
+        name = info.filename
+
+        if info.is_dir() or name.startswith("__MACOSX/"):
+            continue
+        if Path(name).suffix.lower() not in settings.ALLOWED_EXTENSIONS:
+            continue
+        if info.file_size > max_size_bytes:
+            logger.warning(f"Entrada {name} omitida: supera {settings.MAX_FILE_SIZE_MB} MB")
+            continue
+
+        yield info
+
+
+def count_zip_images(archive_path: Path) -> int:
+    """
+    Cuenta las imagenes de un archivo ZIP sin descomprimirlas.
+
+    Solo lee el directorio central, por lo que sirve para validar el ZIP y
+    su numero de imagenes antes de empezar a responder.
+
+    Args:
+        archive_path: Ruta al archivo ZIP
+
+    Returns:
+        Numero de entradas que iter_zip_images devolveria
+
+    Raises:
+        ValueError: Si el archivo no es un ZIP valido
+    """
+    with _open_zip(archive_path) as archive:
+        return sum(1 for _ in _zip_image_entries(archive))
+
+
+def iter_zip_images(archive_path: Path) -> Iterator[Tuple[str, bytes]]:
+    """
+    Itera las imagenes de un archivo ZIP leyendo una entrada cada vez.
+
+    Args:
+        archive_path: Ruta al archivo ZIP
+
+    Yields:
+        Tuplas (nombre, bytes) de cada imagen con extension permitida
+
+    Raises:
+        ValueError: Si el archivo no es un ZIP valido
+    """
+    with _open_zip(archive_path) as archive:
+        for info in _zip_image_entries(archive):
+            yield info.filename, archive.read(info)
+
+
+def iter_file_images(paths: Iterable[Tuple[str, Path]]) -> Iterator[Tuple[str, bytes]]:
+    """
+    Itera imagenes guardadas en disco leyendo un archivo cada vez.
+
+    Args:
+        paths: Tuplas (nombre original, ruta en disco)
+
+    Yields:
+        Tuplas (nombre, bytes)
+    """
+    for name, path in paths:
+        yield name, path.read_bytes()
+
+
+def _safe_entry_name(name: str) -> str:
+    """Normaliza el nombre de una entrada evitando rutas absolutas o '..'."""
+    parts = [
+        part for part in PurePosixPath(name.replace("\\", "/")).parts
+        if part not in ("", "/", ".", "..")
+    ]
+    return "/".join(parts) or "image.jpg"
+
+
+class BatchProcessor:
+    """
+    Procesador de lotes de imagenes.
+
+    Attributes:
+        detector: Detector con metodo detect_batch (por defecto el unificado)
+        batch_size: Numero de imagenes por llamada al detector
+        workers: Numero de hilos para decodificar y codificar
+    """
+
+    def __init__(
+        self,
+        detector=None,
+        batch_size: Optional[int] = None,
+        workers: Optional[int] = None
+    ):
+        """
+        Inicializa el procesador de lotes.
+
+        Args:
+            detector: Detector a usar. Si None, usa el del ImageProcessor global
+            batch_size: Imagenes por lote. Si None, usa el de config
+            workers: Hilos del pool de decodificacion. Si None, usa el de config
+        """
+        self.detector = detector
+        self.batch_size = max(1, batch_size or settings.BATCH_SIZE)
+        self.workers = max(1, workers or settings.BATCH_DECODE_WORKERS)
+
+    def _detect_batch(
+        self,
+        images: List[np.ndarray],
+        detect_faces: bool,
+        detect_plates: bool,
+        confidence_threshold: float,
+        imgsz: Optional[int] = None
+    ) -> List[Dict[str, List[Tuple[int, int, int, int, float]]]]:
+        """Detecta en un lote con el detector unificado o, si no hay, imagen a imagen."""
+        detector = self.detector
+        if detector is None:
+            processor = get_image_processor()
+            detector = processor.unified_detector
+
+            if detector is None:
+                # Fallback: detectores separados, imagen a imagen
+                results = []
+                for image in images:
+                    faces, plates = [], []
+                    if detect_faces:
+                        processor.face_detector.confidence = confidence_threshold
+                        faces = processor.face_detector.detect(image, imgsz=imgsz)
+                    if detect_plates:
+                        processor.plate_detector.confidence = confidence_threshold
+                        plates = processor.plate_detector.detect(image, imgsz=imgsz)
+                    results.append({'faces': faces, 'plates': plates})
+                return results
+
+        detector.confidence = confidence_threshold
+        return detector.detect_batch(
+            images,
+            detect_faces=detect_faces,
+            detect_plates=detect_plates,
+            imgsz=imgsz
+        )
+
+    @staticmethod
+    def _decode(item: Tuple[str, bytes]) -> Tuple[str, Optional[np.ndarray], Optional[str]]:
+        """Decodifica una imagen devolviendo (nombre, imagen, error)."""
+        name, data = item
+        try:
+            return name, ImageProcessor.decode_image(data), None
+        except ValueError as e:
+            return name, None, str(e)
+
+    @staticmethod
+    def _anonymize_and_encode(
+        image: np.ndarray,
+        name: str,
+        detections: Dict[str, List[Tuple[int, int, int, int, float]]],
+        method: AnonymizationMethod,
+        anonymize_kwargs: dict
+    ) -> bytes:
+        """Aplica la anonimizacion y codifica la imagen en su formato original."""
+        boxes = [
+            (x1, y1, x2, y2)
+            for x1, y1, x2, y2, _ in detections['faces'] + detections['plates']
+        ]
+        if boxes:
+            image = Anonymizer.anonymize(image, boxes, method=method, **anonymize_kwargs)
+
+        encoded, _ = ImageProcessor.encode_image(image, name)
+        return encoded
+
+    def process_stream(
+        self,
+        items: Iterable[Tuple[str, bytes]],
+        detect_faces: bool = True,
+        detect_plates: bool = True,
+        anonymization_method: AnonymizationMethod = "blur",
+        confidence_threshold: float = 0.25,
+        blur_kernel_size: int = 99,
+        pixelate_blocks: int = 10,
+        imgsz: Optional[int] = None
+    ) -> Iterator[bytes]:
+        """
+        Procesa un flujo de imagenes y genera un ZIP en streaming.
+
+        Solo hay en memoria, como mucho, dos lotes de imagenes: el que se esta
+        detectando y el siguiente, que se decodifica en paralelo. El limite de
+        imagenes (BATCH_MAX_FILES) lo comprueba el llamador antes de empezar.
+
+        Args:
+            items: Iterable de tuplas (nombre, bytes)
+            detect_faces: Si detectar rostros
+            detect_plates: Si detectar matriculas
+            anonymization_method: Metodo de anonimizacion
+            confidence_threshold: Umbral de confianza para detecciones
+            blur_kernel_size: Tamano del kernel para blur
+            pixelate_blocks: Numero de bloques para pixelacion
+            imgsz: Tamano de entrada del detector (None = settings.INFERENCE_IMGSZ)
+
+        Yields:
+            Fragmentos consecutivos del archivo ZIP de salida
+        """
+        anonymize_kwargs = {}
+        if anonymization_method == "blur":
+            anonymize_kwargs["kernel_size"] = blur_kernel_size
+        elif anonymization_method == "pixelate":
+            anonymize_kwargs["blocks"] = pixelate_blocks
+
+        buffer = _ZipStreamBuffer()
+        records = tempfile.SpooledTemporaryFile(
+            max_size=MANIFEST_SPOOL_BYTES, mode="w+b", dir=settings.TEMP_DIR
+        )
+        totals = {"images": 0, "errors": 0, "faces": 0, "plates": 0}
+        used_names = set()
+
+        def next_batch(iterator: Iterator[Tuple[str, bytes]]) -> List[Tuple[str, bytes]]:
+            batch = []
+            for item in iterator:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+            return batch
+
+        def add_record(record: dict) -> None:
+            records.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+
+        with records, zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED) as output, \
+                ThreadPoolExecutor(max_workers=self.workers) as pool:
+
+            iterator = iter(items)
+            pending = [pool.submit(self._decode, item) for item in next_batch(iterator)]
+            processed = 0
+
+            while pending:
+                decoded = [future.result() for future in pending]
+
+                # Decodificar el siguiente lote mientras se detecta el actual
+                pending = [pool.submit(self._decode, item) for item in next_batch(iterator)]
+
+                valid = [index for index, (_, image, _) in enumerate(decoded) if image is not None]
+                detections = dict(zip(valid, self._detect_batch(
+                    [decoded[index][1] for index in valid],
+                    detect_faces,
+                    detect_plates,
+                    confidence_threshold,
+                    imgsz
+                )))
+
+                encoded = dict(zip(valid, pool.map(
+                    lambda index: self._anonymize_and_encode(
+                        decoded[index][1],
+                        decoded[index][0],
+                        detections[index],
+                        anonymization_method,
+                        anonymize_kwargs
+                    ),
+                    valid
+                )))
+
+                for index, (name, image, error) in enumerate(decoded):
+                    processed += 1
+                    entry_name = _safe_entry_name(name)
+                    if entry_name in used_names:
+                        entry_name = f"{processed:06d}_{entry_name.replace('/', '_')}"
+                    used_names.add(entry_name)
+
+                    if error is not None:
+                        totals["errors"] += 1
+                        add_record({"file": name, "error": error})
+                        continue
+
+                    image_detections = detections[index]
+                    output.writestr(entry_name, encoded[index])
+
+                    totals["images"] += 1
+                    totals["faces"] += len(image_detections['faces'])
+                    totals["plates"] += len(image_detections['plates'])
+                    add_record({
+                        "file": name,
+                        "output": entry_name,
+                        "width": int(image.shape[1]),
+                        "height": int(image.shape[0]),
+                        "faces": [list(det) for det in image_detections['faces']],
+                        "plates": [list(det) for det in image_detections['plates']]
+                    })
+
+                    yield buffer.drain()
+
+                del decoded, detections, encoded
+
+            # manifest.json: {"anonymization_method", "totals", "files"}, con
+            # las entradas copiadas del fichero temporal linea a linea
+            header = json.dumps({
+                "anonymization_method": anonymization_method,
+                "totals": totals
+            }, ensure_ascii=False)
+            records.seek(0)
+            with output.open(MANIFEST_NAME, mode="w") as entry:
+                entry.write(header[:-1].encode("utf-8") + b', "files": [')
+                for index, line in enumerate(records):
+                    entry.write((b",\n" if index else b"\n") + line.rstrip(b"\n"))
+                    if (index + 1) % MANIFEST_DRAIN_EVERY == 0:
+                        yield buffer.drain()
+                entry.write(b"\n]}")
+
+        logger.info(f"Lote procesado: {totals}")
+        yield buffer.drain()
+
+
+# Instancia global del procesador de lotes
+_batch_processor_instance: Optional[BatchProcessor] = None
+
+
+def get_batch_processor() -> BatchProcessor:
+    """
+    Obtiene la instancia global del procesador de lotes.
+
+    Returns:
+        Instancia de BatchProcessor (singleton)
+    """
+    global _batch_processor_instance
+
+    record_cache_lookup("batch_processor", _batch_processor_instance is not None)
+    if _batch_processor_instance is None:
+        _batch_processor_instance = BatchProcessor()
+
+    return _batch_processor_instance
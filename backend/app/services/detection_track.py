@@ -0,0 +1,223 @@
+"""
+Pista de detecciones por frame de un video (fichero .npz).
+
+Guarda las boxes, clases y confianzas de todos los frames en formato
+columnar (arrays de numpy comprimidos):
+
+- frame: indice del frame (desde 0) de cada box, ordenado
+- boxes: (N, 4) int32 con x1, y1, x2, y2 en coordenadas del frame completo
+- labels: clase de cada box (0 = rostro, 1 = matricula)
+- confidence: confianza de cada box (1.0 si el detector no la da)
+
+mas los metadatos del video (frames, tamano, fps), las clases detectadas y
+la firma del detector. Con la pista, VideoProcessor.render_video vuelve a
+anonimizar el video con otro metodo o parametros sin pasar por el detector:
+el coste queda en decodificar y codificar.
+
+Las pistas contienen las coordenadas de rostros y matriculas del video, asi
+que caducan a las VIDEO_TRACK_TTL_HOURS horas sin usarse (cleanup_tracks).
+"""
+
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+import logging
+
+import numpy as np
+
+from app.core.config import settings
+from app.utils.file_handler import FileHandler
+
+
+logger = logging.getLogger(__name__)
+
+TRACK_VERSION = 1
+
+LABELS = ("faces", "plates")
+
+
+class TrackWriter:
+    """
+    Acumula las detecciones por frame y las guarda como pista .npz.
+
+    Attributes:
+        width: Ancho del video
+        height: Alto del video
+        fps: Frames por segundo
+        detect_faces: Si se detectaron rostros
+        detect_plates: Si se detectaron matriculas
+        detector: Firma del detector (modelo, confianza, tamano de entrada)
+    """
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        fps: float,
+        detect_faces: bool = True,
+        detect_plates: bool = True,
+        detector: str = ""
+    ):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.detect_faces = detect_faces
+        self.detect_plates = detect_plates
+        self.detector = detector
+        self.frame_count = 0
+
+        self._frames: List[int] = []
+        self._boxes: List = []
+        self._labels: List[int] = []
+        self._confidence: List[float] = []
+
+    def add(self, frame_index: int, faces: List, plates: List) -> None:
+        """
+        Anade las detecciones de un frame.
+
+        Args:
+            frame_index: Indice del frame en el video (desde 0)
+            faces: Boxes (x1, y1, x2, y2[, confianza]) de rostros
+            plates: Boxes de matriculas
+        """
+        for label, boxes in enumerate((faces, plates)):
+            for box in boxes:
+                self._frames.append(frame_index)
+                self._boxes.append(box[:4])
+                self._labels.append(label)
+                self._confidence.append(float(box[4]) if len(box) > 4 else 1.0)
+        self.frame_count = max(self.frame_count, frame_index + 1)
+
+    def save(self, path: str) -> None:
+        """Guarda la pista de forma atomica (temporal + rename)."""
+        order = np.argsort(np.asarray(self._frames, dtype=np.int32), kind="stable")
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # np.savez anade .npz si el nombre no lo lleva
+        tmp = path.with_name(f".{path.stem}.partial.npz")
+
+        np.savez_compressed(
+            tmp,
+            version=np.int32(TRACK_VERSION),
+            frame=np.asarray(self._frames, dtype=np.int32)[order],
+            boxes=np.asarray(self._boxes, dtype=np.int32).reshape(-1, 4)[order],
+            labels=np.asarray(self._labels, dtype=np.uint8)[order],
+            confidence=np.asarray(self._confidence, dtype=np.float32)[order],
+            frame_count=np.int32(self.frame_count),
+            width=np.int32(self.width),
+            height=np.int32(self.height),
+            fps=np.float64(self.fps),
+            detect_faces=np.bool_(self.detect_faces),
+            detect_plates=np.bool_(self.detect_plates),
+            detector=np.str_(self.detector),
+        )
+        os.replace(tmp, path)
+        logger.debug(f"Pista de detecciones guardada: {path} ({len(self._frames)} boxes)")
+
+
+class DetectionTrack:
+    """
+    Pista de detecciones cargada en memoria.
+
+    Attributes:
+        frame_count: Frames del video
+        width: Ancho del video
+        height: Alto del video
+        fps: Frames por segundo
+        detect_faces: Si se detectaron rostros
+        detect_plates: Si se detectaron matriculas
+        detector: Firma del detector
+    """
+
+    def __init__(self, data: Dict[str, np.ndarray]):
+        self.frame_count = int(data["frame_count"])
+        self.width = int(data["width"])
+        self.height = int(data["height"])
+        self.fps = float(data["fps"])
+        self.detect_faces = bool(data["detect_faces"])
+        self.detect_plates = bool(data["detect_plates"])
+        self.detector = str(data["detector"])
+
+        self._frame = data["frame"]
+        self._boxes = data["boxes"]
+        self._labels = data["labels"]
+        self._confidence = data["confidence"]
+
+        # Rango [inicio, fin) de las boxes de cada frame
+        frames = np.arange(self.frame_count + 1)
+        self._offsets = np.searchsorted(self._frame, frames, side="left")
+
+    @classmethod
+    def load(cls, path: str) -> "DetectionTrack":
+        """
+        Carga una pista .npz.
+
+        Raises:
+            ValueError: Si el fichero no es una pista valida
+        """
+        with np.load(path, allow_pickle=False) as data:
+            if "version" not in data or int(data["version"]) != TRACK_VERSION:
+                raise ValueError(f"Pista de detecciones no valida: {path}")
+            return cls({key: data[key] for key in data.files})
+
+    @property
+    def total_boxes(self) -> int:
+        return int(self._frame.size)
+
+    def covers(
+        self,
+        detect_faces: bool,
+        detect_plates: bool,
+        detector: Optional[str] = None
+    ) -> bool:
+        """Si la pista sirve para las clases pedidas (y el detector indicado)."""
+        if detector is not None and detector != self.detector:
+            return False
+        return (self.detect_faces or not detect_faces) and (self.detect_plates or not detect_plates)
+
+    def detections(
+        self,
+        frame_index: int,
+        detect_faces: bool = True,
+        detect_plates: bool = True
+    ) -> Dict[str, List]:
+        """
+        Detecciones de un frame.
+
+        Args:
+            frame_index: Indice del frame (desde 0)
+            detect_faces: Si incluir rostros
+            detect_plates: Si incluir matriculas
+
+        Returns:
+            Dict con listas de boxes (x1, y1, x2, y2, confianza) para faces y plates
+        """
+        result = {'faces': [], 'plates': []}
+        if not 0 <= frame_index < self.frame_count:
+            return result
+
+        start, end = self._offsets[frame_index], self._offsets[frame_index + 1]
+        wanted = (detect_faces, detect_plates)
+        for box, label, confidence in zip(
+            self._boxes[start:end].tolist(), self._labels[start:end].tolist(),
+            self._confidence[start:end].tolist()
+        ):
+            if wanted[label]:
+                result[LABELS[label]].append((*box, confidence))
+        return result
+
+
+def cleanup_tracks(directory: Optional[Path] = None, max_age_hours: Optional[float] = None) -> int:
+    """
+    Borra las pistas sin usar durante mas de max_age_hours.
+
+    Args:
+        directory: Directorio de pistas. Si None, usa settings.VIDEO_TRACKS_DIR
+        max_age_hours: Edad maxima. Si None, usa settings.VIDEO_TRACK_TTL_HOURS
+
+    Returns:
+        Numero de ficheros eliminados
+    """
+    directory = settings.VIDEO_TRACKS_DIR if directory is None else Path(directory)
+    max_age_hours = settings.VIDEO_TRACK_TTL_HOURS if max_age_hours is None else max_age_hours
+    return FileHandler.cleanup_old_files(directory, max_age_hours)
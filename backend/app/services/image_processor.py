@@ -4,20 +4,36 @@ Servicio de procesamiento de imagenes.
 Integra deteccion y anonimizacion en un pipeline completo.
 """
 
+import io
 import cv2
 import numpy as np
-from typing import List, Tuple, Literal, Optional
+from typing import BinaryIO, List, Tuple, Literal, Optional
 import logging
 import time
 
+from app.core.config import settings
+from app.core.metrics import (
+    DETECTIONS_TOTAL, IMAGE_STAGE_SECONDS, IMAGES_PROCESSED_TOTAL, record_cache_lookup, timed
+)
+from app.core.tracing import span, traced
 from app.models import get_face_detector, get_plate_detector
 from app.models.unified_detector import get_unified_detector
+from app.models.multi_detector import MultiDetector, get_multi_detector
 from app.services.anonymizer import anonymizer, AnonymizationMethod
+from app.utils.jpeg import jpeg_dimensions
 
 
 logger = logging.getLogger(__name__)
 
 
+# Flags de decodificacion reducida por factor de escala
+_REDUCED_COLOR_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+}
+
+
 class ImageProcessor:
     """
     Procesador de imagenes que combina deteccion y anonimizacion.
@@ -52,6 +68,7 @@ class ImageProcessor:
             self.face_detector = get_face_detector()
             self.plate_detector = get_plate_detector()
 
+    @traced("image.process")
     def process_image(
         self,
         image: np.ndarray,
@@ -61,7 +78,9 @@ class ImageProcessor:
         confidence_threshold: float = 0.5,
         blur_kernel_size: int = 99,
         pixelate_blocks: int = 10,
-        mask_color: Tuple[int, int, int] = (0, 0, 0)
+        mask_color: Tuple[int, int, int] = (0, 0, 0),
+        imgsz: Optional[int] = None,
+        adaptive: bool = False
     ) -> Tuple[np.ndarray, dict]:
         """
         Procesa una imagen: detecta y anonimiza.
@@ -75,71 +94,88 @@ class ImageProcessor:
             blur_kernel_size: Tamano del kernel para blur
             pixelate_blocks: Numero de bloques para pixelacion
             mask_color: Color para masking en formato BGR
+            imgsz: Tamano de entrada del detector (None = settings.INFERENCE_IMGSZ)
+            adaptive: Si usar deteccion en dos pasadas (solo detector unificado).
+                      Ignora imgsz
 
         Returns:
-            Tupla (imagen_anonimizada, metadatos)
+            Tupla (imagen_anonimizada, metadatos). Los metadatos incluyen
+            las detecciones con su confianza en 'detections' y, en modo
+            adaptativo, la informacion de las pasadas en 'adaptive'.
         """
         start_time = time.time()
 
         # Copiar imagen original
         result = image.copy()
 
-        # Listas para almacenar detecciones
-        face_boxes = []
-        plate_boxes = []
+        # Detecciones (x1, y1, x2, y2, confidence) por tipo
+        detections = {'faces': [], 'plates': []}
+        adaptive_info = None
+        inference_start = time.perf_counter()
 
         # Usar detector unificado si está disponible
         if self.unified_detector is not None:
             self.unified_detector.confidence = confidence_threshold
-            detections = self.unified_detector.detect(
-                image,
-                detect_faces=detect_faces,
-                detect_plates=detect_plates
+            if adaptive:
+                detections, adaptive_info = self.unified_detector.detect_adaptive(
+                    image,
+                    detect_faces=detect_faces,
+                    detect_plates=detect_plates
+                )
+            else:
+                detections = self.unified_detector.detect(
+                    image,
+                    detect_faces=detect_faces,
+                    detect_plates=detect_plates,
+                    imgsz=imgsz
+                )
+
+            logger.debug(
+                f"Detector unificado: {len(detections['faces'])} rostros, "
+                f"{len(detections['plates'])} matriculas"
             )
 
-            # Convertir a formato (x1, y1, x2, y2)
-            face_boxes = [(x1, y1, x2, y2) for x1, y1, x2, y2, _ in detections['faces']]
-            plate_boxes = [(x1, y1, x2, y2) for x1, y1, x2, y2, _ in detections['plates']]
-
-            logger.info(f"Detector unificado: {len(face_boxes)} rostros, {len(plate_boxes)} matriculas")
-
         else:
             # Usar detectores separados como fallback
             if detect_faces:
                 self.face_detector.confidence = confidence_threshold
-                face_detections = self.face_detector.detect(image)
-                face_boxes = [(x1, y1, x2, y2) for x1, y1, x2, y2, _ in face_detections]
-                logger.info(f"Detectados {len(face_boxes)} rostros")
+                detections['faces'] = self.face_detector.detect(image, imgsz=imgsz)
+                logger.debug(f"Detectados {len(detections['faces'])} rostros")
 
             if detect_plates:
                 self.plate_detector.confidence = confidence_threshold
-                plate_detections = self.plate_detector.detect(image)
-                plate_boxes = [(x1, y1, x2, y2) for x1, y1, x2, y2, _ in plate_detections]
-                logger.info(f"Detectadas {len(plate_boxes)} matriculas")
+                detections['plates'] = self.plate_detector.detect(image, imgsz=imgsz)
+                logger.debug(f"Detectadas {len(detections['plates'])} matriculas")
+
+        IMAGE_STAGE_SECONDS.observe(time.perf_counter() - inference_start, stage="inference")
+        IMAGES_PROCESSED_TOTAL.inc(pipeline="image")
+        DETECTIONS_TOTAL.inc(len(detections['faces']), class_name="face")
+        DETECTIONS_TOTAL.inc(len(detections['plates']), class_name="plate")
+
+        # Convertir a formato (x1, y1, x2, y2)
+        face_boxes = [(x1, y1, x2, y2) for x1, y1, x2, y2, _ in detections['faces']]
+        plate_boxes = [(x1, y1, x2, y2) for x1, y1, x2, y2, _ in detections['plates']]
 
         # Combinar todas las bounding boxes
         all_boxes = face_boxes + plate_boxes
 
         # Aplicar anonimizacion
-        if all_boxes:
-            if anonymization_method == "blur":
-                result = anonymizer.blur(result, all_boxes, kernel_size=blur_kernel_size)
-            elif anonymization_method == "pixelate":
-                result = anonymizer.pixelate(result, all_boxes, blocks=pixelate_blocks)
-            elif anonymization_method == "mask":
-                result = anonymizer.mask(result, all_boxes, color=mask_color)
-            else:
-                raise ValueError(f"Metodo de anonimizacion invalido: {anonymization_method}")
-
-            logger.info(f"Anonimizacion aplicada: {anonymization_method}")
-        else:
-            logger.warning("No se detectaron objetos para anonimizar")
+        result = self._apply_anonymization(
+            result,
+            all_boxes,
+            anonymization_method,
+            blur_kernel_size=blur_kernel_size,
+            pixelate_blocks=pixelate_blocks,
+            mask_color=mask_color
+        )
 
         # Calcular tiempo de procesamiento
         processing_time = (time.time() - start_time) * 1000  # ms
 
         # Metadatos
         metadata = {
+            "detections": detections,
+            "imgsz": imgsz or settings.INFERENCE_IMGSZ,
             "faces_detected": len(face_boxes),
             "plates_detected": len(plate_boxes),
             "total_detections": len(all_boxes),
@@ -150,9 +186,137 @@ class ImageProcessor:
                 "height": image.shape[0]
             }
         }
+        if adaptive_info is not None:
+            metadata["adaptive"] = adaptive_info
+
+        return result, metadata
+
+    @traced("image.process_classes")
+    def process_image_classes(
+        self,
+        image: np.ndarray,
+        classes: List[str],
+        anonymization_method: AnonymizationMethod = "blur",
+        confidence_threshold: float = 0.5,
+        blur_kernel_size: int = 99,
+        pixelate_blocks: int = 10,
+        mask_color: Tuple[int, int, int] = (0, 0, 0),
+        anonymize: bool = True,
+        imgsz: Optional[int] = None
+    ) -> Tuple[np.ndarray, dict]:
+        """
+        Procesa una imagen detectando solo las clases indicadas.
+
+        Usa MultiDetector, que solo invoca los modelos necesarios para las
+        clases pedidas (el modelo COCO no se usa si solo se piden
+        rostros/matriculas).
+
+        Args:
+            image: Imagen original (BGR)
+            classes: Ids de clase del catalogo /api/classes
+            anonymization_method: Metodo de anonimizacion
+            confidence_threshold: Umbral de confianza para detecciones
+            blur_kernel_size: Tamano del kernel para blur
+            pixelate_blocks: Numero de bloques para pixelacion
+            mask_color: Color para masking en formato BGR
+            anonymize: Si False, solo detecta y devuelve la imagen original
+            imgsz: Tamano de entrada del detector (None = settings.INFERENCE_IMGSZ)
+
+        Returns:
+            Tupla (imagen_anonimizada, metadatos). Los metadatos incluyen
+            las detecciones por clase en 'detections'.
+        """
+        start_time = time.time()
+
+        multi_detector = get_multi_detector()
+        multi_detector.confidence = confidence_threshold
+
+        with span("image.inference"), timed(IMAGE_STAGE_SECONDS, stage="inference"):
+            detections = multi_detector.detect(image, classes_to_detect=classes, imgsz=imgsz)
+        plan = MultiDetector.plan_models(classes)
+
+        IMAGES_PROCESSED_TOTAL.inc(pipeline="classes")
+        for class_id, class_detections in detections.items():
+            DETECTIONS_TOTAL.inc(len(class_detections), class_name=class_id)
+
+        all_boxes = [
+            (x1, y1, x2, y2)
+            for class_detections in detections.values()
+            for x1, y1, x2, y2, _ in class_detections
+        ]
+
+        result = image
+        if anonymize:
+            result = self._apply_anonymization(
+                image.copy(),
+                all_boxes,
+                anonymization_method,
+                blur_kernel_size=blur_kernel_size,
+                pixelate_blocks=pixelate_blocks,
+                mask_color=mask_color
+            )
+
+        processing_time = (time.time() - start_time) * 1000  # ms
+
+        metadata = {
+            "detections": detections,
+            "detections_by_class": {cls: len(dets) for cls, dets in detections.items()},
+            "classes_requested": classes,
+            "models_used": [model for model, model_classes in plan.items() if model_classes],
+            "total_detections": len(all_boxes),
+            "anonymization_method": anonymization_method,
+            "processing_time_ms": processing_time,
+            "image_size": {
+                "width": image.shape[1],
+                "height": image.shape[0]
+            }
+        }
 
         return result, metadata
 
+    def _apply_anonymization(
+        self,
+        image: np.ndarray,
+        boxes: List[Tuple[int, int, int, int]],
+        anonymization_method: AnonymizationMethod,
+        blur_kernel_size: int = 99,
+        pixelate_blocks: int = 10,
+        mask_color: Tuple[int, int, int] = (0, 0, 0)
+    ) -> np.ndarray:
+        """
+        Aplica el metodo de anonimizacion a las regiones indicadas.
+
+        Args:
+            image: Imagen sobre la que aplicar la anonimizacion (BGR)
+            boxes: Lista de bounding boxes (x1, y1, x2, y2)
+            anonymization_method: Metodo de anonimizacion
+            blur_kernel_size: Tamano del kernel para blur
+            pixelate_blocks: Numero de bloques para pixelacion
+            mask_color: Color para masking en formato BGR
+
+        Returns:
+            Imagen anonimizada
+
+        Raises:
+            ValueError: Si el metodo no es valido
+        """
+        if not boxes:
+            logger.debug("No se detectaron objetos para anonimizar")
+            return image
+
+        with span("image.anonymize"), timed(IMAGE_STAGE_SECONDS, stage="anonymize"):
+            if anonymization_method == "blur":
+                result = anonymizer.blur(image, boxes, kernel_size=blur_kernel_size)
+            elif anonymization_method == "pixelate":
+                result = anonymizer.pixelate(image, boxes, blocks=pixelate_blocks)
+            elif anonymization_method == "mask":
+                result = anonymizer.mask(image, boxes, color=mask_color)
+            else:
+                raise ValueError(f"Metodo de anonimizacion invalido: {anonymization_method}")
+
+        logger.debug(f"Anonimizacion aplicada: {anonymization_method}")
+        return result
+
     def process_image_bytes(
         self,
         image_bytes: bytes,
@@ -171,14 +335,165 @@ class ImageProcessor:
         Raises:
             ValueError: Si no se puede decodificar la imagen
         """
-        # Decodificar imagen
+        image = self.decode_image(image_bytes)
+
+        return self.process_image(image, **kwargs)
+
+    @staticmethod
+    def decode_image(image_bytes: bytes) -> np.ndarray:
+        """
+        Decodifica una imagen desde bytes.
+
+        Args:
+            image_bytes: Imagen en bytes
+
+        Returns:
+            Imagen decodificada (BGR)
+
+        Raises:
+            ValueError: Si no se puede decodificar la imagen
+        """
         nparr = np.frombuffer(image_bytes, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        with span("image.decode"), timed(IMAGE_STAGE_SECONDS, stage="decode"):
+            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
 
         if image is None:
             raise ValueError("No se pudo decodificar la imagen")
 
-        return self.process_image(image, **kwargs)
+        return image
+
+    @staticmethod
+    def decode_upload(
+        fileobj: BinaryIO,
+        max_side: Optional[int] = None
+    ) -> Tuple[np.ndarray, float]:
+        """
+        Decodifica una imagen directamente desde el fichero de subida.
+
+        Evita el objeto bytes intermedio de read(): el contenido se lee una
+        sola vez con readinto en un array reservado con el tamano del
+        fichero, tanto si la subida esta en memoria como si ya se volco a
+        disco. Con max_side, los JPEG se decodifican a
+        resolucion reducida (1/2, 1/4 o 1/8) mientras el lado mayor siga
+        siendo >= max_side; util cuando solo se detecta, porque el detector
+        reescala la imagen a su tamano de entrada igualmente.
+
+        Args:
+            fileobj: Fichero de subida (UploadFile.file)
+            max_side: Lado mayor minimo a conservar (None = resolucion completa)
+
+        Returns:
+            Tupla (imagen BGR, escala). La escala es el factor por el que hay
+            que multiplicar las coordenadas para volver a la imagen original.
+
+        Raises:
+            ValueError: Si no se puede decodificar la imagen
+        """
+        size = fileobj.seek(0, io.SEEK_END)
+        fileobj.seek(0)
+
+        if hasattr(fileobj, "readinto"):
+            buffer = np.empty(size, dtype=np.uint8)
+            view = memoryview(buffer)
+            filled = 0
+            while filled < size:
+                read = fileobj.readinto(view[filled:])
+                if not read:
+                    break
+                filled += read
+            buffer = buffer[:filled]
+        else:
+            buffer = np.frombuffer(fileobj.read(), np.uint8)
+
+        image, scale = ImageProcessor._decode_buffer(buffer, max_side)
+
+        if image is None:
+            raise ValueError("No se pudo decodificar la imagen")
+
+        return image, scale
+
+    @staticmethod
+    def _decode_buffer(
+        buffer: np.ndarray,
+        max_side: Optional[int] = None
+    ) -> Tuple[Optional[np.ndarray], float]:
+        """
+        Decodifica un buffer eligiendo el factor de reduccion JPEG.
+
+        Args:
+            buffer: Imagen codificada
+            max_side: Lado mayor minimo a conservar (None = resolucion completa)
+
+        Returns:
+            Tupla (imagen o None si no se pudo decodificar, escala)
+        """
+        with span("image.decode"), timed(IMAGE_STAGE_SECONDS, stage="decode"):
+            if max_side and settings.DECODE_REDUCED_JPEG:
+                size = jpeg_dimensions(buffer)
+                if size is not None:
+                    longest = max(size)
+                    for factor, flag in _REDUCED_COLOR_FLAGS.items():
+                        if longest // factor >= max_side:
+                            image = cv2.imdecode(buffer, flag)
+                            if image is None:
+                                return None, 1.0
+                            return image, longest / max(image.shape[:2])
+
+            return cv2.imdecode(buffer, cv2.IMREAD_COLOR), 1.0
+
+    @staticmethod
+    def encode_image(image: np.ndarray, filename: str) -> Tuple[bytes, str]:
+        """
+        Codifica una imagen intentando mantener el formato original.
+
+        Args:
+            image: Imagen a codificar (BGR)
+            filename: Nombre del archivo original (para deducir el formato)
+
+        Returns:
+            Tupla (bytes codificados, media type)
+
+        Raises:
+            ValueError: Si no se puede codificar la imagen
+        """
+        buffer, media_type = ImageProcessor.encode_image_buffer(image, filename)
+        return buffer.tobytes(), media_type
+
+    @staticmethod
+    def encode_image_buffer(image: np.ndarray, filename: str) -> Tuple[memoryview, str]:
+        """
+        Codifica una imagen sin copiar el resultado a bytes.
+
+        El memoryview apunta al buffer de cv2.imencode y se puede pasar
+        directamente como contenido de una respuesta.
+
+        Args:
+            image: Imagen a codificar (BGR)
+            filename: Nombre del archivo original (para deducir el formato)
+
+        Returns:
+            Tupla (buffer codificado, media type)
+
+        Raises:
+            ValueError: Si no se puede codificar la imagen
+        """
+        ext = filename.split('.')[-1].lower() if '.' in filename else 'jpg'
+
+        with span("image.encode"), timed(IMAGE_STAGE_SECONDS, stage="encode"):
+            if ext == 'png':
+                encode_param = [int(cv2.IMWRITE_PNG_COMPRESSION), 3]
+                success, encoded_image = cv2.imencode('.png', image, encode_param)
+                media_type = 'image/png'
+            else:
+                # JPEG para jpg/jpeg y por defecto
+                encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 95]
+                success, encoded_image = cv2.imencode('.jpg', image, encode_param)
+                media_type = 'image/jpeg'
+
+        if not success:
+            raise ValueError("Error al codificar la imagen anonimizada")
+
+        return memoryview(encoded_image.reshape(-1)), media_type
 
 
 # Instancia global del procesador
@@ -194,6 +509,7 @@ def get_image_processor() -> ImageProcessor:
     """
     global _image_processor_instance
 
+    record_cache_lookup("image_processor", _image_processor_instance is not None)
     if _image_processor_instance is None:
         _image_processor_instance = ImageProcessor()
 
@@ -0,0 +1,234 @@
+"""
+Recodificacion JPEG limitada a las regiones anonimizadas.
+
+En lugar de recodificar toda la imagen, sustituye solo los bloques MCU que
+solapan con las detecciones usando `jpegtran -drop`, que copia el resto de
+bloques DCT sin perdidas. El resultado es identico byte a byte al original
+fuera de las regiones anonimizadas.
+
+Requiere el binario jpegtran (libjpeg-turbo >= 2.1 / libjpeg >= 9). Si no
+esta disponible, la imagen no es un JPEG baseline compatible o tiene una
+orientacion EXIF distinta de 1 (cv2.imdecode la rota, y las boxes no
+corresponderian a los bloques del fichero), el llamador debe recurrir a la
+recodificacion completa.
+"""
+
+import cv2
+import numpy as np
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import List, Optional, Tuple
+import logging
+
+from app.core.config import settings
+from app.utils.jpeg import read_exif_orientation, read_frame_header, is_baseline, mcu_size
+
+
+logger = logging.getLogger(__name__)
+
+
+# Submuestreo de luminancia (h, v) -> parametro de cv2.IMWRITE_JPEG_SAMPLING_FACTOR
+_SAMPLING_FACTORS = {
+    (2, 2): cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420,
+    (2, 1): cv2.IMWRITE_JPEG_SAMPLING_FACTOR_422,
+    (1, 1): cv2.IMWRITE_JPEG_SAMPLING_FACTOR_444,
+}
+
+
+def align_box(
+    box: Tuple[int, int, int, int],
+    mcu: Tuple[int, int],
+    width: int,
+    height: int
+) -> Tuple[int, int, int, int]:
+    """
+    Amplia una box a la rejilla de MCU.
+
+    Args:
+        box: Box (x1, y1, x2, y2)
+        mcu: Tamano (ancho, alto) del MCU
+        width: Ancho de la imagen
+        height: Alto de la imagen
+
+    Returns:
+        Box alineada a MCU y recortada a la imagen
+    """
+    mw, mh = mcu
+    x1, y1, x2, y2 = box
+
+    x1 = max(0, (x1 // mw) * mw)
+    y1 = max(0, (y1 // mh) * mh)
+    x2 = min(width, -(-x2 // mw) * mw)
+    y2 = min(height, -(-y2 // mh) * mh)
+
+    return x1, y1, x2, y2
+
+
+class JpegRegionEncoder:
+    """
+    Sustituye en un JPEG solo los bloques de las regiones anonimizadas.
+
+    Attributes:
+        jpegtran_path: Ruta al binario jpegtran (None si no esta disponible)
+        max_regions: Numero maximo de regiones; con mas se recodifica entero
+        quality: Calidad JPEG de los bloques sustituidos
+    """
+
+    def __init__(
+        self,
+        jpegtran_path: Optional[str] = None,
+        max_regions: Optional[int] = None,
+        quality: int = 95
+    ):
+        """
+        Inicializa el codificador por regiones.
+
+        Args:
+            jpegtran_path: Ruta a jpegtran. Si None, usa settings.JPEGTRAN_PATH
+                           o lo busca en el PATH
+            max_regions: Maximo de regiones. Si None, usa settings.JPEG_REGION_MAX_BOXES
+            quality: Calidad JPEG de los bloques sustituidos
+        """
+        self.jpegtran_path = jpegtran_path or settings.JPEGTRAN_PATH or shutil.which("jpegtran")
+        self.max_regions = max_regions or settings.JPEG_REGION_MAX_BOXES
+        self.quality = quality
+
+    @property
+    def available(self) -> bool:
+        """Indica si jpegtran esta disponible."""
+        return self.jpegtran_path is not None
+
+    def encode(
+        self,
+        original: bytes,
+        image: np.ndarray,
+        boxes: List[Tuple[int, int, int, int]]
+    ) -> Optional[bytes]:
+        """
+        Genera el JPEG anonimizado sustituyendo solo las regiones indicadas.
+
+        Args:
+            original: JPEG original tal como se subio
+            image: Imagen anonimizada (BGR, mismas dimensiones que el original)
+            boxes: Boxes anonimizadas (x1, y1, x2, y2)
+
+        Returns:
+            JPEG resultante, o None si no se puede aplicar (el llamador debe
+            recodificar la imagen completa). Tambien None si el JPEG tiene
+            una orientacion EXIF distinta de 1
+        """
+        if not self.available or len(boxes) > self.max_regions:
+            return None
+
+        header = read_frame_header(original)
+        if header is None or not is_baseline(header):
+            return None
+
+        # La imagen decodificada esta rotada segun EXIF: las boxes no estan en
+        # la rejilla del fichero (una rotacion de 180 grados no cambia el tamano)
+        if read_exif_orientation(original) not in (None, 1):
+            return None
+
+        height, width = image.shape[:2]
+        if (header["width"], header["height"]) != (width, height):
+            return None
+
+        components = header["components"]
+        if len(components) == 3:
+            luma_sampling = components[0][1:]
+            if luma_sampling not in _SAMPLING_FACTORS:
+                return None
+            if any((h, v) != (1, 1) for _, h, v in components[1:]):
+                return None
+        elif len(components) != 1:
+            return None
+
+        mcu = mcu_size(header)
+        regions = sorted({align_box(box, mcu, width, height) for box in boxes})
+        regions = [(x1, y1, x2, y2) for x1, y1, x2, y2 in regions if x2 > x1 and y2 > y1]
+
+        try:
+            if not regions:
+                # Sin detecciones basta con eliminar los metadatos sin recodificar
+                return self._run_jpegtran(original, [])
+
+            data = original
+            with tempfile.TemporaryDirectory(prefix="jpegdrop_", dir=settings.TEMP_DIR) as tmp_dir:
+                drop_path = os.path.join(tmp_dir, "drop.jpg")
+                for x1, y1, x2, y2 in regions:
+                    region = image[y1:y2, x1:x2]
+                    params = [int(cv2.IMWRITE_JPEG_QUALITY), self.quality]
+                    if len(components) == 1:
+                        region = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+                    else:
+                        params += [
+                            int(cv2.IMWRITE_JPEG_SAMPLING_FACTOR), _SAMPLING_FACTORS[luma_sampling]
+                        ]
+
+                    success, encoded = cv2.imencode('.jpg', region, params)
+                    if not success:
+                        return None
+                    encoded.tofile(drop_path)
+
+                    data = self._run_jpegtran(data, ["-drop", f"+{x1}+{y1}", drop_path])
+                    if data is None:
+                        return None
+
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning(f"No se pudo aplicar la recodificacion por regiones: {e}")
+            return None
+
+        return data
+
+    def _run_jpegtran(self, data: bytes, args: List[str]) -> Optional[bytes]:
+        """
+        Ejecuta jpegtran sobre un JPEG en memoria.
+
+        Se usa siempre -copy none: los metadatos (EXIF, GPS) no se
+        conservan, igual que en la recodificacion completa.
+
+        Args:
+            data: JPEG de entrada
+            args: Argumentos adicionales de jpegtran
+
+        Returns:
+            JPEG de salida o None si jpegtran falla
+        """
+        result = subprocess.run(
+            [self.jpegtran_path, "-copy", "none", *args],
+            input=data,
+            capture_output=True,
+            timeout=settings.JPEG_REGION_TIMEOUT_S,
+            check=False
+        )
+        if result.returncode != 0 or not result.stdout:
+            logger.warning(
+                f"jpegtran fallo ({result.returncode}): "
+                f"{result.stderr.decode(errors='replace').strip()}"
+            )
+            return None
+
+        return result.stdout
+
+
+# Instancia global del codificador
+_jpeg_region_encoder_instance: Optional[JpegRegionEncoder] = None
+
+
+def get_jpeg_region_encoder() -> JpegRegionEncoder:
+    """
+    Obtiene la instancia global del codificador por regiones.
+
+    Returns:
+        Instancia de JpegRegionEncoder (singleton)
+    """
+    global _jpeg_region_encoder_instance
+
+    if _jpeg_region_encoder_instance is None:
+        _jpeg_region_encoder_instance = JpegRegionEncoder()
+        if not _jpeg_region_encoder_instance.available:
+            logger.info("jpegtran no disponible: se usara la recodificacion completa")
+
+    return _jpeg_region_encoder_instance
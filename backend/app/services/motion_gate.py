@@ -0,0 +1,176 @@
+"""
+Filtro de movimiento para evitar detecciones redundantes en video.
+
+Compara cada frame con el ultimo frame en el que se detecto, sobre una
+miniatura en escala de grises (coste despreciable frente al detector):
+
+- Si la fraccion de pixeles que cambian es menor que
+  VIDEO_MOTION_MIN_CHANGED, se reutilizan las boxes anteriores.
+- Si el histograma cambia mucho (cambio de escena), o han pasado
+  VIDEO_MOTION_MAX_SKIP frames sin detectar, se detecta el frame completo.
+- En otro caso se devuelven las regiones que han cambiado para detectar
+  solo en ellas (o el frame completo si cubren demasiada superficie).
+
+Pensado para camaras fijas (CCTV), donde la mayoria de frames son casi
+identicos. Desactivado por defecto (VIDEO_MOTION_GATE).
+"""
+
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+
+
+DECISION_DETECT = "detect"
+DECISION_REGIONS = "regions"
+DECISION_REUSE = "reuse"
+
+# Lado mayor de la miniatura comparada
+THUMB_SIDE = 160
+
+Region = Tuple[int, int, int, int]
+
+
+class MotionGate:
+    """
+    Decide por frame si detectar, detectar por regiones o reutilizar.
+
+    El estado (frame de referencia) es por video: se crea una instancia
+    por procesamiento.
+
+    Attributes:
+        pixel_threshold: Diferencia de gris (0-255) a partir de la cual un pixel cambia
+        min_changed: Fraccion de pixeles cambiados por debajo de la cual se reutiliza
+        scene_change: Caida de correlacion de histograma que fuerza deteccion completa
+        max_skip: Frames consecutivos reutilizados como maximo
+        use_regions: Si detectar solo en las regiones cambiadas
+        region_max_area: Fraccion del frame cubierta por regiones a partir de la
+                         cual se detecta el frame completo
+        max_regions: Numero maximo de regiones (con mas, frame completo)
+    """
+
+    def __init__(
+        self,
+        pixel_threshold: Optional[int] = None,
+        min_changed: Optional[float] = None,
+        scene_change: Optional[float] = None,
+        max_skip: Optional[int] = None,
+        use_regions: Optional[bool] = None,
+        region_max_area: Optional[float] = None,
+        max_regions: Optional[int] = None
+    ):
+        """
+        Inicializa el filtro (los valores None se toman de settings.VIDEO_MOTION_*).
+        """
+        def _pick(value, default):
+            return default if value is None else value
+
+        self.pixel_threshold = _pick(pixel_threshold, settings.VIDEO_MOTION_PIXEL_THRESHOLD)
+        self.min_changed = _pick(min_changed, settings.VIDEO_MOTION_MIN_CHANGED)
+        self.scene_change = _pick(scene_change, settings.VIDEO_MOTION_SCENE_CHANGE)
+        self.max_skip = _pick(max_skip, settings.VIDEO_MOTION_MAX_SKIP)
+        self.use_regions = _pick(use_regions, settings.VIDEO_MOTION_REGIONS)
+        self.region_max_area = _pick(region_max_area, settings.VIDEO_MOTION_REGION_MAX_AREA)
+        self.max_regions = _pick(max_regions, settings.VIDEO_MOTION_MAX_REGIONS)
+
+        self._reference: Optional[np.ndarray] = None
+        self._reference_hist: Optional[np.ndarray] = None
+        self._skipped = 0
+
+    def reset(self) -> None:
+        """Olvida el frame de referencia (el siguiente frame se detecta entero)."""
+        self._reference = None
+        self._reference_hist = None
+        self._skipped = 0
+
+    def check(self, frame: np.ndarray) -> Tuple[str, List[Region]]:
+        """
+        Decide que hacer con un frame.
+
+        Cuando la decision no es reutilizar, el frame pasa a ser la nueva
+        referencia (se asume que el llamador detecta en el).
+
+        Args:
+            frame: Frame BGR (normalmente la copia reducida para deteccion)
+
+        Returns:
+            Tupla (decision, regiones). Las regiones, en coordenadas de
+            `frame`, solo se devuelven con DECISION_REGIONS
+        """
+        thumb = self._thumbnail(frame)
+        hist = cv2.calcHist([thumb], [0], None, [32], [0, 256])
+        cv2.normalize(hist, hist)
+
+        decision, regions = self._decide(frame, thumb, hist)
+
+        if decision == DECISION_REUSE:
+            self._skipped += 1
+        else:
+            self._reference = thumb
+            self._reference_hist = hist
+            self._skipped = 0
+
+        return decision, regions
+
+    def _decide(
+        self,
+        frame: np.ndarray,
+        thumb: np.ndarray,
+        hist: np.ndarray
+    ) -> Tuple[str, List[Region]]:
+        if self._reference is None or self._reference.shape != thumb.shape:
+            return DECISION_DETECT, []
+        if self._skipped >= self.max_skip:
+            return DECISION_DETECT, []
+
+        correlation = cv2.compareHist(self._reference_hist, hist, cv2.HISTCMP_CORREL)
+        if correlation < 1.0 - self.scene_change:
+            return DECISION_DETECT, []
+
+        changed = cv2.absdiff(thumb, self._reference) > self.pixel_threshold
+        changed_ratio = float(np.count_nonzero(changed)) / changed.size
+        if changed_ratio < self.min_changed:
+            return DECISION_REUSE, []
+
+        if not self.use_regions:
+            return DECISION_DETECT, []
+
+        regions = self._changed_regions(changed, frame.shape[1], frame.shape[0])
+        covered = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in regions)
+        if not regions or len(regions) > self.max_regions or \
+                covered > self.region_max_area * frame.shape[0] * frame.shape[1]:
+            return DECISION_DETECT, []
+
+        return DECISION_REGIONS, regions
+
+    @staticmethod
+    def _thumbnail(frame: np.ndarray) -> np.ndarray:
+        """Miniatura en gris suavizada (reduce el ruido del sensor y de compresion)."""
+        height, width = frame.shape[:2]
+        scale = THUMB_SIDE / max(height, width)
+        if scale < 1.0:
+            frame = cv2.resize(
+                frame, (max(1, round(width * scale)), max(1, round(height * scale))),
+                interpolation=cv2.INTER_AREA
+            )
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        return cv2.GaussianBlur(gray, (3, 3), 0)
+
+    @staticmethod
+    def _changed_regions(changed: np.ndarray, width: int, height: int) -> List[Region]:
+        """Rectangulos envolventes de las zonas cambiadas, en coordenadas del frame."""
+        mask = cv2.dilate(changed.astype(np.uint8), np.ones((5, 5), np.uint8))
+        count, _, components, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+
+        scale_x = width / changed.shape[1]
+        scale_y = height / changed.shape[0]
+        regions = []
+        for x, y, w, h, _ in components[1:count]:
+            regions.append((
+                int(x * scale_x), int(y * scale_y),
+                min(width, int(np.ceil((x + w) * scale_x))),
+                min(height, int(np.ceil((y + h) * scale_y)))
+            ))
+        return regions
@@ -0,0 +1,143 @@
+"""
+Almacen de videos procesados.
+
+Cada salida se guarda en OUTPUTS_DIR/videos como <id>.mp4 junto a un
+fichero <id>.json con su estado:
+
+- processing: el video se esta escribiendo. Si es progresivo (MP4
+  fragmentado de ffmpeg, escrito siempre hacia delante) se puede descargar
+  mientras crece.
+- complete: el video esta terminado y se sirve con soporte de Range.
+- failed: el procesamiento fallo y el video se ha borrado.
+
+Las salidas se descargan por GET /api/outputs/{id} y caducan a las
+OUTPUT_TTL_HOURS horas (limpieza periodica con FileHandler.cleanup_old_files).
+"""
+
+import json
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import logging
+
+from app.core.config import settings
+from app.utils.file_handler import FileHandler
+
+
+logger = logging.getLogger(__name__)
+
+STATE_PROCESSING = "processing"
+STATE_COMPLETE = "complete"
+STATE_FAILED = "failed"
+
+# Los ids son uuid4 en hexadecimal: nunca se resuelven rutas del cliente
+_OUTPUT_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class OutputStore:
+    """
+    Directorio de salidas con estado por fichero.
+
+    Attributes:
+        root: Directorio de las salidas
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def create(self, filename: str, progressive: bool = False) -> Tuple[str, Path]:
+        """
+        Reserva una salida nueva en estado 'processing'.
+
+        Args:
+            filename: Nombre con el que se descargara el video
+            progressive: Si el video se puede descargar mientras se escribe
+
+        Returns:
+            Tupla (id, ruta del video a escribir)
+        """
+        output_id = uuid.uuid4().hex
+        self._write_meta(output_id, {
+            'state': STATE_PROCESSING,
+            'filename': filename,
+            'progressive': progressive,
+            'created': time.time(),
+        })
+        return output_id, self.root / f"{output_id}.mp4"
+
+    def info(self, output_id: str) -> Optional[Dict]:
+        """
+        Estado de una salida.
+
+        Returns:
+            Dict con state, filename, progressive y path, o None si no existe
+        """
+        if not _OUTPUT_ID.match(output_id):
+            return None
+        path = self.root / f"{output_id}.mp4"
+        try:
+            with open(self.root / f"{output_id}.json") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            # Sin estado (p. ej. ya caducado): solo vale si el video existe
+            if not path.is_file():
+                return None
+            meta = {'state': STATE_COMPLETE, 'filename': path.name, 'progressive': False}
+        meta['path'] = path
+        return meta
+
+    def complete(self, output_id: str) -> None:
+        """Marca la salida como terminada."""
+        self._update(output_id, state=STATE_COMPLETE)
+
+    def fail(self, output_id: str) -> None:
+        """Marca la salida como fallida y borra el video parcial."""
+        self._update(output_id, state=STATE_FAILED)
+        FileHandler.delete_file(self.root / f"{output_id}.mp4")
+
+    def url(self, output_id: str) -> str:
+        """URL de descarga de una salida."""
+        return f"/api/outputs/{output_id}"
+
+    def cleanup(self, max_age_hours: Optional[float] = None) -> int:
+        """
+        Borra las salidas mas antiguas que max_age_hours.
+
+        Args:
+            max_age_hours: Edad maxima. Si None, usa settings.OUTPUT_TTL_HOURS
+
+        Returns:
+            Numero de ficheros eliminados
+        """
+        max_age_hours = settings.OUTPUT_TTL_HOURS if max_age_hours is None else max_age_hours
+        return FileHandler.cleanup_old_files(self.root, max_age_hours)
+
+    def _update(self, output_id: str, **changes) -> None:
+        meta = self.info(output_id) or {}
+        meta.pop('path', None)
+        meta.update(changes)
+        self._write_meta(output_id, meta)
+
+    def _write_meta(self, output_id: str, meta: Dict) -> None:
+        """Escribe el estado de forma atomica (temporal + rename)."""
+        path = self.root / f"{output_id}.json"
+        tmp = self.root / f".{output_id}.json.tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, path)
+
+
+# Instancia global del almacen (singleton)
+_output_store = None
+
+
+def get_output_store() -> OutputStore:
+    """Obtiene la instancia singleton del almacen de salidas."""
+    global _output_store
+    if _output_store is None:
+        _output_store = OutputStore(settings.OUTPUTS_DIR / "videos")
+    return _output_store
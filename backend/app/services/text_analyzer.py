@@ -5,12 +5,16 @@ Detecta y anonimiza datos sensibles en texto usando patrones regex y/o LLM local
 
 import re
 import json
+import time
 import requests
 import os
 from typing import Dict, List, Tuple, Optional
 from collections import defaultdict
 import logging
 
+from app.core.metrics import TEXT_LLM_SECONDS, TEXT_REGEX_SECONDS
+from app.core.tracing import traced
+
 logger = logging.getLogger(__name__)
 
 
@@ -186,6 +190,7 @@ class TextAnalyzer:
 
         return categories
 
+    @traced("text.regex")
     def detect_with_regex(
         self,
         text: str,
@@ -211,6 +216,7 @@ class TextAnalyzer:
                 continue
 
             category_info = self.regex_patterns[category]
+            category_start = time.perf_counter()
 
             for pattern_str in category_info['patterns']:
                 pattern = re.compile(pattern_str, re.IGNORECASE)
@@ -227,8 +233,11 @@ class TextAnalyzer:
                     }
                     detections.append(detection)
 
+            TEXT_REGEX_SECONDS.observe(time.perf_counter() - category_start, category=category)
+
         return detections
 
+    @traced("text.llm")
     def detect_with_llm(
         self,
         text: str,
@@ -312,25 +321,30 @@ TEXTO:
 
 Responde con JSON válido."""
 
-            # Llamar a Ollama con Chat API
-            response = requests.post(
-                f"{self.ollama_url}/api/chat",
-                json={
-                    "model": self.model,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    "stream": False,
-                    "format": "json",
-                    "options": {
-                        "temperature": 0.2,
-                        "top_p": 0.9
-                    }
-                },
-                timeout=60
-            )
-
+            # Llamar a Ollama con Chat API (se mide la ida y vuelta)
+            llm_start = time.perf_counter()
+            llm_status = "error"
+            try:
+                response = requests.post(
+                    f"{self.ollama_url}/api/chat",
+                    json={
+                        "model": self.model,
+                        "messages": [
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": user_prompt}
+                        ],
+                        "stream": False,
+                        "format": "json",
+                        "options": {
+                            "temperature": 0.2,
+                            "top_p": 0.9
+                        }
+                    },
+                    timeout=60
+                )
+                llm_status = str(response.status_code)
+            finally:
+                TEXT_LLM_SECONDS.observe(time.perf_counter() - llm_start, status=llm_status)
 
             if response.status_code != 200:
                 logger.error(f"Error en Ollama: {response.status_code}")
@@ -403,6 +417,7 @@ Responde con JSON válido."""
             logger.error(f"Error en detección LLM: {e}", exc_info=True)
             return []
 
+    @traced("text.detect")
     def detect_sensitive_data(
         self,
         text: str,
@@ -0,0 +1,397 @@
+"""
+Codificacion de video de salida.
+
+Dos backends con la misma interfaz que cv2.VideoWriter (write / release):
+
+- FFmpegVideoEncoder: envia los frames BGR sin comprimir por una tuberia a
+  un subproceso ffmpeg. Permite elegir codec (libx264, libx265, h264_nvenc,
+  h264_qsv...), preset, CRF e hilos, copia la pista de audio del video
+  original y escribe MP4 con faststart (moov al principio, reproducible
+  mientras se descarga) o, con fragmented, MP4 fragmentado (escrito siempre
+  hacia delante: se puede servir mientras se codifica).
+- OpenCVVideoEncoder: cv2.VideoWriter con fourcc mp4v, sin audio. Se usa
+  como alternativa si ffmpeg no esta disponible o VIDEO_ENCODER='opencv'.
+
+Uso:
+    encoder = create_video_encoder(output_path, fps, width, height, audio_source=input_path)
+    try:
+        for frame in frames:
+            encoder.write(frame)
+        encoder.release()
+    except Exception:
+        encoder.abort()
+        raise
+"""
+
+import shutil
+import subprocess
+import tempfile
+from fractions import Fraction
+from typing import List, Optional
+import logging
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+VIDEO_ENCODERS = ("auto", "ffmpeg", "opencv")
+
+# Opcion de calidad constante por familia de codec (los codificadores por
+# hardware no aceptan -crf)
+_QUALITY_FLAGS = {
+    "nvenc": "-cq",
+    "qsv": "-global_quality",
+    "videotoolbox": "-q:v",
+}
+
+
+class VideoEncoderError(RuntimeError):
+    """Error al codificar el video de salida."""
+
+
+class OpenCVVideoEncoder:
+    """
+    Codificador con cv2.VideoWriter (mp4v, sin audio).
+
+    Attributes:
+        backend: Nombre del backend ('opencv')
+        output_path: Fichero de salida
+    """
+
+    backend = "opencv"
+
+    def __init__(self, output_path: str, fps: float, width: int, height: int):
+        self.output_path = output_path
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        self._writer = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+        if not self._writer.isOpened():
+            raise VideoEncoderError(f"No se pudo crear el video de salida: {output_path}")
+
+    def write(self, frame: np.ndarray) -> None:
+        """Anade un frame BGR."""
+        self._writer.write(frame)
+
+    def release(self) -> None:
+        """Cierra el fichero de salida."""
+        self._writer.release()
+
+    def abort(self) -> None:
+        """Cierra el fichero tras un error (mismo efecto que release)."""
+        self._writer.release()
+
+
+class FFmpegVideoEncoder:
+    """
+    Codificador con un subproceso ffmpeg alimentado por tuberia.
+
+    Los frames se escriben como rawvideo bgr24 en stdin; la codificacion
+    ocurre en el proceso de ffmpeg en paralelo al procesamiento de frames.
+
+    Attributes:
+        backend: Nombre del backend ('ffmpeg')
+        output_path: Fichero de salida
+        command: Linea de comandos de ffmpeg
+    """
+
+    backend = "ffmpeg"
+
+    def __init__(
+        self,
+        output_path: str,
+        fps: float,
+        width: int,
+        height: int,
+        audio_source: Optional[str] = None,
+        ffmpeg_path: Optional[str] = None,
+        codec: Optional[str] = None,
+        preset: Optional[str] = None,
+        crf: Optional[int] = None,
+        threads: Optional[int] = None,
+        fragmented: bool = False,
+        live: bool = False,
+        output_args: Optional[List[str]] = None
+    ):
+        """
+        Arranca ffmpeg.
+
+        Args:
+            output_path: Fichero MP4 de salida
+            fps: Frames por segundo
+            width: Ancho de los frames
+            height: Alto de los frames
+            audio_source: Video del que copiar la pista de audio (si tiene)
+            ffmpeg_path: Binario de ffmpeg. Si None, se busca con find_ffmpeg()
+            codec: Codec de video. Si None, usa settings.VIDEO_CODEC
+            preset: Preset del codec. Si None, usa settings.VIDEO_PRESET
+            crf: Calidad constante. Si None, usa settings.VIDEO_CRF
+            threads: Hilos de codificacion. Si None, usa settings.VIDEO_ENCODER_THREADS
+            fragmented: Escribir MP4 fragmentado en lugar de faststart
+            live: Frames en directo a ritmo variable (ver build_ffmpeg_command)
+            output_args: Opciones de contenedor de la salida (ver build_ffmpeg_command)
+
+        Raises:
+            VideoEncoderError: Si ffmpeg no esta disponible o no arranca
+        """
+        self.output_path = output_path
+        self.width = width
+        self.height = height
+
+        ffmpeg_path = ffmpeg_path or find_ffmpeg()
+        if ffmpeg_path is None:
+            raise VideoEncoderError("ffmpeg no disponible")
+
+        self.command = build_ffmpeg_command(
+            ffmpeg_path, output_path, fps, width, height,
+            audio_source=audio_source if settings.VIDEO_COPY_AUDIO else None,
+            codec=codec or settings.VIDEO_CODEC,
+            preset=preset or settings.VIDEO_PRESET,
+            crf=settings.VIDEO_CRF if crf is None else crf,
+            threads=settings.VIDEO_ENCODER_THREADS if threads is None else threads,
+            fragmented=fragmented,
+            live=live,
+            output_args=output_args
+        )
+
+        # stderr a fichero: con una tuberia sin leer ffmpeg podria bloquearse
+        self._stderr = tempfile.TemporaryFile()
+        try:
+            self._process = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=self._stderr
+            )
+        except OSError as e:
+            self._stderr.close()
+            raise VideoEncoderError(f"No se pudo arrancar ffmpeg: {e}") from e
+
+        self._closed = False
+
+    def write(self, frame: np.ndarray) -> None:
+        """
+        Anade un frame BGR.
+
+        Raises:
+            VideoEncoderError: Si el frame no tiene el tamano esperado o ffmpeg termino
+        """
+        if frame.shape[:2] != (self.height, self.width):
+            raise VideoEncoderError(
+                f"Frame de {frame.shape[1]}x{frame.shape[0]}, "
+                f"se esperaba {self.width}x{self.height}"
+            )
+        try:
+            self._process.stdin.write(np.ascontiguousarray(frame, dtype=np.uint8).data)
+        except (BrokenPipeError, ValueError) as e:
+            self._process.wait()
+            raise VideoEncoderError(
+                f"ffmpeg termino durante la codificacion: {self._error_output()}"
+            ) from e
+
+    def release(self) -> None:
+        """
+        Cierra la entrada y espera a que ffmpeg termine el fichero.
+
+        Raises:
+            VideoEncoderError: Si ffmpeg termina con error
+        """
+        if self._closed:
+            return
+        self._closed = True
+
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+
+        try:
+            returncode = self._process.wait(timeout=settings.VIDEO_ENCODER_TIMEOUT_S)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+            self._stderr.close()
+            raise VideoEncoderError("ffmpeg no termino a tiempo")
+
+        error_output = self._error_output()
+        self._stderr.close()
+        if returncode != 0:
+            raise VideoEncoderError(f"ffmpeg fallo ({returncode}): {error_output}")
+
+    def abort(self) -> None:
+        """Detiene ffmpeg sin completar el fichero (tras un error)."""
+        if self._closed:
+            return
+        self._closed = True
+
+        self._process.kill()
+        self._process.wait()
+        try:
+            self._process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        self._stderr.close()
+
+    def _error_output(self) -> str:
+        """Ultimas lineas de stderr de ffmpeg."""
+        try:
+            self._stderr.seek(0)
+            return self._stderr.read().decode(errors="replace").strip()[-1000:]
+        except (OSError, ValueError):
+            return ""
+
+
+def build_ffmpeg_command(
+    ffmpeg_path: str,
+    output_path: str,
+    fps: float,
+    width: int,
+    height: int,
+    audio_source: Optional[str] = None,
+    codec: str = "libx264",
+    preset: Optional[str] = "veryfast",
+    crf: Optional[int] = 23,
+    threads: int = 0,
+    fragmented: bool = False,
+    live: bool = False,
+    output_args: Optional[List[str]] = None
+) -> List[str]:
+    """
+    Construye la linea de comandos de ffmpeg.
+
+    Args:
+        ffmpeg_path: Binario de ffmpeg
+        output_path: Fichero MP4 de salida
+        fps: Frames por segundo
+        width: Ancho de los frames
+        height: Alto de los frames
+        audio_source: Video del que copiar el audio (opcional)
+        codec: Codec de video
+        preset: Preset del codec (None = por defecto del codec)
+        crf: Calidad constante (None = por defecto del codec)
+        threads: Hilos de codificacion (0 = automatico)
+        fragmented: MP4 fragmentado (moov vacio al principio y un fragmento
+                    por keyframe) en lugar de faststart, que reescribe el
+                    fichero al terminar
+        live: Frames en directo que llegan a ritmo variable (hay descartes):
+              se marcan con la hora de llegada y la salida se rellena
+              hasta un ritmo constante de fps
+        output_args: Opciones de contenedor que sustituyen a -movflags (p. ej.
+                     -f hls ... o -f rtsp); output_path es entonces el destino
+
+    Returns:
+        Argumentos del comando
+    """
+    rate = str(Fraction(fps).limit_denominator(1001))
+    command = [
+        ffmpeg_path, "-hide_banner", "-loglevel", "error", "-nostdin", "-y",
+        "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}",
+    ]
+    if live:
+        # -r en la entrada ignoraria las marcas de tiempo: -framerate del demuxer
+        command += ["-framerate", rate, "-use_wallclock_as_timestamps", "1"]
+    else:
+        command += ["-r", rate]
+    command += ["-i", "pipe:0"]
+
+    if audio_source:
+        # '?' hace opcional la pista: videos sin audio no fallan
+        command += [
+            "-i", audio_source, "-map", "0:v:0", "-map", "1:a:0?", "-c:a", "copy", "-shortest"
+        ]
+
+    command += ["-c:v", codec]
+    if preset:
+        command += ["-preset", preset]
+    if crf is not None:
+        flag = next((f for family, f in _QUALITY_FLAGS.items() if family in codec), "-crf")
+        command += [flag, str(crf)]
+    if threads:
+        command += ["-threads", str(threads)]
+
+    # yuv420p exige dimensiones pares
+    if width % 2 or height % 2:
+        command += ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2"]
+
+    command += ["-pix_fmt", "yuv420p"]
+    if live:
+        command += ["-fps_mode", "cfr", "-r", rate]
+    if output_args is not None:
+        command += list(output_args)
+    else:
+        movflags = "+frag_keyframe+empty_moov+default_base_moof" if fragmented else "+faststart"
+        command += ["-movflags", movflags]
+    if codec in ("libx265", "hevc_nvenc", "hevc_qsv", "hevc_videotoolbox"):
+        # Etiqueta hvc1 para que el MP4 se reproduzca en navegadores y QuickTime
+        command += ["-tag:v", "hvc1"]
+
+    command.append(output_path)
+    return command
+
+
+def find_ffmpeg() -> Optional[str]:
+    """
+    Busca el binario de ffmpeg.
+
+    Returns:
+        settings.FFMPEG_PATH si esta definido, si no el ffmpeg del PATH (o None)
+    """
+    return settings.FFMPEG_PATH or shutil.which("ffmpeg")
+
+
+def create_video_encoder(
+    output_path: str,
+    fps: float,
+    width: int,
+    height: int,
+    audio_source: Optional[str] = None,
+    backend: Optional[str] = None,
+    fragmented: bool = False
+):
+    """
+    Crea el codificador de salida segun settings.VIDEO_ENCODER.
+
+    Con 'auto' se usa ffmpeg si esta disponible y cv2.VideoWriter si no (o si
+    ffmpeg no arranca).
+
+    Args:
+        output_path: Fichero MP4 de salida
+        fps: Frames por segundo
+        width: Ancho de los frames
+        height: Alto de los frames
+        audio_source: Video del que copiar el audio (solo ffmpeg)
+        backend: 'auto', 'ffmpeg' u 'opencv'. Si None, usa settings.VIDEO_ENCODER
+        fragmented: MP4 fragmentado (solo ffmpeg; cv2 lo ignora)
+
+    Returns:
+        FFmpegVideoEncoder u OpenCVVideoEncoder
+
+    Raises:
+        ValueError: Si el backend no es valido
+        VideoEncoderError: Si se pide 'ffmpeg' y no esta disponible
+    """
+    backend = backend or settings.VIDEO_ENCODER
+    if backend not in VIDEO_ENCODERS:
+        raise ValueError(f"Codificador de video invalido: {backend}")
+
+    fps = fps if fps and fps > 0 else 30.0
+
+    if backend in ("auto", "ffmpeg"):
+        try:
+            return FFmpegVideoEncoder(
+                output_path, fps, width, height, audio_source=audio_source, fragmented=fragmented
+            )
+        except VideoEncoderError as e:
+            if backend == "ffmpeg":
+                raise
+            logger.debug(f"{e}: se usara cv2.VideoWriter")
+
+    return OpenCVVideoEncoder(output_path, fps, width, height)
+
+
+def supports_fragmented(backend: Optional[str] = None) -> bool:
+    """Si create_video_encoder puede escribir MP4 fragmentado (necesita ffmpeg)."""
+    backend = backend or settings.VIDEO_ENCODER
+    return backend != "opencv" and find_ffmpeg() is not None
@@ -0,0 +1,384 @@
+"""
+Trabajos de video reanudables (checkpoints por segmentos).
+
+Un trabajo divide el video en segmentos de unos VIDEO_SEGMENT_SECONDS que
+empiezan en un keyframe y los procesa en orden. En el directorio del
+trabajo se guardan:
+
+- manifest.json: video de entrada (ruta, tamano y fecha de modificacion),
+  opciones, propiedades del video y estado de cada segmento. Se reescribe
+  de forma atomica al completar cada segmento.
+- seg_NNNNN.mp4: video anonimizado del segmento (sin audio).
+- seg_NNNNN.jsonl: detecciones por frame del segmento (coordenadas del
+  frame completo y confianza), volcadas a disco cada VIDEO_CHECKPOINT_FRAMES
+  frames.
+
+Si el proceso muere, al relanzar el trabajo con el mismo directorio se
+omiten los segmentos completos; en el segmento interrumpido, los frames
+con detecciones guardadas se anonimizan sin volver a pasar por el
+detector. Al terminar, los segmentos se concatenan sin recodificar (concat
+de ffmpeg) y se anade el audio del original.
+
+Si el video de entrada o las opciones cambian, el trabajo empieza de cero.
+"""
+
+import hashlib
+import json
+import math
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import logging
+
+import cv2
+
+from app.core.config import settings
+from app.services.video_encoder import OpenCVVideoEncoder, VideoEncoderError, find_ffmpeg
+
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+
+
+def plan_segments(
+    duration: float,
+    fps: float,
+    keyframes: List[float],
+    segment_seconds: float
+) -> List[Dict]:
+    """
+    Divide el video en segmentos.
+
+    Cada segmento (salvo el primero) empieza en el primer keyframe situado al
+    menos segment_seconds despues del inicio del anterior. Sin keyframes se
+    corta cada segment_seconds, redondeado al frame.
+
+    Args:
+        duration: Duracion del video en segundos
+        fps: Frames por segundo
+        keyframes: Instantes de los keyframes (list_keyframes)
+        segment_seconds: Duracion minima de cada segmento (<= 0 = un solo segmento)
+
+    Returns:
+        Lista de segmentos {'index', 'start', 'end'} (end None = hasta el final)
+    """
+    boundaries = []
+    if segment_seconds > 0 and duration > segment_seconds:
+        if keyframes:
+            last = 0.0
+            for time_s in keyframes:
+                if time_s - last >= segment_seconds and time_s < duration:
+                    boundaries.append(time_s)
+                    last = time_s
+        else:
+            fps = fps or 30.0
+            boundaries = [
+                math.floor(k * segment_seconds * fps + 0.5) / fps
+                for k in range(1, math.ceil(duration / segment_seconds))
+            ]
+
+    starts = [0.0] + boundaries
+    ends = boundaries + [None]
+    return [
+        {"index": index, "start": start, "end": end}
+        for index, (start, end) in enumerate(zip(starts, ends))
+    ]
+
+
+def input_fingerprint(video_path: str) -> Dict:
+    """Identifica el video de entrada (si cambia, el trabajo se descarta)."""
+    path = Path(video_path).resolve()
+    stat = path.stat()
+    return {"path": str(path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def default_job_dir(video_path: str) -> Path:
+    """
+    Directorio del trabajo por defecto: VIDEO_JOBS_DIR/<nombre>_<huella>.
+
+    La huella (ruta absoluta, tamano y fecha) distingue videos con el mismo
+    nombre en carpetas distintas; el nombre solo sirve para reconocerlo.
+    """
+    fingerprint = json.dumps(input_fingerprint(video_path), sort_keys=True)
+    digest = hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:16]
+    return settings.VIDEO_JOBS_DIR / f"{Path(video_path).stem}_{digest}"
+
+
+def _concat_entry(path: Path) -> str:
+    """Linea 'file' del demuxer concat (las comillas simples se escapan como '\\'')."""
+    quoted = str(Path(path).resolve()).replace("'", "'\\''")
+    return f"file '{quoted}'\n"
+
+
+def segment_paths(job_dir: Path, index: int) -> Tuple[Path, Path]:
+    """Rutas del video y de las detecciones de un segmento."""
+    job_dir = Path(job_dir)
+    return job_dir / f"seg_{index:05d}.mp4", job_dir / f"seg_{index:05d}.jsonl"
+
+
+def load_manifest(job_dir: Path) -> Optional[Dict]:
+    """Lee el manifest del trabajo (None si no existe o esta corrupto)."""
+    path = Path(job_dir) / MANIFEST_NAME
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def save_manifest(job_dir: Path, manifest: Dict) -> None:
+    """Escribe el manifest de forma atomica (temporal + fsync + rename)."""
+    path = Path(job_dir) / MANIFEST_NAME
+    tmp = path.with_name(f".{MANIFEST_NAME}.partial")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def open_job(
+    job_dir: Path,
+    video_path: str,
+    video_info: Dict,
+    options: Dict,
+    segments: List[Dict]
+) -> Dict:
+    """
+    Abre un trabajo existente o crea uno nuevo.
+
+    Un trabajo existente se reanuda si el video de entrada y las opciones
+    coinciden; si no, se borran sus ficheros y se empieza de cero.
+
+    Args:
+        job_dir: Directorio del trabajo
+        video_path: Video de entrada
+        video_info: Propiedades del video (get_video_info)
+        options: Opciones de procesamiento (deteccion y anonimizacion)
+        segments: Plan de segmentos (plan_segments), solo para trabajos nuevos
+
+    Returns:
+        Manifest del trabajo
+    """
+    job_dir = Path(job_dir)
+    job_dir.mkdir(parents=True, exist_ok=True)
+    fingerprint = input_fingerprint(video_path)
+
+    manifest = load_manifest(job_dir)
+    if manifest is not None:
+        if manifest["input"] == fingerprint and manifest["options"] == options:
+            done = sum(1 for segment in manifest["segments"] if segment["status"] == STATUS_DONE)
+            logger.info(
+                f"Reanudando trabajo {job_dir}: "
+                f"{done}/{len(manifest['segments'])} segmentos completos"
+            )
+            return manifest
+        logger.info(
+            f"El video o las opciones del trabajo {job_dir} han cambiado: se empieza de cero"
+        )
+
+    for path in job_dir.glob("seg_*"):
+        path.unlink()
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "input": fingerprint,
+        "options": options,
+        "video_info": video_info,
+        "segments": [
+            {
+                "index": segment["index"],
+                "start": segment["start"],
+                "end": segment["end"],
+                "status": STATUS_PENDING,
+            }
+            for segment in segments
+        ],
+    }
+    save_manifest(job_dir, manifest)
+    return manifest
+
+
+def load_detections(path: Path) -> Dict[int, Dict[str, List]]:
+    """
+    Lee las detecciones guardadas de un segmento.
+
+    Una ultima linea incompleta (el proceso murio mientras se escribia) se
+    ignora.
+
+    Returns:
+        Detecciones por numero de frame dentro del segmento (desde 1)
+    """
+    detections = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                detections[record["frame"]] = {
+                    "faces": [tuple(box) for box in record["faces"]],
+                    "plates": [tuple(box) for box in record["plates"]],
+                }
+    except FileNotFoundError:
+        pass
+    return detections
+
+
+class DetectionLog:
+    """
+    Escritor de las detecciones por frame de un segmento (JSON lines).
+
+    Reescribe las detecciones ya guardadas (descartando una linea final
+    incompleta) y va anadiendo las nuevas; los frames ya guardados no se
+    repiten. Cada `interval` frames vuelca el fichero a disco.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        existing: Dict[int, Dict[str, List]],
+        interval: Optional[int] = None
+    ):
+        self.interval = max(1, interval or settings.VIDEO_CHECKPOINT_FRAMES)
+        self._pending = 0
+        self._saved = set(existing)
+
+        # Las detecciones validas se reescriben aparte: un corte ahora no las pierde
+        path = Path(path)
+        tmp = path.with_name(f".{path.name}.partial")
+        self._file = open(tmp, "w", encoding="utf-8")
+        for frame_number in sorted(existing):
+            record = existing[frame_number]
+            self._write_record(frame_number, record["faces"], record["plates"])
+        self.flush()
+        self._file.close()
+        os.replace(tmp, path)
+
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, frame_number: int, faces: List, plates: List) -> None:
+        """Anade las detecciones (coordenadas del frame completo) de un frame."""
+        if frame_number in self._saved:
+            return
+        self._write_record(frame_number, faces, plates)
+        self._pending += 1
+        if self._pending >= self.interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """Vuelca a disco las detecciones escritas."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def _write_record(self, frame_number: int, faces: List, plates: List) -> None:
+        record = {
+            "frame": frame_number,
+            "faces": [_box_record(box) for box in faces],
+            "plates": [_box_record(box) for box in plates],
+        }
+        self._file.write(json.dumps(record) + "\n")
+
+
+def _box_record(box) -> List:
+    """Box en JSON: coordenadas enteras y confianza (si la hay) con 4 decimales."""
+    record = [int(v) for v in box[:4]]
+    if len(box) > 4:
+        record.append(round(float(box[4]), 4))
+    return record
+
+
+def stitch_segments(
+    segment_files: List[Path],
+    output_path: str,
+    job_dir: Path,
+    fps: float,
+    width: int,
+    height: int,
+    audio_source: Optional[str] = None
+) -> str:
+    """
+    Une los segmentos en el video final.
+
+    Con ffmpeg se usa el demuxer concat sin recodificar (-c copy) y se anade
+    la pista de audio del original; sin ffmpeg se releen los segmentos y se
+    recodifican con cv2.VideoWriter (sin audio).
+
+    Args:
+        segment_files: Videos de los segmentos, en orden
+        output_path: Video final
+        job_dir: Directorio del trabajo (para la lista de concat)
+        fps: Frames por segundo
+        width: Ancho de los frames
+        height: Alto de los frames
+        audio_source: Video del que copiar el audio (opcional)
+
+    Returns:
+        Backend usado ('ffmpeg' u 'opencv')
+
+    Raises:
+        VideoEncoderError: Si ffmpeg falla
+    """
+    ffmpeg_path = find_ffmpeg()
+
+    if ffmpeg_path is not None:
+        concat_list = Path(job_dir) / "concat.txt"
+        concat_list.write_text(
+            "".join(_concat_entry(path) for path in segment_files),
+            encoding="utf-8"
+        )
+
+        command = [
+            ffmpeg_path, "-hide_banner", "-loglevel", "error", "-nostdin", "-y",
+            "-f", "concat", "-safe", "0", "-i", str(concat_list),
+        ]
+        if audio_source and settings.VIDEO_COPY_AUDIO:
+            command += ["-i", audio_source, "-map", "0:v:0", "-map", "1:a:0?", "-shortest"]
+        command += ["-c", "copy", "-movflags", "+faststart", output_path]
+
+        result = subprocess.run(
+            command, capture_output=True, timeout=settings.VIDEO_ENCODER_TIMEOUT_S, check=False
+        )
+        if result.returncode != 0:
+            raise VideoEncoderError(
+                f"ffmpeg fallo al unir los segmentos ({result.returncode}): "
+                f"{result.stderr.decode(errors='replace').strip()[-1000:]}"
+            )
+        return "ffmpeg"
+
+    writer = OpenCVVideoEncoder(output_path, fps or 30.0, width, height)
+    try:
+        for path in segment_files:
+            cap = cv2.VideoCapture(str(path))
+            try:
+                while True:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    writer.write(frame)
+            finally:
+                cap.release()
+    finally:
+        writer.release()
+    return "opencv"
+
+
+def remove_job(job_dir: Path) -> None:
+    """Borra el directorio de un trabajo terminado."""
+    shutil.rmtree(job_dir, ignore_errors=True)
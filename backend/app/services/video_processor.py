@@ -6,21 +6,110 @@ Soporta streaming en tiempo real via WebSocket
 
 import cv2
 import numpy as np
-from typing import Dict, List, Optional, Callable
+from typing import BinaryIO, Dict, List, Optional, Callable, Union
 import logging
 from pathlib import Path
 import tempfile
 import os
+import time
 import base64
-
+import asyncio
+import threading
+
+from app.core.config import settings
+from app.core.metrics import (
+    VIDEO_FPS, VIDEO_FRAMES_TOTAL, VIDEO_GATE_DECISIONS_TOTAL, VIDEO_PREVIEWS_DROPPED_TOTAL,
+    VIDEO_QUEUE_DEPTH, VIDEO_STAGE_SECONDS, timed
+)
+from app.core.profiling import profile
 from app.models.unified_detector import UnifiedDetector
 from app.models.face_detector import FaceDetector
 from app.models.plate_detector import PlateDetector
 from app.services.anonymizer import Anonymizer
+from app.services.detection_track import DetectionTrack, TrackWriter
+from app.services.motion_gate import DECISION_REGIONS, DECISION_REUSE, MotionGate
+from app.services.video_encoder import create_video_encoder
+from app.services import video_jobs
+from app.services.video_reader import (
+    detect_size, frame_rate, list_keyframes, open_video_reader, probe_video
+)
+from app.utils.boxes import boxes_intersect, expand_box, merge_regions, scale_detections
 
 logger = logging.getLogger(__name__)
 
 
+class _ProgressMailbox:
+    """
+    Buzon de progreso entre el hilo de procesamiento y el WebSocket.
+
+    Guarda solo el ultimo mensaje: si el cliente va lento, los mensajes de
+    progreso se sustituyen por el mas reciente y los previews no enviados se
+    descartan, asi que la memoria no crece y el procesamiento no espera.
+    Un mensaje sin preview conserva el preview pendiente que sustituye.
+
+    VIDEO_QUEUE_DEPTH suma 1 mientras el buzon tiene un mensaje pendiente,
+    de modo que con varios WebSocket refleja el total de mensajes en espera.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._lock = threading.Lock()
+        self._pending: Optional[Dict] = None
+        self._closed = False
+        self._ready = asyncio.Event()
+
+    def post(self, message: Dict) -> None:
+        """Deja un mensaje (desde cualquier hilo), sustituyendo al pendiente."""
+        with self._lock:
+            if self._closed:
+                return
+            pending = self._pending
+            if pending is None:
+                VIDEO_QUEUE_DEPTH.inc()
+            elif 'current_frame' in pending:
+                if 'current_frame' in message:
+                    VIDEO_PREVIEWS_DROPPED_TOTAL.inc()
+                else:
+                    message['current_frame'] = pending['current_frame']
+            self._pending = message
+        self._loop.call_soon_threadsafe(self._ready.set)
+
+    def close(self) -> None:
+        """Termina send_all despues de enviar el mensaje pendiente."""
+        with self._lock:
+            self._closed = True
+        self._loop.call_soon_threadsafe(self._ready.set)
+
+    def take(self) -> Optional[Dict]:
+        """Saca el mensaje pendiente (o None)."""
+        with self._lock:
+            message, self._pending = self._pending, None
+            if message is not None:
+                VIDEO_QUEUE_DEPTH.dec()
+        return message
+
+    async def send_all(self, websocket) -> None:
+        """Envia los mensajes por el WebSocket hasta que se cierre el buzon."""
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            with self._lock:
+                closed = self._closed
+            message = self.take()
+            if message is not None:
+                try:
+                    await websocket.send_json(message)
+                except Exception as e:
+                    logger.warning(f"Error enviando progreso: {e}")
+                    # El cliente ya no recibe: descartar lo que siga llegando
+                    with self._lock:
+                        self._closed = True
+                    self.take()
+                    return
+            if closed:
+                return
+
+
 class VideoProcessor:
     """
     Procesa videos frame por frame aplicando detección y anonimización
@@ -41,37 +130,36 @@ class VideoProcessor:
 
         self.anonymizer = Anonymizer()
 
-    def get_video_info(self, video_path: str) -> Dict:
+    @staticmethod
+    def get_video_info(video_path: Union[str, BinaryIO]) -> Dict:
         """
         Obtiene información del video
 
+        El resultado se puede pasar a process_video (video_info) para no
+        volver a abrir el fichero. No usa los detectores: se puede llamar
+        sobre la clase (VideoProcessor.get_video_info) sin cargar modelos.
+
         Args:
-            video_path: Ruta al archivo de video
+            video_path: Ruta o URL del video, o fichero abierto (solo con PyAV)
 
         Returns:
-            Dict con información del video (fps, frames, dimensiones, duración)
+            Dict con información del video (fps, frames, dimensiones, duración,
+            codec, audio y fps exactos en frame_rate)
         """
         try:
-            cap = cv2.VideoCapture(video_path)
-
-            if not cap.isOpened():
-                raise ValueError(f"No se pudo abrir el video: {video_path}")
-
-            fps = int(cap.get(cv2.CAP_PROP_FPS))
-            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            duration_seconds = frame_count / fps if fps > 0 else 0
-
-            cap.release()
+            probe = probe_video(video_path)
 
             info = {
-                'fps': fps,
-                'frame_count': frame_count,
-                'width': width,
-                'height': height,
-                'duration_seconds': round(duration_seconds, 2),
-                'duration_formatted': self._format_duration(duration_seconds)
+                'fps': int(probe['fps']),
+                'frame_rate': probe['fps'],
+                'frame_count': probe['frame_count'],
+                'width': probe['width'],
+                'height': probe['height'],
+                'duration_seconds': round(probe['duration_seconds'], 2),
+                'duration_formatted': VideoProcessor._format_duration(probe['duration_seconds']),
+                'codec': probe['codec'],
+                'has_audio': probe['has_audio'],
+                'rotation': probe['rotation']
             }
 
             logger.info(f"Video info: {info}")
@@ -81,7 +169,8 @@ class VideoProcessor:
             logger.error(f"Error obteniendo información del video: {e}")
             raise
 
-    def _format_duration(self, seconds: float) -> str:
+    @staticmethod
+    def _format_duration(seconds: float) -> str:
         """Formatea duración en HH:MM:SS"""
         hours = int(seconds // 3600)
         minutes = int((seconds % 3600) // 60)
@@ -101,7 +190,11 @@ class VideoProcessor:
         anonymization_method: str = "blur",
         blur_kernel_size: int = 51,
         pixelate_blocks: int = 10,
-        callback: Optional[Callable[[int, int, Dict], None]] = None
+        callback: Optional[Callable[[int, int, Dict], None]] = None,
+        video_info: Optional[Dict] = None,
+        track_path: Optional[str] = None,
+        fragmented: Optional[bool] = None,
+        preview_fps: Optional[float] = None
     ) -> Dict:
         """
         Procesa un video completo frame por frame
@@ -115,6 +208,13 @@ class VideoProcessor:
             blur_kernel_size: Tamaño kernel para blur
             pixelate_blocks: Número de bloques para pixelate
             callback: Función callback para progreso (frame_actual, total_frames, stats)
+            video_info: Resultado de get_video_info (si None, se lee del fichero)
+            track_path: Si se indica, guarda la pista de detecciones (.npz) para
+                        volver a anonimizar con render_video sin detectar
+            fragmented: Escribir MP4 fragmentado, descargable mientras se
+                        procesa. Si None, usa settings.VIDEO_FRAGMENTED_MP4
+            preview_fps: Previews JPEG por segundo que recibe el callback
+                         (0 = ninguno). Si None, usa settings.VIDEO_PREVIEW_FPS
 
         Returns:
             Dict con estadísticas del procesamiento
@@ -123,125 +223,797 @@ class VideoProcessor:
         logger.info(f"Método anonimización: {anonymization_method}")
 
         try:
-            # Abrir video de entrada
-            cap = cv2.VideoCapture(video_path)
-
-            if not cap.isOpened():
-                raise ValueError(f"No se pudo abrir el video: {video_path}")
-
-            # Obtener propiedades del video
-            fps = int(cap.get(cv2.CAP_PROP_FPS))
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-            # Configurar video de salida
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-
-            # Estadísticas
-            stats = {
-                'total_faces': 0,
-                'total_plates': 0,
-                'frames_processed': 0,
-                'frames_with_detections': 0
-            }
+            # Propiedades del video (una sola lectura, compartida con get_video_info)
+            video_info = video_info or self.get_video_info(video_path)
+            fps = video_info['fps']
+            width = video_info['width']
+            height = video_info['height']
+            total_frames = video_info['frame_count']
+
+            # Abrir video de entrada (con copia reducida para el detector si procede)
+            reader = open_video_reader(
+                video_path, info=video_info, detect_max_side=self._detect_max_side()
+            )
 
-            frame_number = 0
+            # Configurar video de salida (ffmpeg con el audio original, o cv2.VideoWriter)
+            out = create_video_encoder(
+                output_path, frame_rate(video_info), width, height, audio_source=video_path,
+                fragmented=settings.VIDEO_FRAGMENTED_MP4 if fragmented is None else fragmented
+            )
+            logger.debug(f"Lector de video: {reader.backend}, codificador: {out.backend}")
 
-            # Procesar frame por frame
-            while True:
-                ret, frame = cap.read()
+            stats = self._new_stats()
+            start_time = time.perf_counter()
 
-                if not ret:
-                    break
+            track = None
+            if track_path:
+                track = TrackWriter(
+                    width, height, frame_rate(video_info), detect_faces, detect_plates,
+                    detector=self.detector_signature()
+                )
 
-                frame_number += 1
+            self._process_frames(
+                reader, out, stats,
+                detect_faces=detect_faces,
+                detect_plates=detect_plates,
+                anonymization_method=anonymization_method,
+                blur_kernel_size=blur_kernel_size,
+                pixelate_blocks=pixelate_blocks,
+                callback=callback,
+                total_frames=total_frames,
+                on_frame=(
+                    (lambda number, faces, plates: track.add(number - 1, faces, plates))
+                    if track else None
+                ),
+                preview_fps=preview_fps
+            )
 
-                # Detectar objetos en el frame
-                detections = self._detect_in_frame(frame, detect_faces, detect_plates)
+            # Cerrar archivos (con ffmpeg, espera a que termine la codificacion)
+            reader.release()
+            with timed(VIDEO_STAGE_SECONDS, stage="finalize"):
+                out.release()
+            if track is not None:
+                track.save(track_path)
 
-                faces = detections['faces']
-                plates = detections['plates']
+            elapsed = time.perf_counter() - start_time
+            if elapsed > 0 and stats['frames_processed']:
+                VIDEO_FPS.set(stats['frames_processed'] / elapsed)
 
-                # Actualizar estadísticas
-                stats['total_faces'] += len(faces)
-                stats['total_plates'] += len(plates)
-                stats['frames_processed'] += 1
+            logger.info(f"Video procesado correctamente: {output_path}")
+            logger.info(f"Estadísticas: {stats}")
 
-                if len(faces) > 0 or len(plates) > 0:
-                    stats['frames_with_detections'] += 1
+            return {
+                'success': True,
+                'output_path': output_path,
+                'stats': stats,
+                'video_info': {
+                    'fps': fps,
+                    'width': width,
+                    'height': height,
+                    'total_frames': total_frames,
+                    'reader': reader.backend,
+                    'encoder': out.backend
+                }
+            }
 
-                # Anonimizar frame
-                if faces or plates:
-                    # Combinar todas las detecciones en una sola lista
-                    all_boxes = faces + plates
+        except Exception as e:
+            logger.error(f"Error procesando video: {e}", exc_info=True)
+            if 'out' in locals():
+                out.abort()
+            raise
 
-                    # Preparar kwargs según el método
-                    kwargs = {}
-                    if anonymization_method == 'blur':
-                        kwargs['kernel_size'] = blur_kernel_size
-                    elif anonymization_method == 'pixelate':
-                        kwargs['blocks'] = pixelate_blocks
+        finally:
+            if 'reader' in locals():
+                reader.release()
 
-                    frame = self.anonymizer.anonymize(
-                        frame,
-                        all_boxes,
-                        method=anonymization_method,
-                        **kwargs
+    def process_video_resumable(
+        self,
+        video_path: str,
+        output_path: str,
+        job_dir: Optional[str] = None,
+        detect_faces: bool = True,
+        detect_plates: bool = True,
+        anonymization_method: str = "blur",
+        blur_kernel_size: int = 51,
+        pixelate_blocks: int = 10,
+        callback: Optional[Callable[[int, int, Dict], None]] = None,
+        video_info: Optional[Dict] = None,
+        segment_seconds: Optional[float] = None,
+        keep_job: bool = False,
+        track_path: Optional[str] = None
+    ) -> Dict:
+        """
+        Procesa un video por segmentos con checkpoints (reanudable).
+
+        Si el proceso muere, volver a llamar con el mismo job_dir continua
+        desde el ultimo segmento completo (ver app.services.video_jobs).
+
+        Args:
+            video_path: Ruta al video de entrada
+            output_path: Ruta para guardar video procesado
+            job_dir: Directorio del trabajo. Si None, VIDEO_JOBS_DIR/<nombre del video>
+            detect_faces: Si detectar rostros
+            detect_plates: Si detectar matrículas
+            anonymization_method: Método de anonimización (blur, pixelate, mask)
+            blur_kernel_size: Tamaño kernel para blur
+            pixelate_blocks: Número de bloques para pixelate
+            callback: Función callback para progreso (frame_actual, total_frames, stats)
+            video_info: Resultado de get_video_info (si None, se lee del fichero)
+            segment_seconds: Duracion de los segmentos. Si None, usa settings.VIDEO_SEGMENT_SECONDS
+            keep_job: Conservar el directorio del trabajo al terminar
+            track_path: Si se indica, guarda la pista de detecciones (.npz),
+                        construida a partir de las detecciones de los segmentos
+
+        Returns:
+            Dict con estadísticas del procesamiento (como process_video, mas
+            'segments' y 'segments_resumed')
+        """
+        job_dir = Path(job_dir) if job_dir else video_jobs.default_job_dir(video_path)
+        if segment_seconds is None:
+            segment_seconds = settings.VIDEO_SEGMENT_SECONDS
+        logger.info(
+            f"Iniciando procesamiento reanudable de video: {video_path} (trabajo {job_dir})"
+        )
+
+        video_info = video_info or self.get_video_info(video_path)
+        width = video_info['width']
+        height = video_info['height']
+        total_frames = video_info['frame_count']
+        fps = frame_rate(video_info)
+
+        options = {
+            'detect_faces': detect_faces,
+            'detect_plates': detect_plates,
+            'anonymization_method': anonymization_method,
+            'blur_kernel_size': blur_kernel_size,
+            'pixelate_blocks': pixelate_blocks
+        }
+
+        manifest = video_jobs.load_manifest(job_dir)
+        if manifest is None or manifest['input'] != video_jobs.input_fingerprint(video_path):
+            # Solo se buscan keyframes para trabajos nuevos
+            segments = video_jobs.plan_segments(
+                video_info['duration_seconds'], fps, list_keyframes(video_path), segment_seconds
+            )
+        else:
+            segments = manifest['segments']
+        manifest = video_jobs.open_job(job_dir, video_path, video_info, options, segments)
+
+        stats = self._new_stats()
+        resumed = 0
+        processed = 0
+        frame_offset = 0
+        reader_backend = encoder_backend = None
+        start_time = time.perf_counter()
+
+        for segment in manifest['segments']:
+            segment_file, detections_file = video_jobs.segment_paths(job_dir, segment['index'])
+
+            if segment['status'] == video_jobs.STATUS_DONE:
+                resumed += 1
+                for key, value in segment['stats'].items():
+                    stats[key] += value
+                frame_offset += segment['stats']['frames_processed']
+                continue
+
+            known = video_jobs.load_detections(detections_file)
+            if known:
+                logger.info(
+                    f"Segmento {segment['index']}: {len(known)} frames con detecciones guardadas"
+                )
+
+            segment_stats = self._new_stats()
+            partial = segment_file.with_name(f"{segment_file.stem}.partial{segment_file.suffix}")
+            reader = open_video_reader(
+                video_path, info=video_info, start_time=segment['start'], end_time=segment['end'],
+                detect_max_side=self._detect_max_side()
+            )
+            log = video_jobs.DetectionLog(detections_file, known)
+            try:
+                # Sin audio: se anade al unir los segmentos
+                out = create_video_encoder(str(partial), fps, width, height)
+                try:
+                    self._process_frames(
+                        reader, out, segment_stats,
+                        callback=callback,
+                        frame_offset=frame_offset,
+                        total_frames=total_frames,
+                        lookup=known.get,
+                        on_frame=log.write,
+                        **options
                     )
+                    with timed(VIDEO_STAGE_SECONDS, stage="finalize"):
+                        if segment_stats['frames_processed']:
+                            out.release()
+                        else:
+                            out.abort()
+                except Exception:
+                    out.abort()
+                    raise
+            finally:
+                log.close()
+                reader.release()
+
+            if segment_stats['frames_processed']:
+                os.replace(partial, segment_file)
+            elif partial.exists():
+                partial.unlink()
+
+            reader_backend, encoder_backend = reader.backend, out.backend
+            segment['stats'] = segment_stats
+            segment['status'] = video_jobs.STATUS_DONE
+            video_jobs.save_manifest(job_dir, manifest)
+
+            for key, value in segment_stats.items():
+                stats[key] += value
+            processed += segment_stats['frames_processed']
+            frame_offset += segment_stats['frames_processed']
+
+        # Unir los segmentos (los vacios no tienen fichero)
+        segment_files = [
+            video_jobs.segment_paths(job_dir, segment['index'])[0]
+            for segment in manifest['segments']
+            if segment['stats']['frames_processed']
+        ]
+        with timed(VIDEO_STAGE_SECONDS, stage="finalize"):
+            stitch_backend = video_jobs.stitch_segments(
+                segment_files, output_path, job_dir, fps, width, height, audio_source=video_path
+            )
 
-                # Escribir frame procesado
-                out.write(frame)
+        if track_path:
+            self._save_job_track(
+                job_dir, manifest, track_path, video_info, detect_faces, detect_plates
+            )
 
-                # Callback de progreso (enviar frame cada 3 frames para no saturar el WebSocket)
-                if callback:
-                    # Codificar frame si es cada 3 frames
-                    frame_base64 = None
-                    if frame_number % 3 == 0:
-                        # Codificar frame procesado a JPEG
-                        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-                        frame_base64 = buffer.tobytes()
-
-                    callback(frame_number, total_frames, {
-                        'faces_in_frame': len(faces),
-                        'plates_in_frame': len(plates),
-                        'frame_data': frame_base64
-                    })
-
-                # Log cada 10% de progreso
-                if frame_number % max(1, total_frames // 10) == 0:
-                    progress = (frame_number / total_frames) * 100
-                    logger.info(f"Progreso: {progress:.1f}% ({frame_number}/{total_frames})")
-
-            # Cerrar archivos
-            cap.release()
-            out.release()
+        elapsed = time.perf_counter() - start_time
+        if elapsed > 0 and processed:
+            VIDEO_FPS.set(processed / elapsed)
+
+        if not keep_job:
+            video_jobs.remove_job(job_dir)
+
+        logger.info(
+            f"Video procesado correctamente: {output_path} ({resumed} segmentos reanudados)"
+        )
+        logger.info(f"Estadísticas: {stats}")
+
+        return {
+            'success': True,
+            'output_path': output_path,
+            'stats': stats,
+            'segments': len(manifest['segments']),
+            'segments_resumed': resumed,
+            'video_info': {
+                'fps': video_info['fps'],
+                'width': width,
+                'height': height,
+                'total_frames': total_frames,
+                'reader': reader_backend,
+                'encoder': encoder_backend,
+                'stitch': stitch_backend
+            }
+        }
 
-            logger.info(f"Video procesado correctamente: {output_path}")
-            logger.info(f"Estadísticas: {stats}")
+    def render_video(
+        self,
+        video_path: str,
+        output_path: str,
+        track_path: str,
+        detect_faces: bool = True,
+        detect_plates: bool = True,
+        anonymization_method: str = "blur",
+        blur_kernel_size: int = 51,
+        pixelate_blocks: int = 10,
+        callback: Optional[Callable[[int, int, Dict], None]] = None,
+        video_info: Optional[Dict] = None,
+        fragmented: Optional[bool] = None
+    ) -> Dict:
+        """
+        Vuelve a anonimizar un video a partir de su pista de detecciones.
+
+        No se ejecuta el detector: el coste es decodificar, anonimizar y
+        codificar. Permite cambiar el método, sus parámetros o las clases
+        (dentro de las que contiene la pista).
+
+        Args:
+            video_path: Ruta al video de entrada (el mismo de la pista)
+            output_path: Ruta para guardar video procesado
+            track_path: Pista de detecciones (process_video con track_path)
+            detect_faces: Si anonimizar rostros
+            detect_plates: Si anonimizar matrículas
+            anonymization_method: Método de anonimización (blur, pixelate, mask)
+            blur_kernel_size: Tamaño kernel para blur
+            pixelate_blocks: Número de bloques para pixelate
+            callback: Función callback para progreso (frame_actual, total_frames, stats)
+            video_info: Resultado de get_video_info (si None, se lee del fichero)
+            fragmented: MP4 fragmentado. Si None, usa settings.VIDEO_FRAGMENTED_MP4
+
+        Returns:
+            Dict con estadísticas del procesamiento
+
+        Raises:
+            ValueError: Si la pista no corresponde al video o no contiene las clases pedidas
+        """
+        logger.info(f"Re-render de video desde pista: {video_path} ({track_path})")
+
+        video_info = video_info or self.get_video_info(video_path)
+        width = video_info['width']
+        height = video_info['height']
+        total_frames = video_info['frame_count']
+
+        track = DetectionTrack.load(track_path)
+        if (track.width, track.height) != (width, height):
+            raise ValueError(
+                f"La pista es de un video de {track.width}x{track.height}, no de {width}x{height}"
+            )
+        if not track.covers(detect_faces, detect_plates):
+            raise ValueError("La pista no contiene las clases pedidas")
+
+        try:
+            # Sin copia reducida: no hay detector
+            reader = open_video_reader(video_path, info=video_info, detect_max_side=0)
+            out = create_video_encoder(
+                output_path, frame_rate(video_info), width, height, audio_source=video_path,
+                fragmented=settings.VIDEO_FRAGMENTED_MP4 if fragmented is None else fragmented
+            )
+
+            stats = self._new_stats()
+            start_time = time.perf_counter()
+
+            self._process_frames(
+                reader, out, stats,
+                detect_faces=detect_faces,
+                detect_plates=detect_plates,
+                anonymization_method=anonymization_method,
+                blur_kernel_size=blur_kernel_size,
+                pixelate_blocks=pixelate_blocks,
+                callback=callback,
+                total_frames=total_frames,
+                lookup=lambda number: track.detections(number - 1, detect_faces, detect_plates)
+            )
+
+            reader.release()
+            with timed(VIDEO_STAGE_SECONDS, stage="finalize"):
+                out.release()
+
+            elapsed = time.perf_counter() - start_time
+            if elapsed > 0 and stats['frames_processed']:
+                VIDEO_FPS.set(stats['frames_processed'] / elapsed)
+
+            if stats['frames_processed'] != track.frame_count:
+                logger.warning(
+                    f"La pista tiene {track.frame_count} frames "
+                    f"y el video {stats['frames_processed']}"
+                )
+
+            logger.info(f"Video re-renderizado correctamente: {output_path}")
 
             return {
                 'success': True,
                 'output_path': output_path,
                 'stats': stats,
                 'video_info': {
-                    'fps': fps,
+                    'fps': video_info['fps'],
                     'width': width,
                     'height': height,
-                    'total_frames': total_frames
+                    'total_frames': total_frames,
+                    'reader': reader.backend,
+                    'encoder': out.backend
                 }
             }
 
         except Exception as e:
-            logger.error(f"Error procesando video: {e}", exc_info=True)
+            logger.error(f"Error re-renderizando video: {e}", exc_info=True)
+            if 'out' in locals():
+                out.abort()
             raise
 
         finally:
-            if 'cap' in locals():
-                cap.release()
-            if 'out' in locals():
-                out.release()
+            if 'reader' in locals():
+                reader.release()
+
+    def track_matches(
+        self,
+        track_path: str,
+        detect_faces: bool = True,
+        detect_plates: bool = True
+    ) -> bool:
+        """
+        Si existe una pista reutilizable para las clases pedidas con el detector actual.
+
+        Args:
+            track_path: Ruta de la pista
+            detect_faces: Si se piden rostros
+            detect_plates: Si se piden matrículas
+
+        Returns:
+            True si render_video puede usar la pista
+        """
+        if not os.path.exists(track_path):
+            return False
+        try:
+            track = DetectionTrack.load(track_path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Pista de detecciones ilegible {track_path}: {e}")
+            return False
+        return track.covers(detect_faces, detect_plates, detector=self.detector_signature())
+
+    def detector_signature(self) -> str:
+        """
+        Identifica el detector y sus parametros (modelo, confianza, tamano).
+
+        Se guarda en las pistas de detecciones: una pista solo se reutiliza
+        automaticamente si el detector no ha cambiado.
+        """
+        if self.unified_detector is not None:
+            detectors = [self.unified_detector]
+        else:
+            detectors = [self.face_detector, self.plate_detector]
+        parts = [
+            f"{Path(str(d.model_path)).name}:{d.confidence}:{d.inference['imgsz']}"
+            for d in detectors
+        ]
+        return ";".join(parts) + f";detect_max_side={self._detect_max_side()}"
+
+    def _save_job_track(
+        self,
+        job_dir: Path,
+        manifest: Dict,
+        track_path: str,
+        video_info: Dict,
+        detect_faces: bool,
+        detect_plates: bool
+    ) -> None:
+        """Construye la pista de detecciones a partir de los segmentos de un trabajo."""
+        track = TrackWriter(
+            video_info['width'], video_info['height'], frame_rate(video_info),
+            detect_faces, detect_plates, detector=self.detector_signature()
+        )
+        frame_offset = 0
+        for segment in manifest['segments']:
+            _, detections_file = video_jobs.segment_paths(job_dir, segment['index'])
+            for number, detections in video_jobs.load_detections(detections_file).items():
+                track.add(frame_offset + number - 1, detections['faces'], detections['plates'])
+            frame_offset += segment['stats']['frames_processed']
+        track.frame_count = max(track.frame_count, frame_offset)
+        track.save(track_path)
+
+    @staticmethod
+    def _new_stats() -> Dict[str, int]:
+        """Contadores de un procesamiento."""
+        return {
+            'total_faces': 0,
+            'total_plates': 0,
+            'frames_processed': 0,
+            'frames_with_detections': 0,
+            'frames_detected': 0,
+            'frames_region_detected': 0,
+            'frames_skipped': 0
+        }
+
+    def _process_frames(
+        self,
+        reader,
+        out,
+        stats: Dict[str, int],
+        detect_faces: bool,
+        detect_plates: bool,
+        anonymization_method: str,
+        blur_kernel_size: int,
+        pixelate_blocks: int,
+        callback: Optional[Callable[[int, int, Dict], None]] = None,
+        frame_offset: int = 0,
+        total_frames: int = 0,
+        lookup: Optional[Callable[[int], Optional[Dict[str, List]]]] = None,
+        on_frame: Optional[Callable[[int, List, List], None]] = None,
+        preview_fps: Optional[float] = None
+    ) -> None:
+        """
+        Lee, detecta, anonimiza y escribe frames hasta agotar el lector.
+
+        Args:
+            reader: Lector (open_video_reader)
+            out: Codificador (create_video_encoder)
+            stats: Contadores a actualizar
+            detect_faces: Si detectar rostros
+            detect_plates: Si detectar matrículas
+            anonymization_method: Método de anonimización
+            blur_kernel_size: Tamaño kernel para blur
+            pixelate_blocks: Número de bloques para pixelate
+            callback: Función callback para progreso
+            frame_offset: Frames anteriores al lector (para el progreso)
+            total_frames: Frames totales del video (para el progreso)
+            lookup: Devuelve las detecciones ya calculadas de un numero de frame
+                    del lector (desde 1, coordenadas del frame completo) o None
+                    si hay que detectar
+            on_frame: Se llama con (numero de frame del lector, faces, plates)
+            preview_fps: Previews JPEG por segundo para el callback (0 = ninguno).
+                         Si None, usa settings.VIDEO_PREVIEW_FPS
+        """
+        width = reader.info['width']
+        height = reader.info['height']
+
+        # Previews limitados por tiempo (no por frames): mismo ritmo en cualquier hardware
+        preview_fps = settings.VIDEO_PREVIEW_FPS if preview_fps is None else preview_fps
+        preview_interval = 1.0 / preview_fps if callback and preview_fps > 0 else None
+        next_preview = 0.0
+
+        # Filtro de movimiento: reutiliza las boxes en frames casi identicos
+        gate = MotionGate() if settings.VIDEO_MOTION_GATE else None
+        previous = {'faces': [], 'plates': []}
+
+        local_number = 0
+
+        # Procesar frame por frame
+        while True:
+            with timed(VIDEO_STAGE_SECONDS, stage="read"):
+                frames = reader.read()
+
+            if frames is None:
+                break
+
+            frame, detect_frame = frames
+            local_number += 1
+            frame_number = frame_offset + local_number
+
+            stored = lookup(local_number) if lookup is not None else None
+            if stored is not None:
+                # Detecciones ya calculadas (checkpoint o pista): no se vuelve a detectar
+                faces = stored['faces']
+                plates = stored['plates']
+                small_boxes = []
+                if detect_frame is not None:
+                    small_width, small_height = detect_frame.shape[1], detect_frame.shape[0]
+                    small_boxes = scale_detections(
+                        faces + plates, small_width / width, small_height / height,
+                        size=(small_width, small_height)
+                    )
+            else:
+                # Detectar objetos en la copia reducida (o en el frame completo)
+                source = detect_frame if detect_frame is not None else frame
+                decision, regions = gate.check(source) if gate is not None else ("detect", [])
+                VIDEO_GATE_DECISIONS_TOTAL.inc(decision=decision)
+
+                if decision == DECISION_REUSE:
+                    detections = previous
+                    stats['frames_skipped'] += 1
+                else:
+                    with timed(VIDEO_STAGE_SECONDS, stage="inference"):
+                        if decision == DECISION_REGIONS:
+                            detections = self._detect_in_regions(
+                                source, regions, previous, detect_faces, detect_plates
+                            )
+                            stats['frames_region_detected'] += 1
+                        else:
+                            detections = self._detect_in_frame(source, detect_faces, detect_plates)
+                            stats['frames_detected'] += 1
+                previous = detections
+
+                faces = detections['faces']
+                plates = detections['plates']
+                small_boxes = faces + plates
+
+                # Boxes de la copia reducida -> coordenadas del frame completo
+                if detect_frame is not None:
+                    scale_x = width / detect_frame.shape[1]
+                    scale_y = height / detect_frame.shape[0]
+                    faces = scale_detections(faces, scale_x, scale_y, (width, height))
+                    plates = scale_detections(plates, scale_x, scale_y, (width, height))
+
+            if on_frame is not None:
+                on_frame(local_number, faces, plates)
+
+            # Actualizar estadísticas
+            stats['total_faces'] += len(faces)
+            stats['total_plates'] += len(plates)
+            stats['frames_processed'] += 1
+
+            if len(faces) > 0 or len(plates) > 0:
+                stats['frames_with_detections'] += 1
+
+            # Anonimizar frame
+            if faces or plates:
+                # Combinar todas las detecciones en una sola lista (sin la confianza)
+                all_boxes = [box[:4] for box in faces + plates]
+
+                # Preparar kwargs según el método
+                kwargs = {}
+                if anonymization_method == 'blur':
+                    kwargs['kernel_size'] = blur_kernel_size
+                elif anonymization_method == 'pixelate':
+                    kwargs['blocks'] = pixelate_blocks
+
+                with timed(VIDEO_STAGE_SECONDS, stage="anonymize"):
+                    frame = self.anonymizer.anonymize(
+                        frame,
+                        all_boxes,
+                        method=anonymization_method,
+                        **kwargs
+                    )
+
+            # Escribir frame procesado
+            with timed(VIDEO_STAGE_SECONDS, stage="write"):
+                out.write(frame)
+            VIDEO_FRAMES_TOTAL.inc()
+
+            # Callback de progreso (con un preview como mucho cada preview_interval)
+            if callback:
+                preview_jpeg = None
+                if preview_interval is not None and time.perf_counter() >= next_preview:
+                    next_preview = time.perf_counter() + preview_interval
+                    preview_jpeg = self._encode_preview(
+                        frame, detect_frame, small_boxes, anonymization_method,
+                        blur_kernel_size, pixelate_blocks
+                    )
+
+                callback(frame_number, total_frames, {
+                    'faces_in_frame': len(faces),
+                    'plates_in_frame': len(plates),
+                    'frame_data': preview_jpeg
+                })
+
+            # Log cada 10% de progreso
+            if total_frames and frame_number % max(1, total_frames // 10) == 0:
+                progress = (frame_number / total_frames) * 100
+                logger.info(f"Progreso: {progress:.1f}% ({frame_number}/{total_frames})")
+
+    def _detect_in_regions(
+        self,
+        frame: np.ndarray,
+        regions: List,
+        previous: Dict[str, List],
+        detect_faces: bool,
+        detect_plates: bool
+    ) -> Dict[str, List]:
+        """
+        Detecta solo en las regiones que han cambiado desde la ultima deteccion.
+
+        Las boxes anteriores fuera de las regiones se conservan; las que las
+        tocan se incluyen en la region (el objeto puede haberse movido) y se
+        sustituyen por lo que se detecte en ella.
+
+        Args:
+            frame: Frame a procesar
+            regions: Regiones cambiadas (x1, y1, x2, y2) en coordenadas del frame
+            previous: Detecciones del frame anterior
+            detect_faces: Si detectar rostros
+            detect_plates: Si detectar matrículas
+
+        Returns:
+            Dict con listas de bounding boxes para faces y plates
+        """
+        height, width = frame.shape[:2]
+        old_boxes = previous['faces'] + previous['plates']
+
+        # Ampliar las regiones con un margen y con las boxes anteriores que tocan,
+        # hasta que cada box quede entera dentro de una region o fuera de todas
+        regions = merge_regions([
+            expand_box(region, settings.VIDEO_MOTION_REGION_MARGIN, width, height, min_size=32)
+            for region in regions
+        ])
+        while True:
+            grown = []
+            for region in regions:
+                for box in old_boxes:
+                    if boxes_intersect(region, box):
+                        region = (
+                            min(region[0], box[0]), min(region[1], box[1]),
+                            max(region[2], box[2]), max(region[3], box[3])
+                        )
+                grown.append(region)
+            grown = merge_regions(grown)
+            if grown == regions:
+                break
+            regions = grown
+
+        detections = {
+            key: [
+                box for box in boxes
+                if not any(boxes_intersect(box, region) for region in regions)
+            ]
+            for key, boxes in previous.items()
+        }
+
+        for x1, y1, x2, y2 in regions:
+            found = self._detect_in_frame(frame[y1:y2, x1:x2], detect_faces, detect_plates)
+            for key, boxes in found.items():
+                detections[key].extend(
+                    (bx1 + x1, by1 + y1, bx2 + x1, by2 + y1, *rest)
+                    for bx1, by1, bx2, by2, *rest in boxes
+                )
+
+        return detections
+
+    def _detect_max_side(self) -> int:
+        """
+        Lado mayor de la copia reducida que recibe el detector.
+
+        VIDEO_DETECT_MAX_SIDE si esta definido; si no, con VIDEO_DUAL_RESOLUTION
+        el tamano de entrada del detector (YOLO reduciria el frame a ese tamano
+        de todos modos). 0 = detectar sobre el frame completo.
+        """
+        if settings.VIDEO_DETECT_MAX_SIDE:
+            return settings.VIDEO_DETECT_MAX_SIDE
+        if not settings.VIDEO_DUAL_RESOLUTION:
+            return 0
+        if self.unified_detector is not None:
+            return self.unified_detector.inference["imgsz"]
+        return max(self.face_detector.inference["imgsz"], self.plate_detector.inference["imgsz"])
+
+    def _anonymize_preview(
+        self,
+        small_frame: np.ndarray,
+        boxes: List,
+        anonymization_method: str,
+        blur_kernel_size: float,
+        pixelate_blocks: int
+    ) -> np.ndarray:
+        """
+        Anonimiza la copia reducida para el preview (mismo aspecto que la salida).
+
+        Args:
+            small_frame: Copia reducida del frame
+            boxes: Boxes en coordenadas de la copia
+            anonymization_method: Método de anonimización
+            blur_kernel_size: Kernel de blur ya escalado a la copia
+            pixelate_blocks: Número de bloques (relativo a la box, no se escala)
+
+        Returns:
+            Copia anonimizada
+        """
+        if not boxes:
+            return small_frame
+
+        kwargs = {}
+        if anonymization_method == 'blur':
+            kwargs['kernel_size'] = max(3, int(blur_kernel_size) | 1)
+        elif anonymization_method == 'pixelate':
+            kwargs['blocks'] = pixelate_blocks
+
+        return self.anonymizer.anonymize(
+            small_frame, [box[:4] for box in boxes], method=anonymization_method, **kwargs
+        )
+
+    def _encode_preview(
+        self,
+        frame: np.ndarray,
+        detect_frame: Optional[np.ndarray],
+        small_boxes: List,
+        anonymization_method: str,
+        blur_kernel_size: int,
+        pixelate_blocks: int
+    ) -> bytes:
+        """
+        Codifica el preview JPEG de un frame ya anonimizado.
+
+        Con copia reducida, el preview se anonimiza sobre ella en lugar de
+        reducir el frame completo. Se limita a VIDEO_PREVIEW_MAX_SIDE.
+
+        Args:
+            frame: Frame de salida (ya anonimizado)
+            detect_frame: Copia reducida sin anonimizar (o None)
+            small_boxes: Boxes en coordenadas de la copia reducida
+            anonymization_method: Método de anonimización
+            blur_kernel_size: Tamaño kernel para blur (del frame completo)
+            pixelate_blocks: Número de bloques para pixelate
+
+        Returns:
+            Bytes del JPEG
+        """
+        preview = frame
+        if detect_frame is not None:
+            preview = self._anonymize_preview(
+                detect_frame, small_boxes, anonymization_method,
+                blur_kernel_size * detect_frame.shape[1] / frame.shape[1], pixelate_blocks
+            )
+
+        size = detect_size(preview.shape[1], preview.shape[0], settings.VIDEO_PREVIEW_MAX_SIDE)
+        if size is not None:
+            preview = cv2.resize(preview, size, interpolation=cv2.INTER_AREA)
+
+        params = [cv2.IMWRITE_JPEG_QUALITY, settings.VIDEO_PREVIEW_QUALITY]
+        _, buffer = cv2.imencode('.jpg', preview, params)
+        return buffer.tobytes()
 
     def _detect_in_frame(
         self,
@@ -258,7 +1030,7 @@ class VideoProcessor:
             detect_plates: Si detectar matrículas
 
         Returns:
-            Dict con listas de bounding boxes para faces y plates
+            Dict con listas de bounding boxes (x1, y1, x2, y2, conf) para faces y plates
         """
         # Usar detector unificado si está disponible
         if self.unified_detector is not None:
@@ -268,9 +1040,9 @@ class VideoProcessor:
                 detect_plates=detect_plates
             )
 
-            # Convertir formato (x1, y1, x2, y2, conf) -> (x1, y1, x2, y2)
-            faces = [(x1, y1, x2, y2) for x1, y1, x2, y2, _ in detections['faces']]
-            plates = [(x1, y1, x2, y2) for x1, y1, x2, y2, _ in detections['plates']]
+            # Formato (x1, y1, x2, y2, conf): la confianza se guarda en la pista
+            faces = list(detections['faces'])
+            plates = list(detections['plates'])
 
         else:
             # Usar detectores separados
@@ -295,7 +1067,9 @@ class VideoProcessor:
         anonymization_method: str = "blur",
         blur_kernel_size: int = 51,
         pixelate_blocks: int = 10,
-        send_preview_frames: bool = True
+        send_preview_frames: bool = True,
+        profile_name: Optional[str] = None,
+        fragmented: Optional[bool] = None
     ) -> Dict:
         """
         Procesa video con streaming de progreso via WebSocket
@@ -309,81 +1083,81 @@ class VideoProcessor:
             anonymization_method: Método de anonimización
             blur_kernel_size: Tamaño kernel para blur
             pixelate_blocks: Número de bloques para pixelate
-            send_preview_frames: Si enviar frames de preview en tiempo real
+            send_preview_frames: Si enviar frames de preview (a VIDEO_PREVIEW_FPS)
+            profile_name: Si se indica, el procesamiento se ejecuta bajo el
+                          perfilador por muestreo y se guarda con este nombre
+            fragmented: MP4 fragmentado. Si None, usa settings.VIDEO_FRAGMENTED_MP4
 
         Returns:
             Dict con estadísticas del procesamiento
         """
-        import asyncio
         import concurrent.futures
 
         # Obtener el loop actual para usarlo desde el thread del procesamiento
         loop = asyncio.get_running_loop()
-        
-        # Queue para comunicar mensajes de progreso
-        progress_queue = asyncio.Queue()
-        
-        async def send_progress_messages():
-            """Tarea async que envía mensajes de progreso desde la queue"""
-            while True:
-                try:
-                    message = await asyncio.wait_for(progress_queue.get(), timeout=0.1)
-                    if message is None:  # Señal de terminación
-                        break
-                    await websocket.send_json(message)
-                except asyncio.TimeoutError:
-                    continue
-                except Exception as e:
-                    logger.warning(f"Error enviando progreso: {e}")
-                    break
+
+        # Buzon de un solo mensaje: el procesamiento nunca espera al cliente
+        mailbox = _ProgressMailbox(loop)
+        started = time.perf_counter()
+        last_sent = [0.0]
 
         def sync_callback(frame_number: int, total_frames: int, frame_stats: Dict):
-            """Callback sincrónico que encola mensajes de progreso"""
+            """Callback sincrónico que agrupa mensajes de progreso en el buzón"""
             try:
+                now = time.perf_counter()
+                preview = frame_stats.get('frame_data')
+                # Sin preview, como mucho un mensaje por intervalo (y siempre el ultimo frame)
+                if (preview is None and frame_number < total_frames
+                        and now - last_sent[0] < settings.VIDEO_PROGRESS_INTERVAL_S):
+                    return
+                last_sent[0] = now
+
                 progress_data = {
                     'type': 'progress',
                     'frame': frame_number,
                     'total_frames': total_frames,
                     'progress_percent': round((frame_number / total_frames) * 100, 2),
+                    'fps': round(frame_number / max(now - started, 1e-6), 2),
                     'faces_in_frame': frame_stats.get('faces_in_frame', 0),
                     'plates_in_frame': frame_stats.get('plates_in_frame', 0)
                 }
 
-                # Agregar frame si preview está activado
-                if send_preview_frames and frame_stats.get('frame_data') is not None:
-                    frame_base64 = base64.b64encode(frame_stats['frame_data']).decode('utf-8')
-                    progress_data['current_frame'] = frame_base64
+                if preview is not None:
+                    progress_data['current_frame'] = base64.b64encode(preview).decode('utf-8')
 
-                # Encolar mensaje
-                asyncio.run_coroutine_threadsafe(
-                    progress_queue.put(progress_data),
-                    loop
-                )
+                mailbox.post(progress_data)
             except Exception as e:
                 logger.warning(f"Error en callback de progreso: {e}")
 
+        def run_processing() -> Dict:
+            """Procesa el video en el hilo del pool (perfilado si se pide)"""
+            kwargs = dict(
+                video_path=video_path,
+                output_path=output_path,
+                detect_faces=detect_faces,
+                detect_plates=detect_plates,
+                anonymization_method=anonymization_method,
+                blur_kernel_size=blur_kernel_size,
+                pixelate_blocks=pixelate_blocks,
+                callback=sync_callback,
+                fragmented=fragmented,
+                preview_fps=None if send_preview_frames else 0
+            )
+            if profile_name is None:
+                return self.process_video(**kwargs)
+            with profile(profile_name):
+                return self.process_video(**kwargs)
+
         # Iniciar tarea de envío de mensajes
-        sender_task = asyncio.create_task(send_progress_messages())
+        sender_task = asyncio.create_task(mailbox.send_all(websocket))
 
         try:
             # Ejecutar procesamiento en thread pool
             with concurrent.futures.ThreadPoolExecutor() as executor:
-                result = await loop.run_in_executor(
-                    executor,
-                    lambda: self.process_video(
-                        video_path=video_path,
-                        output_path=output_path,
-                        detect_faces=detect_faces,
-                        detect_plates=detect_plates,
-                        anonymization_method=anonymization_method,
-                        blur_kernel_size=blur_kernel_size,
-                        pixelate_blocks=pixelate_blocks,
-                        callback=sync_callback
-                    )
-                )
+                result = await loop.run_in_executor(executor, run_processing)
         finally:
-            # Finalizar sender task
-            await progress_queue.put(None)
+            # Finalizar sender task (envia antes el ultimo mensaje pendiente)
+            mailbox.close()
             await sender_task
 
         return result
@@ -0,0 +1,212 @@
+"""
+Utilidades para bounding boxes.
+
+Operaciones sobre detecciones en formato (x1, y1, x2, y2, confidence):
+recorte a los limites de la imagen, expansion con margen, desplazamiento,
+fusion de detecciones solapadas, reescalado y union de regiones.
+"""
+
+import math
+from typing import List, Optional, Tuple
+
+
+Detection = Tuple[int, int, int, int, float]
+
+
+def clip_box(
+    x1: float, y1: float, x2: float, y2: float,
+    width: int, height: int
+) -> Tuple[int, int, int, int]:
+    """
+    Recorta una box a los limites de la imagen.
+
+    Args:
+        x1, y1, x2, y2: Coordenadas de la box
+        width: Ancho de la imagen
+        height: Alto de la imagen
+
+    Returns:
+        Tupla (x1, y1, x2, y2) en enteros dentro de la imagen
+    """
+    return (
+        int(max(0, min(x1, width))),
+        int(max(0, min(y1, height))),
+        int(max(0, min(x2, width))),
+        int(max(0, min(y2, height)))
+    )
+
+
+def expand_box(
+    box: Tuple[int, int, int, int],
+    margin: float,
+    width: int,
+    height: int,
+    min_size: int = 0
+) -> Tuple[int, int, int, int]:
+    """
+    Expande una box con un margen relativo a su tamano.
+
+    Args:
+        box: Box (x1, y1, x2, y2)
+        margin: Margen por lado como fraccion del tamano de la box
+        width: Ancho de la imagen
+        height: Alto de la imagen
+        min_size: Tamano minimo del lado resultante en pixeles
+
+    Returns:
+        Box expandida y recortada a la imagen
+    """
+    x1, y1, x2, y2 = box
+    bw = max(x2 - x1, 1)
+    bh = max(y2 - y1, 1)
+
+    side_w = max(bw * (1 + 2 * margin), min_size)
+    side_h = max(bh * (1 + 2 * margin), min_size)
+
+    cx = (x1 + x2) / 2
+    cy = (y1 + y2) / 2
+
+    return clip_box(
+        cx - side_w / 2, cy - side_h / 2,
+        cx + side_w / 2, cy + side_h / 2,
+        width, height
+    )
+
+
+def offset_detections(detections: List[Detection], dx: int, dy: int) -> List[Detection]:
+    """
+    Desplaza detecciones de coordenadas de un recorte a las de la imagen.
+
+    Args:
+        detections: Detecciones relativas al recorte
+        dx: Desplazamiento horizontal del recorte
+        dy: Desplazamiento vertical del recorte
+
+    Returns:
+        Detecciones en coordenadas de la imagen original
+    """
+    return [
+        (x1 + dx, y1 + dy, x2 + dx, y2 + dy, conf)
+        for x1, y1, x2, y2, conf in detections
+    ]
+
+
+def box_iou(a: Tuple, b: Tuple) -> float:
+    """
+    Calcula el IoU entre dos boxes.
+
+    Args:
+        a: Box (x1, y1, x2, y2, ...)
+        b: Box (x1, y1, x2, y2, ...)
+
+    Returns:
+        Interseccion sobre union (0-1)
+    """
+    ix1 = max(a[0], b[0])
+    iy1 = max(a[1], b[1])
+    ix2 = min(a[2], b[2])
+    iy2 = min(a[3], b[3])
+
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    if inter == 0:
+        return 0.0
+
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+
+    return inter / float(area_a + area_b - inter)
+
+
+def merge_detections(detections: List[Detection], iou_threshold: float = 0.45) -> List[Detection]:
+    """
+    Fusiona detecciones solapadas conservando la de mayor confianza (NMS).
+
+    Args:
+        detections: Detecciones de una misma clase
+        iou_threshold: IoU a partir del cual dos detecciones son la misma
+
+    Returns:
+        Detecciones sin duplicados, ordenadas por confianza descendente
+    """
+    kept: List[Detection] = []
+
+    for det in sorted(detections, key=lambda d: d[4], reverse=True):
+        if all(box_iou(det, other) < iou_threshold for other in kept):
+            kept.append(det)
+
+    return kept
+
+
+def scale_detections(
+    detections: List[Tuple],
+    scale: float,
+    scale_y: Optional[float] = None,
+    size: Optional[Tuple[int, int]] = None
+) -> List[Tuple]:
+    """
+    Reescala detecciones obtenidas sobre una imagen reducida.
+
+    Args:
+        detections: Boxes (x1, y1, x2, y2[, ...]) en coordenadas de la imagen reducida
+        scale: Factor original / reducida (horizontal si se indica scale_y)
+        scale_y: Factor vertical. Si None, se usa scale
+        size: (ancho, alto) de la imagen original para recortar las boxes.
+              Si None, no se recortan
+
+    Returns:
+        Detecciones en coordenadas de la imagen original (ampliadas hacia
+        fuera y con los campos extra, como la confianza, sin cambios)
+    """
+    scale_y = scale if scale_y is None else scale_y
+    if scale == 1.0 and scale_y == 1.0 and size is None:
+        return detections
+
+    width, height = size if size is not None else (math.inf, math.inf)
+    scaled = []
+    for det in detections:
+        x1, y1, x2, y2 = det[:4]
+        scaled.append((
+            max(0, int(x1 * scale)),
+            max(0, int(y1 * scale_y)),
+            int(min(width, math.ceil(x2 * scale))),
+            int(min(height, math.ceil(y2 * scale_y))),
+            *det[4:]
+        ))
+    return scaled
+
+
+def boxes_intersect(a: Tuple, b: Tuple) -> bool:
+    """Indica si dos boxes (x1, y1, x2, y2, ...) se solapan."""
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def merge_regions(regions: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int]]:
+    """
+    Une las regiones que se solapan en su rectangulo envolvente.
+
+    Args:
+        regions: Regiones (x1, y1, x2, y2)
+
+    Returns:
+        Regiones disjuntas que cubren las originales
+    """
+    merged = [tuple(region[:4]) for region in regions]
+
+    changed = True
+    while changed:
+        changed = False
+        result: List[Tuple[int, int, int, int]] = []
+        for region in merged:
+            for index, other in enumerate(result):
+                if boxes_intersect(region, other):
+                    result[index] = (
+                        min(region[0], other[0]), min(region[1], other[1]),
+                        max(region[2], other[2]), max(region[3], other[3])
+                    )
+                    changed = True
+                    break
+            else:
+                result.append(region)
+        merged = result
+
+    return merged
@@ -6,8 +6,9 @@ Gestion de archivos temporales, validacion y limpieza.
 
 import os
 import shutil
+import tempfile
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Optional
 import uuid
 import logging
 from datetime import datetime, timedelta
@@ -18,6 +19,10 @@ from app.core.config import settings
 logger = logging.getLogger(__name__)
 
 
+class UploadTooLargeError(ValueError):
+    """La subida supera el tamano maximo permitido."""
+
+
 class FileHandler:
     """
     Gestor de archivos para la aplicacion.
@@ -97,6 +102,60 @@ class FileHandler:
         logger.info(f"Archivo temporal guardado: {temp_path}")
         return temp_path
 
+    @staticmethod
+    def save_upload(
+        fileobj: BinaryIO,
+        suffix: str = "",
+        max_bytes: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        hasher=None
+    ) -> Path:
+        """
+        Vuelca una subida a un fichero temporal por bloques.
+
+        La subida nunca se carga entera en memoria y el limite se comprueba
+        mientras se copia. Es bloqueante: desde un endpoint async se llama
+        en el threadpool.
+
+        Args:
+            fileobj: Fichero de la subida (UploadFile.file)
+            suffix: Extension del fichero temporal
+            max_bytes: Tamano maximo (None = sin limite)
+            chunk_size: Bytes por bloque. Si None, usa settings.UPLOAD_CHUNK_SIZE
+            hasher: Objeto de hashlib que se actualiza con cada bloque (opcional)
+
+        Returns:
+            Ruta del fichero temporal (lo borra el llamador)
+
+        Raises:
+            UploadTooLargeError: Si la subida supera max_bytes
+        """
+        chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+        fileobj.seek(0)
+        written = 0
+
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp:
+            try:
+                while True:
+                    chunk = fileobj.read(chunk_size)
+                    if not chunk:
+                        break
+                    written += len(chunk)
+                    if max_bytes is not None and written > max_bytes:
+                        raise UploadTooLargeError(
+                            f"Archivo demasiado grande (maximo {max_bytes // (1024 * 1024)} MB)"
+                        )
+                    temp.write(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+            except BaseException:
+                temp.close()
+                os.unlink(temp.name)
+                raise
+
+        logger.debug(f"Subida volcada a {temp.name} ({written} bytes)")
+        return Path(temp.name)
+
     @staticmethod
     def delete_file(file_path: Path) -> bool:
         """
@@ -0,0 +1,200 @@
+"""
+Utilidades para ficheros JPEG.
+
+Lectura de la cabecera (marcadores SOF) y de la orientacion EXIF sin
+decodificar la imagen.
+"""
+
+from typing import List, Optional, Tuple
+
+
+# Marcadores Start Of Frame (excluye DHT 0xC4, JPG 0xC8 y DAC 0xCC)
+_SOF_MARKERS = {
+    0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+    0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF,
+}
+# Marcadores sin segmento de longitud
+_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7}
+# Segmento APP1 con EXIF y etiqueta Orientation del IFD0
+_APP1_MARKER = 0xE1
+_EXIF_HEADER = b"Exif\x00\x00"
+_ORIENTATION_TAG = 0x0112
+
+
+def is_jpeg(data) -> bool:
+    """Comprueba la firma SOI de un buffer."""
+    view = memoryview(data).cast('B')
+    return len(view) >= 3 and view[0] == 0xFF and view[1] == 0xD8 and view[2] == 0xFF
+
+
+def read_frame_header(data) -> Optional[dict]:
+    """
+    Lee el marcador SOF de un JPEG sin decodificarlo.
+
+    Args:
+        data: Buffer con el JPEG (bytes, memoryview o array uint8)
+
+    Returns:
+        Diccionario con 'marker', 'width', 'height' y 'components'
+        (lista de tuplas (id, muestreo_h, muestreo_v)), o None si no es
+        un JPEG valido
+    """
+    view = memoryview(data).cast('B')
+    if not is_jpeg(view):
+        return None
+
+    pos = 2
+    size = len(view)
+
+    while pos + 4 <= size:
+        if view[pos] != 0xFF:
+            return None
+
+        marker = view[pos + 1]
+        if marker == 0xFF:
+            # Bytes de relleno entre marcadores
+            pos += 1
+            continue
+        if marker in _STANDALONE_MARKERS:
+            pos += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            # EOI o inicio de datos sin haber encontrado SOF
+            return None
+
+        length = (view[pos + 2] << 8) | view[pos + 3]
+
+        if marker in _SOF_MARKERS:
+            if pos + 10 > size:
+                return None
+            height = (view[pos + 5] << 8) | view[pos + 6]
+            width = (view[pos + 7] << 8) | view[pos + 8]
+            count = view[pos + 9]
+            if pos + 10 + 3 * count > size:
+                return None
+            components: List[Tuple[int, int, int]] = []
+            for i in range(count):
+                base = pos + 10 + 3 * i
+                components.append((view[base], view[base + 1] >> 4, view[base + 1] & 0x0F))
+            return {
+                "marker": marker,
+                "width": width,
+                "height": height,
+                "components": components,
+            }
+
+        pos += 2 + length
+
+    return None
+
+
+def jpeg_dimensions(data) -> Optional[Tuple[int, int]]:
+    """
+    Obtiene el tamano de un JPEG leyendo solo la cabecera.
+
+    Args:
+        data: Buffer con el JPEG
+
+    Returns:
+        Tupla (ancho, alto) o None si no es un JPEG valido
+    """
+    header = read_frame_header(data)
+    if header is None:
+        return None
+
+    return header["width"], header["height"]
+
+
+def is_baseline(header: dict) -> bool:
+    """Indica si la cabecera corresponde a un JPEG baseline (SOF0)."""
+    return header["marker"] == 0xC0
+
+
+def mcu_size(header: dict) -> Tuple[int, int]:
+    """
+    Tamano del MCU en pixeles segun el submuestreo de crominancia.
+
+    Args:
+        header: Cabecera devuelta por read_frame_header
+
+    Returns:
+        Tupla (ancho, alto) del MCU (8, 16 segun el muestreo)
+    """
+    max_h = max(h for _, h, _ in header["components"])
+    max_v = max(v for _, _, v in header["components"])
+    return 8 * max_h, 8 * max_v
+
+
+def read_exif_orientation(data) -> Optional[int]:
+    """
+    Lee la etiqueta EXIF Orientation (1-8) de un JPEG sin decodificarlo.
+
+    cv2.imdecode rota la imagen segun esta etiqueta, asi que los pixeles
+    decodificados no coinciden con la rejilla de bloques del fichero
+    cuando es distinta de 1.
+
+    Args:
+        data: Buffer con el JPEG
+
+    Returns:
+        Valor de Orientation, o None si no hay EXIF o no la incluye
+    """
+    view = memoryview(data).cast('B')
+    if not is_jpeg(view):
+        return None
+
+    pos = 2
+    size = len(view)
+
+    while pos + 4 <= size:
+        if view[pos] != 0xFF:
+            return None
+
+        marker = view[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker in _STANDALONE_MARKERS:
+            pos += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            return None
+
+        length = (view[pos + 2] << 8) | view[pos + 3]
+        start = pos + 4
+        end = min(pos + 2 + length, size)
+
+        if marker == _APP1_MARKER and bytes(view[start:start + 6]) == _EXIF_HEADER:
+            return _tiff_orientation(bytes(view[start + 6:end]))
+
+        pos += 2 + length
+
+    return None
+
+
+def _tiff_orientation(tiff: bytes) -> Optional[int]:
+    """Busca Orientation en el IFD0 de un bloque TIFF (cabecera EXIF)."""
+    if tiff[:2] == b"II":
+        order = "little"
+    elif tiff[:2] == b"MM":
+        order = "big"
+    else:
+        return None
+
+    def read(offset: int, length: int) -> Optional[int]:
+        if offset + length > len(tiff):
+            return None
+        return int.from_bytes(tiff[offset:offset + length], order)
+
+    ifd = read(4, 4)
+    count = read(ifd, 2) if ifd is not None else None
+    if count is None:
+        return None
+
+    for i in range(count):
+        entry = ifd + 2 + 12 * i
+        if read(entry, 2) == _ORIENTATION_TAG:
+            # Tipo SHORT: el valor va en los dos primeros bytes del campo
+            return read(entry + 8, 2)
+
+    return None
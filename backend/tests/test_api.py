@@ -8,6 +8,7 @@ import pytest
 from fastapi.testclient import TestClient
 from pathlib import Path
 import io
+import json
 
 # Importar app después de configurar path
 import sys
@@ -113,6 +114,331 @@ class TestAnonymizeEndpoint:
         assert response.status_code == 422
 
 
+class TestClassSelectiveEndpoints:
+    """Tests para los endpoints de deteccion/anonimizacion por clases"""
+
+    def test_anonymize_classes_rejects_unknown_class(self):
+        """Clases fuera del catalogo /api/classes deben devolver 400"""
+        files = {"file": ("test.jpg", io.BytesIO(b"not-an-image"), "image/jpeg")}
+        data = {"classes": "face,unicorn"}
+
+        response = client.post("/api/anonymize/classes", files=files, data=data)
+        assert response.status_code == 400
+        assert "unicorn" in response.json()["detail"]
+
+    def test_detect_classes_rejects_empty_list(self):
+        """Una lista de clases vacia debe devolver 400"""
+        files = {"file": ("test.jpg", io.BytesIO(b"not-an-image"), "image/jpeg")}
+        data = {"classes": " , "}
+
+        response = client.post("/api/detect/classes", files=files, data=data)
+        assert response.status_code == 400
+
+    def test_detect_classes_filters_without_loading_coco(self, monkeypatch):
+        """Solo rostros: el filtro classes= llega al modelo y COCO no se carga"""
+        import cv2
+        import numpy as np
+        from app.models import multi_detector
+        from app.services import image_processor
+
+        class FakeTensor:
+            def __init__(self, value):
+                self.value = np.asarray(value, dtype=np.float32)
+
+            def __getitem__(self, index):
+                return FakeTensor(self.value[index])
+
+            def cpu(self):
+                return self
+
+            def numpy(self):
+                return self.value
+
+        class FakeBox:
+            def __init__(self, xyxy, conf, cls):
+                self.xyxy = FakeTensor([xyxy])
+                self.conf = FakeTensor([conf])
+                self.cls = FakeTensor([cls])
+
+        class FakeResult:
+            # El modelo falso ignora el filtro y devuelve rostro y matricula
+            boxes = [FakeBox([10, 10, 40, 40], 0.9, 0), FakeBox([50, 50, 90, 70], 0.8, 1)]
+
+        calls = []
+
+        def unified_model(image, **kwargs):
+            calls.append(kwargs)
+            return [FakeResult()]
+
+        def load_yolo(path):
+            raise AssertionError(f"No se debe cargar {path}")
+
+        detector = multi_detector.MultiDetector.__new__(multi_detector.MultiDetector)
+        detector.confidence = 0.5
+        detector.iou = 0.45
+        detector.inference = {}
+        detector.unified_model = unified_model
+        detector.coco_model = None
+        monkeypatch.setattr(multi_detector, "YOLO", load_yolo)
+        monkeypatch.setattr(image_processor, "get_multi_detector", lambda: detector)
+        monkeypatch.setattr(
+            image_processor, "_image_processor_instance",
+            image_processor.ImageProcessor.__new__(image_processor.ImageProcessor)
+        )
+
+        _, encoded = cv2.imencode(".png", np.zeros((100, 100, 3), dtype=np.uint8))
+        files = {"file": ("test.png", io.BytesIO(encoded.tobytes()), "image/png")}
+        response = client.post("/api/detect/classes", files=files, data={"classes": "face"})
+
+        assert response.status_code == 200
+        assert [call["classes"] for call in calls] == [[0]]
+        assert detector.coco_model is None
+        body = response.json()
+        assert body["models_used"] == ["unified"]
+        assert list(body["detections"]) == ["face"]
+        assert len(body["detections"]["face"]) == 1
+
+
+class TestBatchEndpoint:
+    """Tests para el endpoint /api/anonymize/batch"""
+
+    def test_batch_requires_archive_or_files(self):
+        """Sin ZIP ni imagenes debe devolver 400"""
+        response = client.post("/api/anonymize/batch", data={"method": "blur"})
+        assert response.status_code == 400
+
+    def test_batch_rejects_invalid_zip(self):
+        """Un archivo que no es ZIP debe devolver 400"""
+        files = {"archive": ("images.zip", io.BytesIO(b"not-a-zip"), "application/zip")}
+        response = client.post("/api/anonymize/batch", files=files)
+        assert response.status_code == 400
+
+    def test_batch_rejects_zip_over_limit(self, monkeypatch):
+        """Un ZIP con mas de BATCH_MAX_FILES imagenes se rechaza entero"""
+        import zipfile
+        from app.core.config import settings
+
+        monkeypatch.setattr(settings, "BATCH_MAX_FILES", 2)
+        data = io.BytesIO()
+        with zipfile.ZipFile(data, "w") as archive:
+            for i in range(3):
+                archive.writestr(f"img_{i}.png", b"png")
+            archive.writestr("notas.txt", b"no es una imagen")
+
+        files = {"archive": ("images.zip", io.BytesIO(data.getvalue()), "application/zip")}
+        response = client.post("/api/anonymize/batch", files=files)
+        assert response.status_code == 400
+        assert "maximo 2" in response.json()["detail"]
+
+
+class TestResponseEncodings:
+    """Tests para la seleccion de formato de respuesta por cabecera Accept"""
+
+    payload = {"text": "Escribe a ana@example.com o a luis@example.org", "categories": ["email"]}
+
+    def test_packed_text_detections(self):
+        """El formato compacto devuelve las detecciones como arrays"""
+        response = client.post(
+            "/api/detect-text",
+            json=self.payload,
+            headers={"Accept": "application/vnd.anonymizer.packed+json"}
+        )
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["fields"][:3] == ["type", "start", "end"]
+        assert [row[0] for row in body["detections"]] == ["email", "email"]
+
+    def test_ndjson_streams_summary_then_detections(self):
+        """NDJSON envia una linea de resumen y una por deteccion"""
+        response = client.post(
+            "/api/analyze-text",
+            json={**self.payload, "omit_input": True},
+            headers={"Accept": "application/x-ndjson"}
+        )
+
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert lines[0]["total_detections"] == 2
+        assert "original_text" not in lines[0]
+        assert len(lines) == 3
+
+
+class TestMetricsEndpoint:
+    """Tests para el endpoint de metricas"""
+
+    def test_metrics_exposition_format(self):
+        """/metrics devuelve texto Prometheus con las series de etapa"""
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "# TYPE anonymizer_image_stage_seconds histogram" in response.text
+
+
+class TestRequestTracing:
+    """Tests para el request id de las trazas"""
+
+    def test_request_id_is_propagated(self):
+        """Se devuelve el X-Request-ID recibido o uno generado"""
+        response = client.get("/", headers={"X-Request-ID": "req-42"})
+        assert response.headers["x-request-id"] == "req-42"
+        assert len(client.get("/").headers["x-request-id"]) == 32
+
+
+class TestVideoUploads:
+    """Tests para las subidas de video por bloques y /api/video-info"""
+
+    @pytest.fixture
+    def video_file(self, tmp_path):
+        import cv2
+        import numpy as np
+
+        path = tmp_path / "clip.mp4"
+        writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 10, (64, 48))
+        for _ in range(5):
+            writer.write(np.zeros((48, 64, 3), dtype=np.uint8))
+        writer.release()
+        return path
+
+    def test_video_info_from_upload_and_path(self, video_file, monkeypatch):
+        """/video-info lee las cabeceras de una subida o de una ruta permitida"""
+        from app.core.config import settings
+
+        response = client.post(
+            "/api/video-info", files={"file": ("clip.mp4", video_file.read_bytes(), "video/mp4")}
+        )
+        assert response.status_code == 200
+        assert (response.json()["info"]["width"], response.json()["info"]["height"]) == (64, 48)
+
+        assert client.post("/api/video-info", data={"path": str(video_file)}).status_code == 403
+        monkeypatch.setattr(settings, "VIDEO_SOURCE_ROOTS", [video_file.parent])
+        response = client.post("/api/video-info", data={"path": str(video_file)})
+        assert response.status_code == 200
+        assert response.json()["source"] == "path"
+
+        response = client.post("/api/video-info", data={"url": "http://example.com/a.mp4"})
+        assert response.status_code == 403
+        assert client.post("/api/video-info").status_code == 400
+
+    def test_upload_over_limit_is_rejected(self, monkeypatch):
+        """Las subidas que superan VIDEO_MAX_UPLOAD_MB se cortan con 413"""
+        from app.core.config import settings
+        from app.utils.file_handler import FileHandler, UploadTooLargeError
+
+        monkeypatch.setattr(settings, "VIDEO_MAX_UPLOAD_MB", 1)
+        payload = b"\0" * (2 * 1024 * 1024)
+        response = client.post("/api/video-info", files={"file": ("big.mp4", payload, "video/mp4")})
+        assert response.status_code == 413
+
+        with pytest.raises(UploadTooLargeError):
+            FileHandler.save_upload(
+                io.BytesIO(payload), ".mp4", max_bytes=1024 * 1024, chunk_size=64 * 1024
+            )
+
+
+class TestVideoOutputs:
+    """Tests para el almacen de videos procesados (/api/outputs/{id})"""
+
+    @pytest.fixture
+    def store(self, tmp_path, monkeypatch):
+        from app.services import output_store
+
+        store = output_store.OutputStore(tmp_path / "videos")
+        monkeypatch.setattr(output_store, "_output_store", store)
+        return store
+
+    def test_range_request_and_expiry(self, store):
+        """Las salidas terminadas admiten Range y desaparecen al caducar"""
+        output_id, path = store.create("anonymized_clip.mp4")
+        payload = bytes(range(256)) * 4
+        path.write_bytes(payload)
+
+        assert client.get(f"/api/outputs/{output_id}").status_code == 409
+        store.complete(output_id)
+
+        response = client.get(f"/api/outputs/{output_id}", headers={"Range": "bytes=100-199"})
+        assert response.status_code == 206
+        assert response.headers["content-range"] == f"bytes 100-199/{len(payload)}"
+        assert response.content == payload[100:200]
+
+        assert store.cleanup(max_age_hours=0) == 2
+        assert client.get(f"/api/outputs/{output_id}").status_code == 404
+        assert client.get("/api/outputs/..%2Fsecret").status_code == 404
+
+    def test_progressive_output_follows_growing_file(self, store):
+        """Un MP4 fragmentado en proceso se envia segun crece hasta terminar"""
+        import threading
+        import time
+
+        output_id, path = store.create("anonymized_clip.mp4", progressive=True)
+        path.write_bytes(b"a" * 1000)
+
+        def finish():
+            time.sleep(0.5)
+            with open(path, "ab") as f:
+                f.write(b"b" * 1000)
+            store.complete(output_id)
+
+        writer = threading.Thread(target=finish)
+        writer.start()
+        response = client.get(f"/api/outputs/{output_id}")
+        writer.join()
+
+        assert response.status_code == 200
+        assert response.content == b"a" * 1000 + b"b" * 1000
+
+    @pytest.mark.parametrize("progressive", [True, False])
+    def test_non_ascii_filename(self, store, progressive):
+        """Un nombre de subida no ASCII o con comillas no rompe la cabecera"""
+        import threading
+
+        output_id, path = store.create('anonymized_视频 "1".mp4', progressive=progressive)
+        path.write_bytes(b"a" * 100)
+        # La salida progresiva se sirve en streaming mientras sigue en proceso
+        finisher = threading.Timer(0.3 if progressive else 0, store.complete, [output_id])
+        finisher.start()
+        if not progressive:
+            finisher.join()
+
+        response = client.get(f"/api/outputs/{output_id}")
+        finisher.join()
+        assert response.status_code == 200
+        assert response.content == b"a" * 100
+        assert response.headers["accept-ranges"] == ("none" if progressive else "bytes")
+        assert response.headers["content-disposition"] == (
+            'inline; filename="anonymized___ _1_.mp4"; '
+            "filename*=utf-8''anonymized_%E8%A7%86%E9%A2%91%20%221%22.mp4"
+        )
+
+
+class TestLiveEndpoints:
+    """Tests para los streams en directo (/api/live/streams)"""
+
+    def test_sources_must_be_allowed(self):
+        """URLs, camaras y rutas fuera de lo configurado devuelven 403"""
+        response = client.post("/api/live/streams", json={"source": "rtsp://camara/1"})
+        assert response.status_code == 403
+        assert client.post("/api/live/streams", json={"source": "0"}).status_code == 403
+        assert client.post("/api/live/streams", json={"source": "/etc/passwd"}).status_code == 403
+        assert client.get("/api/live/streams/desconocido").status_code == 404
+
+    def test_rtsp_output_must_be_allowed(self, monkeypatch, tmp_path):
+        """El destino rtsp_url fuera de LIVE_RTSP_OUTPUT_PREFIXES devuelve 403"""
+        from app.core.config import settings
+
+        video = tmp_path / "camara.mp4"
+        video.write_bytes(b"")
+        monkeypatch.setattr(settings, "VIDEO_SOURCE_ROOTS", [tmp_path])
+        monkeypatch.setattr(settings, "LIVE_RTSP_OUTPUT_PREFIXES", ["rtsp://mediamtx:8554/"])
+
+        for rtsp_url in ("rtsp://10.0.0.5:8554/x", "rtsp://mediamtx:8554.evil/x"):
+            response = client.post("/api/live/streams", json={
+                "source": str(video), "sinks": ["rtsp"], "rtsp_url": rtsp_url
+            })
+            assert response.status_code == 403
+
+
 class TestDocsEndpoint:
     """Tests para los endpoints de documentación"""
     
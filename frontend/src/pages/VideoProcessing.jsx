@@ -39,7 +39,6 @@ export default function VideoProcessing() {
   const [error, setError] = useState(null);
 
   const startTimeRef = useRef(null);
-  const frameCountRef = useRef(0);
 
   // Opciones de detección
   const [selectedClasses, setSelectedClasses] = useState(['face', 'plate']);
@@ -90,9 +89,8 @@ export default function VideoProcessing() {
       plates_in_frame: 0
     });
 
-    // Inicializar contador de FPS
+    // Inicializar tiempo de procesamiento
     startTimeRef.current = Date.now();
-    frameCountRef.current = 0;
 
     try {
       // Usar WebSocket para recibir frames en tiempo real
@@ -106,11 +104,10 @@ export default function VideoProcessing() {
           pixelate_blocks: 10,
           enablePreview: enableLivePreview
         },
-        // Callback de progreso (cada frame)
+        // Callback de progreso (agrupado por el servidor, con los FPS reales)
         (progressData) => {
-          frameCountRef.current += 1;
           const elapsed = (Date.now() - startTimeRef.current) / 1000; // segundos
-          const fps = elapsed > 0 ? frameCountRef.current / elapsed : 0;
+          const fps = progressData.fps ?? (elapsed > 0 ? progressData.frame / elapsed : 0);
 
           setProgress({
             frame: progressData.frame,
@@ -129,20 +126,17 @@ export default function VideoProcessing() {
         // Callback de completado
         (result) => {
           console.log('Video procesado:', result);
-          console.log('Blob:', result.blob);
-          console.log('Blob type:', result.blob?.constructor?.name);
 
-          // Validar que el blob existe
-          if (!result.blob || !(result.blob instanceof Blob)) {
-            console.error('Error: result.blob no es un Blob válido', result);
+          // Validar que se recibió la URL del video
+          if (!result.url) {
+            console.error('Error: no se recibió la URL del video procesado', result);
             setError('Error al recibir el video procesado');
             setLoading(false);
             return;
           }
 
-          // Crear URL para el video procesado
-          const videoUrl = URL.createObjectURL(result.blob);
-          setProcessedVideo(videoUrl);
+          // El video se reproduce directamente desde el servidor
+          setProcessedVideo(result.url);
 
           setMetadata({
             totalFaces: result.stats.total_faces,
@@ -184,9 +178,6 @@ export default function VideoProcessing() {
     if (originalVideoUrl) {
       URL.revokeObjectURL(originalVideoUrl);
     }
-    if (processedVideo) {
-      URL.revokeObjectURL(processedVideo);
-    }
 
     setSelectedFile(null);
     setOriginalVideoUrl(null);
@@ -202,10 +202,10 @@ export const processVideoWithWebSocket = (file, options = {}, onProgress, onComp
       } else if (data.type === 'complete' && onComplete) {
         onComplete(data.result);
       } else if (data.type === 'video' && onComplete) {
-        // Convertir base64 a Blob
-        const videoBlob = base64ToBlob(data.video_data, 'video/mp4');
+        // El video se sirve por HTTP (con Range): el reproductor puede buscar
         onComplete({
-          blob: videoBlob,
+          url: API_BASE_URL + data.url,
+          outputId: data.output_id,
           stats: data.stats
         });
         ws.close();
@@ -231,24 +231,6 @@ export const processVideoWithWebSocket = (file, options = {}, onProgress, onComp
   return ws;
 };
 
-/**
- * Convierte base64 a Blob
- * @param {string} base64 - String base64
- * @param {string} mimeType - Tipo MIME
- * @returns {Blob} Blob
- */
-const base64ToBlob = (base64, mimeType) => {
-  const byteCharacters = atob(base64);
-  const byteNumbers = new Array(byteCharacters.length);
-
-  for (let i = 0; i < byteCharacters.length; i++) {
-    byteNumbers[i] = byteCharacters.charCodeAt(i);
-  }
-
-  const byteArray = new Uint8Array(byteNumbers);
-  return new Blob([byteArray], { type: mimeType });
-};
-
 /**
  * Obtiene las categorías de datos sensibles disponibles para texto
  * @param {string} mode - Modo de detección (regex, llm, both)
@@ -0,0 +1,444 @@
+"""
+Anonimizador por lotes sin servidor (CLI).
+
+Recorre recursivamente un directorio (por ejemplo, un volcado de un object
+store) y anonimiza imagenes, videos y textos usando directamente
+ImageProcessor, VideoProcessor y TextAnalyzer, sin HTTP ni base64.
+
+Caracteristicas:
+- Pool de procesos dimensionado al numero de nucleos
+- Reanudable: se omiten los archivos cuya salida y sidecar ya existen, y
+  los videos se procesan por segmentos con checkpoints (un video largo
+  interrumpido continua desde el ultimo segmento completo)
+- Sidecar JSON por archivo con las detecciones
+- Informe de throughput (archivos/s y MB/s)
+- Funciona sin conexion en una maquina solo CPU (los modelos deben estar
+  en models/trained o en la cache local de Ultralytics)
+
+Uso:
+    python scripts/batch_anonymize.py ENTRADA SALIDA [--workers N] [--method blur]
+    python scripts/batch_anonymize.py ENTRADA SALIDA --profile-dir profiles --profile-every 100
+    python scripts/batch_anonymize.py ENTRADA SALIDA --segment-seconds 120
+"""
+
+import os
+import sys
+import json
+import shutil
+import time
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+# Sin conexion: Ultralytics no debe intentar descargar nada
+os.environ.setdefault("YOLO_OFFLINE", "1")
+
+# Añadir backend al path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp"}
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv"}
+TEXT_EXTENSIONS = {".txt", ".md", ".csv"}
+
+SIDECAR_SUFFIX = ".json"
+
+
+# Procesadores por proceso (se crean bajo demanda en cada worker)
+_worker_state: Dict = {}
+
+
+def classify_file(path: Path) -> Optional[str]:
+    """Devuelve el tipo de archivo ('image', 'video', 'text') o None."""
+    ext = path.suffix.lower()
+    if ext in IMAGE_EXTENSIONS:
+        return "image"
+    if ext in VIDEO_EXTENSIONS:
+        return "video"
+    if ext in TEXT_EXTENSIONS:
+        return "text"
+    return None
+
+
+def output_path_for(input_root: Path, output_root: Path, path: Path, kind: str) -> Path:
+    """Calcula la ruta de salida manteniendo la estructura de directorios."""
+    relative = path.relative_to(input_root)
+    output = output_root / relative
+
+    if kind == "video":
+        output = output.with_suffix(".mp4")
+    elif kind == "image" and path.suffix.lower() not in {".jpg", ".jpeg", ".png"}:
+        # ImageProcessor.encode_image codifica como JPEG los formatos no soportados
+        output = output.with_suffix(".jpg")
+
+    return output
+
+
+def sidecar_path_for(output: Path) -> Path:
+    """Ruta del sidecar JSON de un archivo de salida."""
+    return output.with_name(output.name + SIDECAR_SUFFIX)
+
+
+def job_dir_for(output: Path) -> Path:
+    """Directorio de checkpoints de un video (junto a su salida)."""
+    return output.with_name(f".{output.stem}.job")
+
+
+def is_done(output: Path) -> bool:
+    """Un archivo esta completo si existen la salida y su sidecar."""
+    return output.exists() and sidecar_path_for(output).exists()
+
+
+def collect_jobs(
+    input_root: Path,
+    output_root: Path,
+    kinds: List[str],
+    force: bool
+) -> Tuple[List[Tuple[str, Path, Path]], int]:
+    """
+    Recorre el directorio de entrada y genera la lista de trabajos.
+
+    Returns:
+        Tupla (trabajos pendientes, numero de archivos ya completados)
+    """
+    jobs = []
+    skipped = 0
+
+    for path in sorted(input_root.rglob("*")):
+        if not path.is_file():
+            continue
+        # No reprocesar la salida si esta dentro de la entrada
+        if output_root in path.parents:
+            continue
+
+        kind = classify_file(path)
+        if kind is None or kind not in kinds:
+            continue
+
+        output = output_path_for(input_root, output_root, path, kind)
+        if not force and is_done(output):
+            skipped += 1
+            continue
+
+        jobs.append((kind, path, output))
+
+    return jobs, skipped
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """Escribe un archivo de forma atomica (temporal + rename)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.partial")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _init_worker(threads_per_worker: int) -> None:
+    """Inicializa un worker limitando los hilos de PyTorch/OpenCV."""
+    import cv2
+    import torch
+
+    torch.set_num_threads(threads_per_worker)
+    cv2.setNumThreads(threads_per_worker)
+
+
+def _get_processor(kind: str):
+    """Crea (una vez por proceso) el procesador correspondiente."""
+    if kind not in _worker_state:
+        if kind == "image":
+            from app.services.image_processor import get_image_processor
+            _worker_state[kind] = get_image_processor()
+        elif kind == "video":
+            from app.services.video_processor import VideoProcessor
+            _worker_state[kind] = VideoProcessor()
+        elif kind == "text":
+            from app.services.text_analyzer import TextAnalyzer
+            _worker_state[kind] = TextAnalyzer()
+    return _worker_state[kind]
+
+
+def process_file(kind: str, path: Path, output: Path, options: Dict) -> Dict:
+    """
+    Procesa un archivo y escribe la salida y su sidecar.
+
+    Returns:
+        Diccionario con el resultado (para el informe)
+    """
+    start_time = time.perf_counter()
+    sidecar = {
+        "source": str(path),
+        "output": str(output),
+        "type": kind,
+    }
+
+    if kind == "image":
+        processor = _get_processor("image")
+        image = processor.decode_image(path.read_bytes())
+        result, metadata = processor.process_image(
+            image,
+            detect_faces=options["detect_faces"],
+            detect_plates=options["detect_plates"],
+            anonymization_method=options["method"],
+            confidence_threshold=options["confidence"],
+            blur_kernel_size=options["blur_kernel_size"],
+            pixelate_blocks=options["pixelate_blocks"]
+        )
+        encoded, _ = processor.encode_image(result, output.name)
+        _write_atomic(output, encoded)
+
+        sidecar["detections"] = {
+            key: [list(det) for det in dets]
+            for key, dets in metadata["detections"].items()
+        }
+        sidecar["image_size"] = metadata["image_size"]
+        detections_count = metadata["total_detections"]
+
+    elif kind == "video":
+        processor = _get_processor("video")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        tmp = output.with_name(f".{output.stem}.partial{output.suffix}")
+        job_dir = job_dir_for(output)
+        if options["force"]:
+            shutil.rmtree(job_dir, ignore_errors=True)
+        result = processor.process_video_resumable(
+            video_path=str(path),
+            output_path=str(tmp),
+            job_dir=str(job_dir),
+            detect_faces=options["detect_faces"],
+            detect_plates=options["detect_plates"],
+            anonymization_method=options["method"],
+            blur_kernel_size=options["blur_kernel_size"],
+            pixelate_blocks=options["pixelate_blocks"],
+            segment_seconds=options["segment_seconds"]
+        )
+        os.replace(tmp, output)
+
+        sidecar["stats"] = result["stats"]
+        sidecar["segments"] = result["segments"]
+        sidecar["segments_resumed"] = result["segments_resumed"]
+        sidecar["video_info"] = result["video_info"]
+        detections_count = result["stats"]["total_faces"] + result["stats"]["total_plates"]
+
+    else:
+        analyzer = _get_processor("text")
+        text = path.read_text(encoding="utf-8", errors="replace")
+        result = analyzer.anonymize_text(
+            text,
+            method=options["text_method"],
+            mode=options["text_mode"]
+        )
+        _write_atomic(output, result["anonymized_text"].encode("utf-8"))
+
+        sidecar["detections"] = result["detections"]
+        sidecar["stats"] = result["stats"]
+        sidecar["mode"] = result["mode"]
+        detections_count = result["total_detections"]
+
+    elapsed = time.perf_counter() - start_time
+    sidecar["processing_time_s"] = round(elapsed, 4)
+
+    # El sidecar se escribe al final: su existencia marca el archivo como completo
+    _write_atomic(
+        sidecar_path_for(output),
+        json.dumps(sidecar, ensure_ascii=False, indent=2).encode("utf-8")
+    )
+
+    return {
+        "type": kind,
+        "bytes": path.stat().st_size,
+        "detections": detections_count,
+        "seconds": elapsed,
+    }
+
+
+def _process_job(job: Tuple[str, Path, Path], options: Dict, profiled: bool = False) -> Dict:
+    """Envoltorio para el pool: captura errores para no abortar el lote."""
+    kind, path, output = job
+    try:
+        if profiled:
+            from app.core.profiling import profile
+
+            with profile(f"batch_{kind}_{path.stem}", output_dir=options["profile_dir"]):
+                return {"ok": True, "path": str(path), **process_file(kind, path, output, options)}
+        return {"ok": True, "path": str(path), **process_file(kind, path, output, options)}
+    except Exception as e:
+        return {"ok": False, "path": str(path), "type": kind, "error": str(e)}
+
+
+def format_throughput(done: int, total_bytes: int, elapsed: float) -> str:
+    """Formatea el throughput acumulado."""
+    elapsed = max(elapsed, 1e-9)
+    return (
+        f"{done / elapsed:.2f} archivos/s, "
+        f"{total_bytes / elapsed / (1024 * 1024):.2f} MB/s"
+    )
+
+
+def run(args: argparse.Namespace) -> int:
+    """Ejecuta el lote completo. Devuelve el codigo de salida."""
+    input_root = args.input.resolve()
+    output_root = args.output.resolve()
+
+    if not input_root.is_dir():
+        print(f"[ERROR] No existe el directorio de entrada: {input_root}")
+        return 2
+
+    kinds = [kind for kind in ("image", "video", "text") if kind not in args.skip]
+    jobs, skipped = collect_jobs(input_root, output_root, kinds, args.force)
+
+    workers = args.workers or os.cpu_count() or 1
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+
+    print("=" * 60)
+    print("ANONIMIZACION POR LOTES")
+    print("=" * 60)
+    print(f"[INFO] Entrada: {input_root}")
+    print(f"[INFO] Salida: {output_root}")
+    print(f"[INFO] Pendientes: {len(jobs)} (ya completados: {skipped})")
+    print(f"[INFO] Workers: {workers} x {threads_per_worker} hilos")
+
+    if not jobs:
+        print("[OK] Nada que procesar")
+        return 0
+
+    options = {
+        "detect_faces": not args.no_faces,
+        "detect_plates": not args.no_plates,
+        "method": args.method,
+        "confidence": args.confidence,
+        "blur_kernel_size": args.blur_kernel_size,
+        "pixelate_blocks": args.pixelate_blocks,
+        "text_mode": args.text_mode,
+        "text_method": args.text_method,
+        "profile_dir": args.profile_dir,
+        "segment_seconds": args.segment_seconds,
+        "force": args.force,
+    }
+
+    start_time = time.perf_counter()
+    done = 0
+    failed = 0
+    total_bytes = 0
+    per_type: Dict[str, Dict[str, float]] = {}
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(threads_per_worker,)
+    ) as pool:
+        # Con --profile-dir se perfila uno de cada --profile-every archivos
+        futures = [
+            pool.submit(
+                _process_job, job, options,
+                args.profile_dir is not None and index % args.profile_every == 0
+            )
+            for index, job in enumerate(jobs)
+        ]
+
+        for future in as_completed(futures):
+            result = future.result()
+
+            if not result["ok"]:
+                failed += 1
+                print(f"[ERROR] {result['path']}: {result['error']}")
+                continue
+
+            done += 1
+            total_bytes += result["bytes"]
+            stats = per_type.setdefault(
+                result["type"], {"files": 0, "bytes": 0, "seconds": 0.0, "detections": 0}
+            )
+            stats["files"] += 1
+            stats["bytes"] += result["bytes"]
+            stats["seconds"] += result["seconds"]
+            stats["detections"] += result["detections"]
+
+            if done % args.report_every == 0:
+                elapsed = time.perf_counter() - start_time
+                print(
+                    f"  {done}/{len(jobs)} procesados - "
+                    f"{format_throughput(done, total_bytes, elapsed)}"
+                )
+
+    elapsed = time.perf_counter() - start_time
+
+    print("=" * 60)
+    print("[OK] LOTE COMPLETADO" if failed == 0 else "[INFO] LOTE COMPLETADO CON ERRORES")
+    print("=" * 60)
+    print(f"  Procesados: {done}  Errores: {failed}  Omitidos: {skipped}")
+    print(f"  Tiempo total: {elapsed:.2f}s")
+    print(f"  Throughput: {format_throughput(done, total_bytes, elapsed)}")
+    for kind, stats in sorted(per_type.items()):
+        mean_ms = stats["seconds"] / stats["files"] * 1000
+        print(
+            f"  - {kind}: {int(stats['files'])} archivos, "
+            f"{int(stats['detections'])} detecciones, {mean_ms:.1f} ms/archivo"
+        )
+
+    return 1 if failed else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Construye el parser de argumentos de la CLI."""
+    parser = argparse.ArgumentParser(
+        description='Anonimiza recursivamente un directorio sin pasar por la API'
+    )
+    parser.add_argument('input', type=Path, help='Directorio de entrada')
+    parser.add_argument('output', type=Path, help='Directorio de salida')
+    parser.add_argument(
+        '--workers', type=int, default=None,
+        help='Numero de procesos (por defecto, numero de nucleos)'
+    )
+    parser.add_argument(
+        '--method', choices=['blur', 'pixelate', 'mask'], default='blur',
+        help='Metodo de anonimizacion visual'
+    )
+    parser.add_argument('--confidence', type=float, default=0.25, help='Umbral de confianza')
+    parser.add_argument('--blur-kernel-size', type=int, default=99, help='Kernel del blur')
+    parser.add_argument('--pixelate-blocks', type=int, default=10, help='Bloques de pixelacion')
+    parser.add_argument('--no-faces', action='store_true', help='No detectar rostros')
+    parser.add_argument('--no-plates', action='store_true', help='No detectar matriculas')
+    parser.add_argument(
+        '--text-mode', choices=['regex', 'llm', 'both'], default='regex',
+        help='Modo de deteccion de texto (regex funciona sin conexion)'
+    )
+    parser.add_argument(
+        '--text-method', choices=['replace', 'mask', 'remove'], default='replace',
+        help='Metodo de anonimizacion de texto'
+    )
+    parser.add_argument(
+        '--skip', nargs='*', choices=['image', 'video', 'text'], default=[],
+        help='Tipos de archivo a omitir'
+    )
+    parser.add_argument(
+        '--force', action='store_true',
+        help='Reprocesar archivos aunque ya exista su salida'
+    )
+    parser.add_argument(
+        '--segment-seconds', type=float, default=None,
+        help='Duracion de los segmentos con checkpoint (por defecto, VIDEO_SEGMENT_SECONDS)'
+    )
+    parser.add_argument(
+        '--report-every', type=int, default=50,
+        help='Mostrar throughput cada N archivos'
+    )
+    parser.add_argument(
+        '--profile-dir', type=Path, default=None,
+        help='Guardar perfiles por muestreo (speedscope) de algunos archivos en este directorio'
+    )
+    parser.add_argument(
+        '--profile-every', type=int, default=100,
+        help='Con --profile-dir, perfilar uno de cada N archivos'
+    )
+    return parser
+
+
+def main():
+    """Funcion principal."""
+    args = build_parser().parse_args()
+    sys.exit(run(args))
+
+
+if __name__ == '__main__':
+    main()
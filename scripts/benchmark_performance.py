@@ -2,6 +2,10 @@
 Script de Benchmark de Rendimiento
 Mide tiempos de procesamiento para imágenes, videos y texto.
 Genera tablas y gráficas con los resultados.
+
+Mide peticiones HTTP contra un servidor en marcha usando el dataset de test.
+Para medir los servicios en proceso, con entradas sinteticas y resultados
+en JSON comparables entre ejecuciones, usar scripts/benchmark_suite.py.
 """
 
 import os
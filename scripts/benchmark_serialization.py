@@ -0,0 +1,226 @@
+"""
+Benchmark de serializacion de respuestas.
+
+Compara el coste de codificar las respuestas de /api/detect y
+/api/analyze-text con los modelos actuales (Pydantic + JSONResponse)
+frente a los formatos alternativos seleccionables con la cabecera Accept
+(JSON rapido, compacto y NDJSON). Solo mide la serializacion: las
+detecciones son sinteticas y no se carga ningun modelo.
+
+Uso:
+    python scripts/benchmark_serialization.py
+    python scripts/benchmark_serialization.py --detections 10 100 1000 --repeat 500
+    python scripts/benchmark_serialization.py --profile-dir profiles
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Añadir backend al path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from fastapi.responses import JSONResponse
+
+from app.core.profiling import profile
+from app.core.serialization import (
+    FAST_JSON_MEDIA_TYPE, PACKED_MEDIA_TYPE, NDJSON_MEDIA_TYPE,
+    FastJSONResponse, box_dicts, orjson, render_boxes, render_records
+)
+from app.api.endpoints.text import TEXT_DETECTION_FIELDS
+from app.schemas.detection import BoundingBox, DetectionResponse
+
+
+def synthetic_boxes(count: int) -> list:
+    """Genera detecciones (x1, y1, x2, y2, confidence) aleatorias."""
+    boxes = []
+    for _ in range(count):
+        x1 = random.randint(0, 1800)
+        y1 = random.randint(0, 1000)
+        x2 = x1 + random.randint(10, 120)
+        y2 = y1 + random.randint(10, 120)
+        boxes.append((x1, y1, x2, y2, random.random()))
+    return boxes
+
+
+def synthetic_text(count: int) -> tuple:
+    """Genera un texto con `count` emails y sus detecciones."""
+    parts = []
+    detections = []
+    offset = 0
+    for i in range(count):
+        filler = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. "
+        email = f"usuario{i}@example.com"
+        start = offset + len(filler)
+        detections.append({
+            'type': 'email',
+            'type_name': 'Correo electrónico',
+            'text': email,
+            'start': start,
+            'end': start + len(email),
+            'confidence': 0.95,
+            'source': 'regex'
+        })
+        parts.append(filler + email + " ")
+        offset += len(filler) + len(email) + 1
+    return "".join(parts), detections
+
+
+# Bucle de eventos reutilizado para leer las respuestas en streaming
+_loop = asyncio.new_event_loop()
+
+
+async def _collect(response) -> bytes:
+    """Lee el cuerpo completo de una StreamingResponse."""
+    chunks = []
+    async for chunk in response.body_iterator:
+        chunks.append(chunk if isinstance(chunk, bytes) else chunk.encode())
+    return b"".join(chunks)
+
+
+def body_of(response) -> bytes:
+    """Cuerpo de una respuesta como bytes."""
+    if hasattr(response, "body_iterator"):
+        return _loop.run_until_complete(_collect(response))
+    return bytes(response.body)
+
+
+def measure(fn, repeat: int) -> dict:
+    """Ejecuta fn `repeat` veces y devuelve latencias y tamano de salida."""
+    fn()  # Calentamiento
+    times = []
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(body_of(fn()))
+        times.append((time.perf_counter() - start) * 1e6)
+    times.sort()
+    return {
+        "p50_us": round(statistics.median(times), 1),
+        "p95_us": round(times[int(len(times) * 0.95) - 1], 1),
+        "bytes": size,
+    }
+
+
+def detect_cases(boxes: list) -> dict:
+    """Variantes de codificacion de la respuesta de /api/detect."""
+    faces, plates = boxes[::2], boxes[1::2]
+    summary = {"total_detections": len(boxes), "processing_time_ms": 12.3, "adaptive": None}
+    groups = {"face": faces, "plate": plates}
+
+    def pydantic_model():
+        model = DetectionResponse(
+            faces=[
+                BoundingBox(x1=a, y1=b, x2=c, y2=d, confidence=e, class_name="face")
+                for a, b, c, d, e in faces
+            ],
+            plates=[
+                BoundingBox(x1=a, y1=b, x2=c, y2=d, confidence=e, class_name="plate")
+                for a, b, c, d, e in plates
+            ],
+            **summary
+        )
+        return JSONResponse(model.model_dump(mode="json"))
+
+    return {
+        "pydantic": pydantic_model,
+        "fast_json": lambda: FastJSONResponse({
+            "faces": box_dicts(faces, "face"), "plates": box_dicts(plates, "plate"), **summary
+        }),
+        "packed": lambda: render_boxes(PACKED_MEDIA_TYPE, groups, summary),
+        "ndjson": lambda: render_boxes(NDJSON_MEDIA_TYPE, groups, summary),
+    }
+
+
+def text_cases(text: str, detections: list) -> dict:
+    """Variantes de codificacion de la respuesta de /api/analyze-text."""
+    summary = {
+        "success": True,
+        "original_text": text,
+        "anonymized_text": text,
+        "total_detections": len(detections),
+        "stats": {"email": len(detections)},
+        "method": "replace",
+        "mode": "regex",
+        "value_map": {},
+        "processing_time_ms": 12.3
+    }
+    omitted = {k: v for k, v in summary.items() if k != "original_text"}
+    fields = TEXT_DETECTION_FIELDS
+
+    return {
+        "json_response": lambda: JSONResponse({**summary, "detections": detections}),
+        "fast_json": lambda: render_records(FAST_JSON_MEDIA_TYPE, detections, fields, summary),
+        "fast_json_omit_input": lambda: render_records(
+            FAST_JSON_MEDIA_TYPE, detections, fields, omitted
+        ),
+        "packed_omit_input": lambda: render_records(PACKED_MEDIA_TYPE, detections, fields, omitted),
+        "ndjson_omit_input": lambda: render_records(NDJSON_MEDIA_TYPE, detections, fields, omitted),
+    }
+
+
+def print_table(title: str, rows: dict):
+    """Imprime una tabla de resultados con la mejora frente a la primera fila."""
+    print(f"\n{title}")
+    print("-" * 72)
+    print(f"  {'formato':<24} {'p50 (us)':>10} {'p95 (us)':>10} {'bytes':>10} {'speedup':>8}")
+    baseline = next(iter(rows.values()))["p50_us"]
+    for name, row in rows.items():
+        speedup = baseline / row["p50_us"] if row["p50_us"] else 0
+        print(
+            f"  {name:<24} {row['p50_us']:>10.1f} {row['p95_us']:>10.1f} "
+            f"{row['bytes']:>10} {speedup:>7.1f}x"
+        )
+
+
+def main():
+    """Funcion principal."""
+    parser = argparse.ArgumentParser(description="Benchmark de serializacion de respuestas")
+    parser.add_argument("--detections", type=int, nargs="+", default=[10, 100, 1000],
+                        help="Numero de detecciones por respuesta")
+    parser.add_argument("--repeat", type=int, default=200, help="Repeticiones por caso")
+    parser.add_argument("--output", type=Path, default=None, help="Guardar resultados en JSON")
+    parser.add_argument("--profile-dir", type=Path, default=None,
+                        help="Guardar un perfil por muestreo (speedscope) de cada caso")
+    args = parser.parse_args()
+
+    random.seed(0)
+    serializer = f"orjson {orjson.__version__}" if orjson else "json (orjson no instalado)"
+    print(f"Serializador rapido: {serializer}")
+
+    def run_case(name: str, fn) -> dict:
+        if args.profile_dir is None:
+            return measure(fn, args.repeat)
+        with profile(name, output_dir=args.profile_dir):
+            return measure(fn, args.repeat)
+
+    results = {}
+    for count in args.detections:
+        detect_rows = {
+            name: run_case(f"detect_{name}_{count}", fn)
+            for name, fn in detect_cases(synthetic_boxes(count)).items()
+        }
+        print_table(f"/api/detect - {count} detecciones", detect_rows)
+
+        text, detections = synthetic_text(count)
+        text_rows = {
+            name: run_case(f"text_{name}_{count}", fn)
+            for name, fn in text_cases(text, detections).items()
+        }
+        print_table(f"/api/analyze-text - {count} detecciones ({len(text)} caracteres)", text_rows)
+
+        results[count] = {"detect": detect_rows, "analyze_text": text_rows}
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"\n[OK] Resultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+"""
+Suite de benchmarks en proceso (sin servidor HTTP).
+
+Ejecuta directamente Anonymizer, ImageProcessor, VideoProcessor y
+TextAnalyzer sobre entradas sinteticas y deterministas (imagenes generadas,
+videos al estilo de create_test_video.py y texto con PII generado), sin
+depender del dataset ni de un servidor en marcha.
+
+Para cada caso informa del throughput y de la latencia p50/p95/p99, y
+guarda los resultados (incluidas las muestras individuales) en JSON para
+poder comparar ejecuciones con scripts/compare_benchmarks.py.
+
+Grupos de casos:
+- anonymizer: blur/pixelate/mask sobre regiones fijas
+- codec: decodificacion y codificacion JPEG
+- image: pipeline completo de imagen (deteccion + anonimizacion)
+- video: procesamiento de un video sintetico (frames/s)
+- text: deteccion y anonimizacion de texto en modo regex
+
+Uso:
+    python scripts/benchmark_suite.py
+    python scripts/benchmark_suite.py --groups anonymizer codec text --repeat 50
+    python scripts/benchmark_suite.py --quick --output resultados.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+# Añadir backend al path (y scripts/ para reutilizar create_test_video)
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from create_test_video import render_frame
+
+
+OUTPUT_DIR = Path(__file__).parent.parent / "tfm" / "benchmark_results"
+
+GROUPS = ("anonymizer", "codec", "image", "video", "text")
+
+IMAGE_SIZES = {
+    "480p": (640, 480),
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+}
+
+TEXT_SIZES_KB = (1, 10, 100)
+
+# Letras de control del DNI
+_DNI_LETTERS = "TRWAGMYFPDXBNJZSQVHLCKE"
+
+_NAMES = ["Carlos", "Lucia", "Javier", "Marta", "Pablo", "Elena", "Sergio", "Ana"]
+_SURNAMES = ["Garcia", "Fernandez", "Lopez", "Martinez", "Sanchez", "Perez", "Gomez", "Ruiz"]
+_CITIES = ["Madrid", "Valencia", "Sevilla", "Bilbao", "Zaragoza", "Malaga"]
+
+
+# ===== Entradas sinteticas =====
+
+def synthetic_image(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """
+    Genera una imagen deterministica con ruido, "caras" y "matriculas".
+
+    Args:
+        width: Ancho de la imagen
+        height: Alto de la imagen
+        seed: Semilla del generador
+
+    Returns:
+        Imagen BGR
+    """
+    rng = np.random.default_rng(seed)
+    image = render_frame(0, width, height, 1)
+    noise = rng.integers(0, 32, size=image.shape, dtype=np.uint8)
+    return cv2.add(image, noise)
+
+
+def synthetic_boxes(width: int, height: int, count: int = 8, seed: int = 0) -> List[tuple]:
+    """
+    Genera regiones deterministicas dentro de la imagen.
+
+    Returns:
+        Lista de boxes (x1, y1, x2, y2)
+    """
+    rng = np.random.default_rng(seed)
+    boxes = []
+    for _ in range(count):
+        w = int(rng.integers(width // 20, width // 6))
+        h = int(rng.integers(height // 20, height // 6))
+        x1 = int(rng.integers(0, width - w))
+        y1 = int(rng.integers(0, height - h))
+        boxes.append((x1, y1, x1 + w, y1 + h))
+    return boxes
+
+
+def synthetic_video(
+    path: Path,
+    frames: int,
+    width: int = 640,
+    height: int = 480,
+    fps: int = 30
+) -> Path:
+    """
+    Escribe un video sintetico con los frames de create_test_video.py.
+
+    Returns:
+        Ruta del video generado
+    """
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    for frame_num in range(frames):
+        writer.write(render_frame(frame_num, width, height, frames))
+    writer.release()
+    return path
+
+
+def synthetic_text(size_kb: int, seed: int = 0) -> str:
+    """
+    Genera texto en castellano con PII (DNI, emails, telefonos, IBAN...).
+
+    Args:
+        size_kb: Tamano aproximado en KB
+        seed: Semilla del generador
+
+    Returns:
+        Texto generado
+    """
+    rng = np.random.default_rng(seed)
+    parts = []
+    length = 0
+    while length < size_kb * 1024:
+        name = _NAMES[rng.integers(len(_NAMES))]
+        surname = _SURNAMES[rng.integers(len(_SURNAMES))]
+        city = _CITIES[rng.integers(len(_CITIES))]
+        number = int(rng.integers(10_000_000, 99_999_999))
+        dni = f"{number}{_DNI_LETTERS[number % 23]}"
+        phone = f"+34 6{rng.integers(10, 99)} {rng.integers(100, 999)} {rng.integers(100, 999)}"
+        iban = "ES91 " + " ".join(f"{rng.integers(0, 9999):04d}" for _ in range(5))
+        sentence = (
+            f"El cliente {name} {surname}, con DNI {dni}, reside en {city}. "
+            f"Puede contactarse en {name.lower()}.{surname.lower()}{number % 1000}@example.com "
+            f"o en el telefono {phone}. Cuenta de cargo: {iban}. "
+            "La solicitud se tramito sin incidencias y queda pendiente de revision.\n"
+        )
+        parts.append(sentence)
+        length += len(sentence)
+    return "".join(parts)
+
+
+# ===== Medicion =====
+
+def summarize(samples_ms: List[float], units_per_call: float, unit: str) -> Dict:
+    """
+    Calcula estadisticas de latencia y throughput.
+
+    Args:
+        samples_ms: Latencias de cada iteracion en milisegundos
+        units_per_call: Unidades procesadas por iteracion (imagenes, frames, KB)
+        unit: Nombre de la unidad
+
+    Returns:
+        Diccionario con las estadisticas y las muestras
+    """
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    total_s = samples.sum() / 1000.0
+    return {
+        "iterations": int(samples.size),
+        "unit": unit,
+        "units_per_call": units_per_call,
+        "throughput": round(units_per_call * samples.size / total_s, 3) if total_s > 0 else 0.0,
+        "mean_ms": round(float(samples.mean()), 4),
+        "stdev_ms": round(float(samples.std(ddof=1)) if samples.size > 1 else 0.0, 4),
+        "min_ms": round(float(samples.min()), 4),
+        "p50_ms": round(float(np.percentile(samples, 50)), 4),
+        "p95_ms": round(float(np.percentile(samples, 95)), 4),
+        "p99_ms": round(float(np.percentile(samples, 99)), 4),
+        "max_ms": round(float(samples.max()), 4),
+        "samples_ms": [round(float(value), 4) for value in samples],
+    }
+
+
+def measure(fn: Callable[[], object], repeat: int, warmup: int) -> List[float]:
+    """
+    Ejecuta fn `warmup` veces sin medir y `repeat` veces midiendo.
+
+    Returns:
+        Latencias en milisegundos
+    """
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+class Case:
+    """Caso de benchmark: funcion a medir y unidades procesadas por llamada."""
+
+    def __init__(self, name: str, group: str, fn: Callable[[], object], units: float, unit: str,
+                 repeat: Optional[int] = None):
+        self.name = name
+        self.group = group
+        self.fn = fn
+        self.units = units
+        self.unit = unit
+        self.repeat = repeat
+
+
+# ===== Casos =====
+
+def anonymizer_cases(sizes: List[str], seed: int) -> List[Case]:
+    """Casos de Anonymizer (blur, pixelate, mask) por tamano de imagen."""
+    from app.services.anonymizer import Anonymizer
+
+    anonymizer = Anonymizer()
+    cases = []
+    for size in sizes:
+        width, height = IMAGE_SIZES[size]
+        image = synthetic_image(width, height, seed)
+        boxes = synthetic_boxes(width, height, seed=seed)
+        for method in ("blur", "pixelate", "mask"):
+            cases.append(Case(
+                f"anonymizer.{method}.{size}", "anonymizer",
+                lambda image=image, method=method, boxes=boxes: anonymizer.anonymize(
+                    image, boxes, method=method
+                ),
+                1, "images"
+            ))
+    return cases
+
+
+def codec_cases(sizes: List[str], seed: int) -> List[Case]:
+    """Casos de decodificacion/codificacion JPEG de ImageProcessor."""
+    from app.services.image_processor import ImageProcessor
+
+    cases = []
+    for size in sizes:
+        width, height = IMAGE_SIZES[size]
+        image = synthetic_image(width, height, seed)
+        data = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+        cases.append(Case(
+            f"codec.decode.{size}", "codec",
+            lambda data=data: ImageProcessor.decode_image(data), 1, "images"
+        ))
+        cases.append(Case(
+            f"codec.encode.{size}", "codec",
+            lambda image=image: ImageProcessor.encode_image_buffer(image, "image.jpg"), 1, "images"
+        ))
+    return cases
+
+
+def image_cases(sizes: List[str], seed: int) -> List[Case]:
+    """Casos del pipeline completo de imagen (requiere los modelos)."""
+    from app.services.image_processor import get_image_processor
+
+    processor = get_image_processor()
+    cases = []
+    for size in sizes:
+        width, height = IMAGE_SIZES[size]
+        image = synthetic_image(width, height, seed)
+        cases.append(Case(
+            f"image.process.{size}", "image",
+            lambda image=image: processor.process_image(image, anonymization_method="blur"),
+            1, "images"
+        ))
+    return cases
+
+
+def video_cases(frames: int, seed: int, workdir: Path) -> List[Case]:
+    """Caso de procesamiento de video sintetico (requiere los modelos)."""
+    from app.services.video_processor import VideoProcessor
+
+    processor = VideoProcessor()
+    video_path = synthetic_video(workdir / "synthetic.mp4", frames)
+    output_path = workdir / "output.mp4"
+
+    return [Case(
+        f"video.process.480p.{frames}f", "video",
+        lambda: processor.process_video(str(video_path), str(output_path)),
+        frames, "frames", repeat=3
+    )]
+
+
+def text_cases(seed: int) -> List[Case]:
+    """Casos de TextAnalyzer en modo regex por tamano de texto."""
+    from app.services.text_analyzer import TextAnalyzer
+
+    analyzer = TextAnalyzer()
+    cases = []
+    for size_kb in TEXT_SIZES_KB:
+        text = synthetic_text(size_kb, seed)
+        cases.append(Case(
+            f"text.detect.{size_kb}kb", "text",
+            lambda text=text: analyzer.detect_sensitive_data(text, mode="regex"), size_kb, "KB"
+        ))
+        cases.append(Case(
+            f"text.anonymize.{size_kb}kb", "text",
+            lambda text=text: analyzer.anonymize_text(text, method="replace", mode="regex"),
+            size_kb, "KB"
+        ))
+    return cases
+
+
+# ===== Informe =====
+
+def environment_info() -> Dict:
+    """Informacion del entorno para poder interpretar y comparar resultados."""
+    from app.core.config import settings
+
+    info = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "inference": {
+            "device": settings.INFERENCE_DEVICE,
+            "imgsz": settings.INFERENCE_IMGSZ,
+            "half": settings.INFERENCE_HALF,
+        },
+    }
+
+    try:
+        import torch
+        info["torch"] = torch.__version__
+    except ImportError:
+        pass
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5, cwd=Path(__file__).parent
+        )
+        if commit.returncode == 0:
+            info["git_commit"] = commit.stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        pass
+
+    return info
+
+
+def print_result(name: str, result: Dict) -> None:
+    """Imprime una fila de resultados."""
+    print(
+        f"  {name:<32} {result['p50_ms']:>10.2f} {result['p95_ms']:>10.2f} "
+        f"{result['p99_ms']:>10.2f} {result['throughput']:>12.2f} {result['unit']}/s"
+    )
+
+
+def main():
+    """Funcion principal."""
+    parser = argparse.ArgumentParser(description="Suite de benchmarks en proceso (sin servidor)")
+    parser.add_argument("--groups", nargs="+", choices=GROUPS, default=list(GROUPS),
+                        help="Grupos de casos a ejecutar")
+    parser.add_argument("--sizes", nargs="+", choices=list(IMAGE_SIZES), default=list(IMAGE_SIZES),
+                        help="Tamanos de imagen")
+    parser.add_argument("--repeat", type=int, default=30, help="Iteraciones medidas por caso")
+    parser.add_argument("--warmup", type=int, default=3,
+                        help="Iteraciones de calentamiento por caso")
+    parser.add_argument("--video-frames", type=int, default=60, help="Frames del video sintetico")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de las entradas sinteticas")
+    parser.add_argument("--quick", action="store_true",
+                        help="Ejecucion rapida (480p, 10 iteraciones, video de 15 frames)")
+    parser.add_argument("--output", type=Path, default=None,
+                        help="Fichero JSON de resultados (por defecto en tfm/benchmark_results)")
+    parser.add_argument("--profile-dir", type=Path, default=None,
+                        help="Guardar un perfil por muestreo (speedscope) de cada caso")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.sizes = ["480p"]
+        args.repeat = min(args.repeat, 10)
+        args.warmup = min(args.warmup, 1)
+        args.video_frames = min(args.video_frames, 15)
+
+    print("=" * 60)
+    print("SUITE DE BENCHMARKS (EN PROCESO)")
+    print("=" * 60)
+
+    results: Dict[str, Dict] = {}
+    skipped: Dict[str, str] = {}
+
+    with tempfile.TemporaryDirectory(prefix="bench_") as tmp_dir:
+        builders = {
+            "anonymizer": lambda: anonymizer_cases(args.sizes, args.seed),
+            "codec": lambda: codec_cases(args.sizes, args.seed),
+            "image": lambda: image_cases(args.sizes, args.seed),
+            "video": lambda: video_cases(args.video_frames, args.seed, Path(tmp_dir)),
+            "text": lambda: text_cases(args.seed),
+        }
+
+        for group in args.groups:
+            try:
+                cases = builders[group]()
+            except Exception as e:
+                # Los grupos image/video requieren los modelos entrenados
+                skipped[group] = str(e)
+                print(f"\n[WARN] Grupo '{group}' omitido: {e}")
+                continue
+
+            print(f"\n{group}")
+            print("-" * 80)
+            print(
+                f"  {'caso':<32} {'p50 (ms)':>10} {'p95 (ms)':>10} {'p99 (ms)':>10} "
+                f"{'throughput':>12}"
+            )
+
+            for case in cases:
+                repeat = min(args.repeat, case.repeat) if case.repeat else args.repeat
+                warmup = min(args.warmup, 1) if case.repeat else args.warmup
+
+                if args.profile_dir is not None:
+                    from app.core.profiling import profile
+
+                    with profile(case.name, output_dir=args.profile_dir):
+                        samples = measure(case.fn, repeat, warmup)
+                else:
+                    samples = measure(case.fn, repeat, warmup)
+
+                results[case.name] = {
+                    "group": case.group, **summarize(samples, case.units, case.unit)
+                }
+                print_result(case.name, results[case.name])
+
+    report = {
+        "environment": environment_info(),
+        "config": {
+            "groups": args.groups,
+            "sizes": args.sizes,
+            "repeat": args.repeat,
+            "warmup": args.warmup,
+            "video_frames": args.video_frames,
+            "seed": args.seed,
+        },
+        "skipped": skipped,
+        "results": results,
+    }
+
+    output = args.output or OUTPUT_DIR / f"suite_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"\n[OK] Resultados guardados en {output}")
+
+
+if __name__ == "__main__":
+    main()
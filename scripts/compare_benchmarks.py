@@ -0,0 +1,319 @@
+"""
+Comparacion de ejecuciones de benchmark (control de regresiones).
+
+Carga dos conjuntos de resultados (base y candidato), calcula por benchmark
+la variacion de la latencia con un intervalo de confianza por bootstrap y
+termina con codigo distinto de cero si alguna regresion supera la
+tolerancia configurada. Genera una tabla Markdown con el resumen.
+
+Formatos de entrada admitidos:
+- JSON de scripts/benchmark_suite.py (muestras en results[*].samples_ms)
+- benchmark_raw_data.json de scripts/benchmark_performance.py (tiempos del
+  servidor por imagen y por texto)
+
+Se pueden pasar varios ficheros por lado (ejecuciones repetidas): sus
+muestras se agregan antes de comparar, lo que reduce el ruido.
+
+Una regresion solo se declara cuando todo el intervalo de confianza del
+cociente candidato/base queda por encima de 1 + tolerancia; si el intervalo
+incluye la tolerancia el cambio se considera ruido.
+
+Uso:
+    python scripts/compare_benchmarks.py --baseline base.json --candidate nuevo.json
+    python scripts/compare_benchmarks.py --baseline base1.json base2.json \\
+        --candidate nuevo1.json nuevo2.json --tolerance 0.05 \\
+        --tolerance-for "video.*=0.15" --markdown resumen.md
+
+Codigos de salida: 0 sin regresiones, 1 con regresiones, 2 error de entrada.
+"""
+
+import argparse
+import fnmatch
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+METRICS = ("p50", "mean", "p95")
+
+STATUS_REGRESSION = "regresion"
+STATUS_IMPROVEMENT = "mejora"
+STATUS_NOISE = "sin cambios"
+STATUS_MISSING = "sin datos"
+
+
+# ===== Carga de resultados =====
+
+def _suite_samples(data: dict) -> Dict[str, List[float]]:
+    """Muestras de un JSON de benchmark_suite.py."""
+    return {
+        name: list(result.get("samples_ms", []))
+        for name, result in data.get("results", {}).items()
+    }
+
+
+def _performance_samples(data: dict) -> Dict[str, List[float]]:
+    """Muestras de un benchmark_raw_data.json de benchmark_performance.py."""
+    samples: Dict[str, List[float]] = {}
+
+    for category, results in (data.get("image_results") or {}).items():
+        # La primera imagen incluye la carga del modelo
+        times = [r.get("server_time_ms", 0) for r in results[1:] if r.get("success")]
+        samples[f"http.image.{category}"] = [t for t in times if t > 0]
+
+    for mode, results in (data.get("text_results") or {}).items():
+        for result in results:
+            if result.get("success"):
+                name = f"http.text.{mode}.{result['text_length']}chars"
+                samples.setdefault(name, []).append(result["processing_time_ms"])
+
+    return samples
+
+
+def load_samples(paths: List[Path]) -> Dict[str, List[float]]:
+    """
+    Carga y agrega las muestras de uno o varios ficheros de resultados.
+
+    Args:
+        paths: Ficheros JSON (ejecuciones repetidas del mismo lado)
+
+    Returns:
+        Latencias en ms por benchmark
+
+    Raises:
+        ValueError: Si algun fichero no tiene un formato reconocido
+    """
+    merged: Dict[str, List[float]] = {}
+
+    for path in paths:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        if "results" in data:
+            samples = _suite_samples(data)
+        elif "image_results" in data:
+            samples = _performance_samples(data)
+        else:
+            raise ValueError(f"Formato de resultados no reconocido: {path}")
+
+        for name, values in samples.items():
+            merged.setdefault(name, []).extend(values)
+
+    return {name: values for name, values in merged.items() if values}
+
+
+# ===== Estadistica =====
+
+def statistic(values: np.ndarray, metric: str, axis: Optional[int] = None) -> np.ndarray:
+    """Calcula la metrica (p50, mean o p95) sobre el eje indicado."""
+    if metric == "mean":
+        return values.mean(axis=axis)
+    return np.percentile(values, 95 if metric == "p95" else 50, axis=axis)
+
+
+def bootstrap_ratio(
+    baseline: List[float],
+    candidate: List[float],
+    metric: str = "p50",
+    iterations: int = 2000,
+    confidence: float = 0.95,
+    seed: int = 0
+) -> Tuple[float, float, float]:
+    """
+    Cociente candidato/base de la metrica con intervalo de confianza bootstrap.
+
+    Args:
+        baseline: Muestras de la base (ms)
+        candidate: Muestras del candidato (ms)
+        metric: Metrica a comparar
+        iterations: Remuestreos bootstrap
+        confidence: Nivel de confianza del intervalo
+        seed: Semilla (resultados reproducibles)
+
+    Returns:
+        Tupla (cociente, limite inferior, limite superior)
+    """
+    base = np.asarray(baseline, dtype=np.float64)
+    cand = np.asarray(candidate, dtype=np.float64)
+    ratio = float(statistic(cand, metric) / statistic(base, metric))
+
+    rng = np.random.default_rng(seed)
+    base_boot = statistic(rng.choice(base, size=(iterations, base.size)), metric, axis=1)
+    cand_boot = statistic(rng.choice(cand, size=(iterations, cand.size)), metric, axis=1)
+    ratios = cand_boot / base_boot
+
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(ratios, [alpha, 1 - alpha])
+    return ratio, float(low), float(high)
+
+
+def tolerance_for(name: str, default: float, overrides: List[Tuple[str, float]]) -> float:
+    """Tolerancia de un benchmark (la ultima regla que coincide gana)."""
+    tolerance = default
+    for pattern, value in overrides:
+        if fnmatch.fnmatch(name, pattern):
+            tolerance = value
+    return tolerance
+
+
+def compare(
+    baseline: Dict[str, List[float]],
+    candidate: Dict[str, List[float]],
+    metric: str,
+    tolerance: float,
+    overrides: List[Tuple[str, float]],
+    confidence: float = 0.95
+) -> List[Dict]:
+    """
+    Compara base y candidato benchmark a benchmark.
+
+    Returns:
+        Una fila por benchmark con metricas, cociente, intervalo y estado
+    """
+    rows = []
+    for name in sorted(set(baseline) | set(candidate)):
+        row = {"name": name, "tolerance": tolerance_for(name, tolerance, overrides)}
+
+        if name not in baseline or name not in candidate:
+            row["status"] = STATUS_MISSING
+            rows.append(row)
+            continue
+
+        ratio, low, high = bootstrap_ratio(
+            baseline[name], candidate[name], metric, confidence=confidence
+        )
+        row.update({
+            "baseline": float(statistic(np.asarray(baseline[name]), metric)),
+            "candidate": float(statistic(np.asarray(candidate[name]), metric)),
+            "baseline_n": len(baseline[name]),
+            "candidate_n": len(candidate[name]),
+            "ratio": ratio,
+            "ci_low": low,
+            "ci_high": high,
+        })
+
+        if low > 1 + row["tolerance"]:
+            row["status"] = STATUS_REGRESSION
+        elif high < 1 - row["tolerance"]:
+            row["status"] = STATUS_IMPROVEMENT
+        else:
+            row["status"] = STATUS_NOISE
+        rows.append(row)
+
+    return rows
+
+
+# ===== Informe =====
+
+def markdown_table(rows: List[Dict], metric: str, confidence: float) -> str:
+    """
+    Genera la tabla Markdown del resumen.
+
+    Args:
+        rows: Filas de compare()
+        metric: Metrica comparada
+        confidence: Nivel de confianza del intervalo
+
+    Returns:
+        Texto Markdown
+    """
+    icons = {
+        STATUS_REGRESSION: "🔴",
+        STATUS_IMPROVEMENT: "🟢",
+        STATUS_NOISE: "⚪",
+        STATUS_MISSING: "⚠️",
+    }
+    regressions = sum(1 for row in rows if row["status"] == STATUS_REGRESSION)
+    improvements = sum(1 for row in rows if row["status"] == STATUS_IMPROVEMENT)
+
+    lines = [
+        "## Comparacion de benchmarks",
+        "",
+        f"Metrica: **{metric}** · IC {confidence:.0%} por bootstrap · "
+        f"{regressions} regresiones, {improvements} mejoras, {len(rows)} benchmarks",
+        "",
+        f"| Benchmark | Base {metric} (ms) | Nuevo {metric} (ms) "
+        "| Delta | IC | Tolerancia | Estado |",
+        "|-----------|------------------:|-------------------:|------:|----|-----------:|--------|",
+    ]
+
+    for row in rows:
+        if row["status"] == STATUS_MISSING:
+            lines.append(
+                f"| `{row['name']}` | - | - | - | - | ±{row['tolerance']:.0%} | "
+                f"{icons[row['status']]} {row['status']} |"
+            )
+            continue
+
+        lines.append(
+            f"| `{row['name']}` | {row['baseline']:.2f} | {row['candidate']:.2f} | "
+            f"{(row['ratio'] - 1):+.1%} | "
+            f"[{(row['ci_low'] - 1):+.1%}, {(row['ci_high'] - 1):+.1%}] | "
+            f"±{row['tolerance']:.0%} | {icons[row['status']]} {row['status']} |"
+        )
+
+    return "\n".join(lines) + "\n"
+
+
+def parse_override(value: str) -> Tuple[str, float]:
+    """Convierte 'patron=tolerancia' en tupla."""
+    pattern, _, tolerance = value.rpartition("=")
+    if not pattern:
+        raise argparse.ArgumentTypeError(f"Formato esperado 'patron=tolerancia': {value}")
+    return pattern, float(tolerance)
+
+
+def main():
+    """Funcion principal."""
+    parser = argparse.ArgumentParser(description="Compara dos ejecuciones de benchmark")
+    parser.add_argument("--baseline", type=Path, nargs="+", required=True,
+                        help="Resultados de referencia (uno o varios ficheros)")
+    parser.add_argument("--candidate", type=Path, nargs="+", required=True,
+                        help="Resultados del nuevo build (uno o varios ficheros)")
+    parser.add_argument("--metric", choices=METRICS, default="p50", help="Metrica a comparar")
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="Empeoramiento relativo tolerado (0.05 = 5%%)")
+    parser.add_argument("--tolerance-for", type=parse_override, action="append", default=[],
+                        metavar="PATRON=TOL",
+                        help="Tolerancia para los benchmarks que coinciden (glob)")
+    parser.add_argument("--confidence", type=float, default=0.95,
+                        help="Nivel de confianza del intervalo")
+    parser.add_argument("--fail-on-missing", action="store_true",
+                        help="Fallar si un benchmark no esta en ambos lados")
+    parser.add_argument("--markdown", type=Path, default=None, help="Guardar el resumen Markdown")
+    args = parser.parse_args()
+
+    try:
+        baseline = load_samples(args.baseline)
+        candidate = load_samples(args.candidate)
+    except (OSError, ValueError) as e:
+        print(f"[ERROR] {e}")
+        sys.exit(2)
+
+    rows = compare(
+        baseline, candidate, args.metric, args.tolerance, args.tolerance_for, args.confidence
+    )
+    summary = markdown_table(rows, args.metric, args.confidence)
+    print(summary)
+
+    if args.markdown:
+        args.markdown.parent.mkdir(parents=True, exist_ok=True)
+        args.markdown.write_text(summary, encoding="utf-8")
+        print(f"[OK] Resumen guardado en {args.markdown}")
+
+    regressions = [row["name"] for row in rows if row["status"] == STATUS_REGRESSION]
+    missing = [row["name"] for row in rows if row["status"] == STATUS_MISSING]
+
+    if regressions:
+        print(f"[ERROR] Regresiones: {', '.join(regressions)}")
+        sys.exit(1)
+    if missing and args.fail_on_missing:
+        print(f"[ERROR] Benchmarks sin datos en ambos lados: {', '.join(missing)}")
+        sys.exit(1)
+
+    print("[OK] Sin regresiones")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,19 @@
 Script para evaluar el modelo unificado en el conjunto de test.
 
 Genera métricas detalladas por clase y globales.
+
+Con --matrix genera además una matriz precisión/latencia para distintos
+ajustes de inferencia (tamaño de entrada, FP16, dispositivo, hilos de CPU)
+que permite elegir el punto de operación de cada despliegue.
 """
 
 import os
+import time
+import argparse
+from itertools import product
 from pathlib import Path
 from ultralytics import YOLO
+import numpy as np
 import torch
 import json
 
@@ -192,5 +200,197 @@ def evaluate_unified_model():
         traceback.print_exc()
 
 
+def measure_latency(model: YOLO, images: list, imgsz: int, half: bool, device: str,
+                    warmup: int = 3) -> dict:
+    """
+    Mide la latencia de inferencia imagen a imagen.
+
+    Args:
+        model: Modelo YOLO cargado
+        images: Rutas de imágenes de test
+        imgsz: Tamaño de entrada
+        half: Si usar FP16
+        device: Dispositivo de inferencia
+        warmup: Número de inferencias de calentamiento (no se miden)
+
+    Returns:
+        Diccionario con media, p50 y p95 en milisegundos
+    """
+    kwargs = dict(imgsz=imgsz, half=half, device=device, verbose=False)
+
+    for image in images[:warmup]:
+        model(str(image), **kwargs)
+
+    times = []
+    for image in images:
+        start = time.perf_counter()
+        model(str(image), **kwargs)
+        if device.startswith('cuda'):
+            torch.cuda.synchronize()
+        times.append((time.perf_counter() - start) * 1000)
+
+    return {
+        'mean_ms': round(float(np.mean(times)), 2),
+        'p50_ms': round(float(np.percentile(times, 50)), 2),
+        'p95_ms': round(float(np.percentile(times, 95)), 2),
+    }
+
+
+def evaluate_operating_points(imgsz_list: list, half_options: list, devices: list,
+                              cpu_threads: list, latency_images: int = 50):
+    """
+    Genera la matriz precisión/latencia para las combinaciones de ajustes.
+
+    Args:
+        imgsz_list: Tamaños de entrada a evaluar (ej: [320, 480, 640])
+        half_options: Valores de FP16 a evaluar ([False], [True] o ambos)
+        devices: Dispositivos a evaluar (ej: ['cpu', 'cuda:0'])
+        cpu_threads: Hilos de CPU a evaluar (solo aplica a 'cpu'; None = defecto)
+        latency_images: Número de imágenes de test para medir latencia
+    """
+    print("=" * 60)
+    print("MATRIZ PRECISIÓN / LATENCIA DEL MODELO UNIFICADO")
+    print("=" * 60)
+    print()
+
+    project_root = Path(__file__).parent.parent
+    model_path = project_root / 'models' / 'trained' / 'unified_detector.pt'
+    data_yaml = project_root / 'datasets' / 'unified_yolo' / 'data.yaml'
+    test_images_dir = project_root / 'datasets' / 'unified_yolo' / 'images' / 'test'
+    output_dir = project_root / 'models' / 'evaluation'
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    if not model_path.exists():
+        print(f"[ERROR] No se encontró el modelo en {model_path}")
+        print("Ejecuta primero: python scripts/train_unified_model.py")
+        return
+
+    images = sorted(test_images_dir.glob('*.jpg')) + sorted(test_images_dir.glob('*.png'))
+    images = images[:latency_images]
+    if not images:
+        print(f"[ERROR] No hay imágenes de test en {test_images_dir}")
+        return
+
+    rows = []
+
+    for device, imgsz, half, threads in product(devices, imgsz_list, half_options, cpu_threads):
+        if half and not device.startswith('cuda'):
+            continue  # FP16 solo en GPU
+        if threads is not None and device != 'cpu':
+            continue  # Los hilos solo aplican a CPU
+        if device.startswith('cuda') and not torch.cuda.is_available():
+            print(f"[INFO] {device} no disponible, se omite")
+            continue
+
+        if threads is not None:
+            torch.set_num_threads(threads)
+
+        label = f"device={device} imgsz={imgsz} half={half} threads={threads or 'auto'}"
+        print(f"[INFO] Evaluando {label}")
+
+        # Modelo nuevo por combinación: FP16 y dispositivo se fijan al preparar el predictor
+        model = YOLO(str(model_path))
+
+        results = model.val(
+            data=str(data_yaml),
+            split='test',
+            device=device,
+            batch=16,
+            imgsz=imgsz,
+            half=half,
+            plots=False,
+            verbose=False
+        )
+        box = results.box
+        precision = float(box.mp)
+        recall = float(box.mr)
+        f1 = 2 * precision * recall / (precision + recall) if precision > 0 and recall > 0 else 0.0
+
+        latency = measure_latency(model, images, imgsz, half, device)
+
+        row = {
+            'device': device,
+            'imgsz': imgsz,
+            'half': half,
+            'cpu_threads': threads,
+            'mAP50': round(float(box.map50), 4),
+            'mAP50-95': round(float(box.map), 4),
+            'precision': round(precision, 4),
+            'recall': round(recall, 4),
+            'f1_score': round(f1, 4),
+            **latency,
+        }
+        rows.append(row)
+        print(f"       F1={row['f1_score']:.4f} mAP50={row['mAP50']:.4f} "
+              f"p50={row['p50_ms']:.1f}ms p95={row['p95_ms']:.1f}ms")
+
+    matrix_file = output_dir / 'operating_points.json'
+    with open(matrix_file, 'w', encoding='utf-8') as f:
+        json.dump({'model': str(model_path), 'results': rows}, f, indent=2, ensure_ascii=False)
+
+    print()
+    print("MATRIZ DE PUNTOS DE OPERACIÓN:")
+    print("-" * 60)
+    print(f"  {'device':<8} {'imgsz':>5} {'half':>5} {'hilos':>5} {'F1':>7} "
+          f"{'mAP50':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for row in rows:
+        print(f"  {row['device']:<8} {row['imgsz']:>5} {str(row['half']):>5} "
+              f"{str(row['cpu_threads'] or '-'):>5} {row['f1_score']:>7.4f} "
+              f"{row['mAP50']:>7.4f} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f}")
+    print()
+    print(f"[OK] Matriz guardada en: {matrix_file}")
+    print("Ajusta INFERENCE_IMGSZ, INFERENCE_HALF, INFERENCE_DEVICE e INFERENCE_CPU_THREADS")
+    print("en el .env de cada despliegue según el punto de operación elegido.")
+
+
+def main():
+    """Funcion principal."""
+    parser = argparse.ArgumentParser(
+        description='Evalua el modelo unificado en el conjunto de test'
+    )
+    parser.add_argument(
+        '--matrix',
+        action='store_true',
+        help='Generar la matriz precision/latencia por ajustes de inferencia'
+    )
+    parser.add_argument(
+        '--imgsz', type=int, nargs='+', default=[320, 480, 640],
+        help='Tamanos de entrada a evaluar'
+    )
+    parser.add_argument(
+        '--half', choices=['off', 'on', 'both'], default='both',
+        help='Evaluar FP16 (solo en GPU)'
+    )
+    parser.add_argument(
+        '--devices', nargs='+', default=None,
+        help='Dispositivos a evaluar (por defecto cpu y cuda:0 si esta disponible)'
+    )
+    parser.add_argument(
+        '--cpu-threads', type=int, nargs='*', default=[],
+        help='Hilos de CPU a evaluar (solo dispositivo cpu)'
+    )
+    parser.add_argument(
+        '--latency-images', type=int, default=50,
+        help='Imagenes de test usadas para medir latencia'
+    )
+
+    args = parser.parse_args()
+
+    if not args.matrix:
+        evaluate_unified_model()
+        return
+
+    devices = args.devices or (['cpu', 'cuda:0'] if torch.cuda.is_available() else ['cpu'])
+    half_options = {'off': [False], 'on': [True], 'both': [False, True]}[args.half]
+
+    evaluate_operating_points(
+        imgsz_list=args.imgsz,
+        half_options=half_options,
+        devices=devices,
+        cpu_threads=args.cpu_threads or [None],
+        latency_images=args.latency_images
+    )
+
+
 if __name__ == '__main__':
-    evaluate_unified_model()
+    main()
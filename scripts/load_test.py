@@ -0,0 +1,639 @@
+"""
+Pruebas de carga con barrido de concurrencia.
+
+Lanza clientes concurrentes (bucle cerrado: cada cliente envia la siguiente
+peticion al recibir la respuesta anterior) contra la API y mezcla los tipos
+de peticion segun las proporciones indicadas:
+
+- anonymize: POST /api/anonymize con una imagen JPEG sintetica
+- text: POST /api/analyze-text con texto con PII sintetico
+- video: POST /api/process-video con un video sintetico corto
+- ws: WebSocket /api/ws/process-video (hasta recibir el video procesado)
+
+Para cada nivel de concurrencia registra la latencia p50/p95/p99, la tasa
+de errores y el throughput (global y por tipo), y al final estima el codo
+de saturacion: el ultimo nivel a partir del cual anadir clientes ya no
+aumenta el throughput de forma significativa (o dispara los errores).
+
+Con --start-server arranca un Ollama simulado (respuestas fijas con un
+retardo configurable) y la API con uvicorn apuntando a el, de modo que la
+prueba no depende de un LLM real. Sin esa opcion se usa el servidor de --url.
+
+El JSON de resultados incluye las muestras por nivel y tipo en "results",
+con el mismo formato que benchmark_suite.py, por lo que se puede comparar
+con scripts/compare_benchmarks.py.
+
+Uso:
+    python scripts/load_test.py --start-server --concurrency 1 2 4 8 16
+    python scripts/load_test.py --url http://localhost:8000 \\
+        --mix anonymize=0.6,text=0.3,video=0.05,ws=0.05 --duration 30
+    python scripts/load_test.py --start-server --mix text=1 --requests 200 --ollama-delay-ms 300
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import httpx
+import numpy as np
+
+# scripts/ en el path para reutilizar las entradas sinteticas de la suite
+sys.path.insert(0, str(Path(__file__).parent))
+
+from benchmark_suite import synthetic_image, synthetic_text, synthetic_video
+
+
+BACKEND_DIR = Path(__file__).parent.parent / "backend"
+OUTPUT_DIR = Path(__file__).parent.parent / "tfm" / "benchmark_results"
+
+REQUEST_TYPES = ("anonymize", "text", "video", "ws")
+
+DEFAULT_MIX = "anonymize=0.6,text=0.3,video=0.05,ws=0.05"
+
+
+# ===== Ollama simulado =====
+
+class _StubOllamaHandler(BaseHTTPRequestHandler):
+    """Responde a /api/tags y /api/chat como Ollama, con un retardo fijo."""
+
+    delay_s = 0.0
+    model = "stub"
+
+    def _send_json(self, payload: dict, status: int = 200) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": self.model}]})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+
+        if self.path != "/api/chat":
+            self._send_json({"error": "not found"}, status=404)
+            return
+
+        time.sleep(self.delay_s)
+        self._send_json({
+            "model": self.model,
+            "message": {"role": "assistant", "content": json.dumps({"detections": []})},
+            "done": True,
+        })
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_ollama(port: int, delay_ms: float) -> ThreadingHTTPServer:
+    """
+    Arranca el Ollama simulado en un hilo.
+
+    Args:
+        port: Puerto local
+        delay_ms: Retardo de cada respuesta de /api/chat (simula la inferencia)
+
+    Returns:
+        Servidor (llamar a shutdown() al terminar)
+    """
+    handler = type("StubOllamaHandler", (_StubOllamaHandler,), {"delay_s": delay_ms / 1000.0})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-ollama", daemon=True).start()
+    return server
+
+
+# ===== Servidor de la API =====
+
+def free_port() -> int:
+    """Puerto TCP libre en localhost."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_api_server(port: int, ollama_url: str, workers: int, log_path: Path) -> subprocess.Popen:
+    """
+    Arranca la API con uvicorn en un subproceso.
+
+    Args:
+        port: Puerto local
+        ollama_url: URL del Ollama (simulado) para TextAnalyzer
+        workers: Procesos de uvicorn
+        log_path: Fichero donde se vuelca la salida del servidor
+
+    Returns:
+        Proceso del servidor
+    """
+    env = dict(os.environ, OLLAMA_URL=ollama_url)
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning",
+    ]
+    log_file = open(log_path, "wb")
+    return subprocess.Popen(
+        command, cwd=BACKEND_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT
+    )
+
+
+def wait_for_server(base_url: str, process: Optional[subprocess.Popen], timeout_s: float) -> None:
+    """
+    Espera a que /api/health responda.
+
+    Raises:
+        RuntimeError: Si el servidor termina o no responde a tiempo
+    """
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"El servidor termino con codigo {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/api/health", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"El servidor no respondio en {timeout_s:.0f}s")
+
+
+# ===== Peticiones =====
+
+class Payloads:
+    """Entradas sinteticas compartidas por todos los clientes."""
+
+    def __init__(self, image_size: Tuple[int, int], text_kb: int, video_frames: int,
+                 workdir: Path, seed: int):
+        width, height = image_size
+        ok, encoded = cv2.imencode(
+            ".jpg", synthetic_image(width, height, seed), [cv2.IMWRITE_JPEG_QUALITY, 90]
+        )
+        if not ok:
+            raise RuntimeError("No se pudo codificar la imagen sintetica")
+        self.image = encoded.tobytes()
+        self.text = synthetic_text(text_kb, seed)
+        self.video = synthetic_video(workdir / "load_test.mp4", video_frames, 320, 240).read_bytes()
+        self.video_b64 = base64.b64encode(self.video).decode("ascii")
+
+
+async def request_anonymize(client: httpx.AsyncClient, payloads: Payloads, args) -> None:
+    response = await client.post(
+        "/api/anonymize",
+        files={"file": ("load_test.jpg", payloads.image, "image/jpeg")},
+        data={"method": "blur"},
+    )
+    response.raise_for_status()
+
+
+async def request_text(client: httpx.AsyncClient, payloads: Payloads, args) -> None:
+    response = await client.post(
+        "/api/analyze-text",
+        json={"text": payloads.text, "detection_mode": args.text_mode, "omit_input": True},
+    )
+    response.raise_for_status()
+
+
+async def request_video(client: httpx.AsyncClient, payloads: Payloads, args) -> None:
+    response = await client.post(
+        "/api/process-video",
+        files={"file": ("load_test.mp4", payloads.video, "video/mp4")},
+        data={"anonymization_method": "blur"},
+    )
+    response.raise_for_status()
+
+
+async def request_ws(client: httpx.AsyncClient, payloads: Payloads, args) -> None:
+    import websockets
+
+    ws_url = str(client.base_url).replace("http", "ws", 1).rstrip("/") + "/api/ws/process-video"
+    async with websockets.connect(ws_url, max_size=None, open_timeout=args.timeout) as websocket:
+        await websocket.send(json.dumps({
+            "video_data": payloads.video_b64,
+            "filename": "load_test.mp4",
+            "enable_preview": False,
+        }))
+        while True:
+            message = json.loads(await websocket.recv())
+            if message.get("type") == "video":
+                return
+            if message.get("type") == "error":
+                raise RuntimeError(message.get("message", "error en WebSocket"))
+
+
+REQUESTS = {
+    "anonymize": request_anonymize,
+    "text": request_text,
+    "video": request_video,
+    "ws": request_ws,
+}
+
+
+def describe_error(error: Exception) -> str:
+    """Clave corta para agrupar errores (codigo HTTP o tipo de excepcion)."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"http_{error.response.status_code}"
+    return type(error).__name__
+
+
+# ===== Ejecucion de un nivel =====
+
+async def run_level(
+    base_url: str,
+    concurrency: int,
+    mix: Dict[str, float],
+    payloads: Payloads,
+    args,
+    seed: int
+) -> Tuple[List[dict], float]:
+    """
+    Ejecuta un nivel de concurrencia en bucle cerrado.
+
+    El nivel termina al agotar --duration (o al completar --requests). Las
+    peticiones que empiezan durante el calentamiento no se registran.
+
+    Returns:
+        Tupla (registros de peticiones, duracion medida en segundos)
+    """
+    rng = random.Random(seed)
+    types = list(mix)
+    weights = [mix[name] for name in types]
+
+    records: List[dict] = []
+    issued = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    measure_from = started + args.warmup
+    deadline = measure_from + args.duration if args.requests is None else float("inf")
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+
+        async def worker():
+            nonlocal issued
+            while loop.time() < deadline:
+                if args.requests is not None:
+                    if issued >= args.requests:
+                        return
+                    issued += 1
+
+                kind = rng.choices(types, weights)[0]
+                start = loop.time()
+                error = None
+                try:
+                    await asyncio.wait_for(REQUESTS[kind](client, payloads, args), args.timeout)
+                except Exception as e:
+                    error = describe_error(e)
+                end = loop.time()
+
+                if start >= measure_from or args.requests is not None:
+                    records.append({
+                        "type": kind,
+                        "start": start,
+                        "latency_ms": (end - start) * 1000,
+                        "error": error,
+                    })
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    finished = loop.time()
+    elapsed = finished - (started if args.requests is not None else measure_from)
+    return records, elapsed
+
+
+# ===== Estadisticas =====
+
+def summarize_records(records: List[dict], elapsed_s: float) -> Dict:
+    """
+    Estadisticas de un conjunto de peticiones.
+
+    Args:
+        records: Registros de run_level()
+        elapsed_s: Duracion del nivel
+
+    Returns:
+        Peticiones, errores, tasa de error, throughput (peticiones correctas/s)
+        y percentiles de latencia de las peticiones correctas
+    """
+    latencies = np.asarray(
+        [r["latency_ms"] for r in records if r["error"] is None], dtype=np.float64
+    )
+    errors: Dict[str, int] = {}
+    for record in records:
+        if record["error"] is not None:
+            errors[record["error"]] = errors.get(record["error"], 0) + 1
+
+    stats = {
+        "requests": len(records),
+        "errors": sum(errors.values()),
+        "error_rate": round(sum(errors.values()) / len(records), 4) if records else 0.0,
+        "error_kinds": errors,
+        "throughput_rps": round(latencies.size / elapsed_s, 3) if elapsed_s > 0 else 0.0,
+    }
+
+    if latencies.size:
+        stats.update({
+            "mean_ms": round(float(latencies.mean()), 2),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+            "max_ms": round(float(latencies.max()), 2),
+        })
+    return stats
+
+
+def find_knee(levels: List[Dict], min_gain: float, max_error_rate: float) -> Optional[Dict]:
+    """
+    Estima el codo de saturacion del barrido.
+
+    El codo es el ultimo nivel tras el cual el siguiente aumenta el
+    throughput menos de `min_gain` (relativo) o supera `max_error_rate`.
+    A partir de ahi, mas clientes solo aumentan la latencia (cola).
+
+    Args:
+        levels: Estadisticas globales por nivel, en orden de concurrencia
+        min_gain: Ganancia relativa minima de throughput para seguir escalando
+        max_error_rate: Tasa de error maxima aceptable
+
+    Returns:
+        Nivel del codo y motivo, o None si el barrido no llega a saturar
+    """
+    for previous, current in zip(levels, levels[1:]):
+        if current["error_rate"] > max_error_rate:
+            reason = (
+                f"tasa de error {current['error_rate']:.1%} "
+                f"con {current['concurrency']} clientes"
+            )
+        elif current["throughput_rps"] < previous["throughput_rps"] * (1 + min_gain):
+            gain = 0.0
+            if previous["throughput_rps"]:
+                gain = current["throughput_rps"] / previous["throughput_rps"] - 1
+            reason = f"throughput {gain:+.1%} con {current['concurrency']} clientes"
+        else:
+            continue
+
+        knee = {
+            "concurrency": previous["concurrency"],
+            "throughput_rps": previous["throughput_rps"],
+            "p95_ms": previous.get("p95_ms"),
+            "reason": reason,
+        }
+        if previous.get("p95_ms") and current.get("p95_ms"):
+            knee["p95_growth"] = round(current["p95_ms"] / previous["p95_ms"], 2)
+        return knee
+
+    return None
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Convierte 'anonymize=0.6,text=0.4' en proporciones normalizadas."""
+    mix: Dict[str, float] = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in REQUEST_TYPES:
+            raise argparse.ArgumentTypeError(
+                f"Tipo de peticion desconocido: {name} (validos: {', '.join(REQUEST_TYPES)})"
+            )
+        try:
+            mix[name] = float(weight) if weight else 1.0
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Proporcion invalida: {part}")
+
+    total = sum(mix.values())
+    if total <= 0:
+        raise argparse.ArgumentTypeError("Las proporciones deben sumar mas de 0")
+    return {name: weight / total for name, weight in mix.items() if weight > 0}
+
+
+def print_level(concurrency: int, stats: Dict, by_type: Dict[str, Dict]) -> None:
+    """Imprime la fila global y las filas por tipo de un nivel."""
+    def row(label, s):
+        if "p50_ms" not in s:
+            return (
+                f"  {label:<14} {'-':>9} {'-':>9} {'-':>9} {s['throughput_rps']:>9.2f} "
+                f"{s['error_rate']:>8.1%} {s['requests']:>7}"
+            )
+        return (
+            f"  {label:<14} {s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} {s['p99_ms']:>9.1f} "
+            f"{s['throughput_rps']:>9.2f} {s['error_rate']:>8.1%} {s['requests']:>7}"
+        )
+
+    print(row(f"c={concurrency}", stats))
+    for kind, type_stats in by_type.items():
+        print(row(f"  {kind}", type_stats))
+
+
+async def run_sweep(base_url: str, mix: Dict[str, float], payloads: Payloads, args) -> Dict:
+    """Ejecuta todos los niveles y agrega los resultados."""
+    levels: List[Dict] = []
+    results: Dict[str, Dict] = {}
+
+    print(
+        f"  {'nivel':<14} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} "
+        f"{'req/s':>9} {'errores':>8} {'total':>7}"
+    )
+    print("-" * 72)
+
+    for index, concurrency in enumerate(sorted(set(args.concurrency))):
+        records, elapsed = await run_level(
+            base_url, concurrency, mix, payloads, args, args.seed + index
+        )
+
+        stats = {
+            "concurrency": concurrency,
+            "elapsed_s": round(elapsed, 3),
+            **summarize_records(records, elapsed),
+        }
+        by_type = {}
+        for kind in mix:
+            type_records = [r for r in records if r["type"] == kind]
+            if not type_records:
+                continue
+            by_type[kind] = summarize_records(type_records, elapsed)
+            results[f"load.{kind}.c{concurrency}"] = {
+                "group": "load",
+                "concurrency": concurrency,
+                **by_type[kind],
+                "samples_ms": [
+                    round(r["latency_ms"], 3) for r in type_records if r["error"] is None
+                ],
+            }
+        stats["by_type"] = by_type
+        levels.append(stats)
+
+        print_level(concurrency, stats, by_type)
+
+        if args.stop_on_errors and stats["error_rate"] > args.max_error_rate:
+            print(f"[WARN] Tasa de error {stats['error_rate']:.1%}: se detiene el barrido")
+            break
+
+    return {"levels": levels, "results": results}
+
+
+def main():
+    """Funcion principal."""
+    parser = argparse.ArgumentParser(description="Pruebas de carga con barrido de concurrencia")
+    parser.add_argument("--url", default="http://localhost:8000",
+                        help="URL de la API (sin --start-server)")
+    parser.add_argument("--start-server", action="store_true",
+                        help="Arrancar la API con uvicorn y un Ollama simulado")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Procesos de uvicorn (--start-server)")
+    parser.add_argument("--ollama-delay-ms", type=float, default=200.0,
+                        help="Retardo de cada respuesta del Ollama simulado")
+    parser.add_argument("--server-timeout", type=float, default=120.0,
+                        help="Espera maxima al arranque del servidor (s)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Proporciones por tipo de peticion (por defecto {DEFAULT_MIX})")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16],
+                        help="Niveles de concurrencia (clientes simultaneos)")
+    parser.add_argument("--duration", type=float, default=20.0,
+                        help="Duracion medida de cada nivel (s)")
+    parser.add_argument("--requests", type=int, default=None,
+                        help="Peticiones por nivel (en lugar de --duration)")
+    parser.add_argument("--warmup", type=float, default=2.0,
+                        help="Calentamiento por nivel sin registrar (s, solo con --duration)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Timeout por peticion (s)")
+    parser.add_argument("--text-mode", choices=["regex", "llm", "both"], default="both",
+                        help="detection_mode de /api/analyze-text")
+    parser.add_argument("--text-kb", type=int, default=2, help="Tamano del texto sintetico (KB)")
+    parser.add_argument("--image-size", type=int, nargs=2, default=[640, 480],
+                        metavar=("ANCHO", "ALTO"),
+                        help="Tamano de la imagen sintetica")
+    parser.add_argument("--video-frames", type=int, default=15, help="Frames del video sintetico")
+    parser.add_argument("--knee-gain", type=float, default=0.10,
+                        help="Ganancia minima de throughput entre niveles sin saturacion")
+    parser.add_argument("--max-error-rate", type=float, default=0.01,
+                        help="Tasa de error aceptable")
+    parser.add_argument("--stop-on-errors", action="store_true",
+                        help="Detener el barrido al superar --max-error-rate")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Semilla de las entradas y de la mezcla")
+    parser.add_argument("--output", type=Path, default=None,
+                        help="Fichero JSON de resultados (por defecto en tfm/benchmark_results)")
+    args = parser.parse_args()
+
+    if any(level < 1 for level in args.concurrency):
+        parser.error("Los niveles de concurrencia deben ser >= 1")
+
+    print("=" * 72)
+    print("PRUEBA DE CARGA")
+    print("=" * 72)
+    print(f"Mezcla: {', '.join(f'{name}={weight:.0%}' for name, weight in args.mix.items())}")
+
+    stub = None
+    server = None
+    base_url = args.url.rstrip("/")
+
+    with tempfile.TemporaryDirectory(prefix="load_") as tmp_dir:
+        try:
+            if args.start_server:
+                stub_port = free_port()
+                stub = start_stub_ollama(stub_port, args.ollama_delay_ms)
+                api_port = free_port()
+                base_url = f"http://127.0.0.1:{api_port}"
+                log_path = Path(tmp_dir) / "server.log"
+                server = start_api_server(
+                    api_port, f"http://127.0.0.1:{stub_port}", args.workers, log_path
+                )
+                print(
+                    f"Servidor: {base_url} "
+                    f"(Ollama simulado en :{stub_port}, {args.ollama_delay_ms:.0f} ms)"
+                )
+                try:
+                    wait_for_server(base_url, server, args.server_timeout)
+                except RuntimeError as e:
+                    print(f"[ERROR] {e}")
+                    print(log_path.read_text(encoding="utf-8", errors="replace")[-2000:])
+                    sys.exit(1)
+            else:
+                print(f"Servidor: {base_url}")
+                try:
+                    wait_for_server(base_url, None, 5)
+                except RuntimeError as e:
+                    print(f"[ERROR] {e}")
+                    sys.exit(1)
+
+            payloads = Payloads(
+                tuple(args.image_size), args.text_kb, args.video_frames, Path(tmp_dir), args.seed
+            )
+            print()
+            sweep = asyncio.run(run_sweep(base_url, args.mix, payloads, args))
+
+        finally:
+            if server is not None:
+                server.terminate()
+                try:
+                    server.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+            if stub is not None:
+                stub.shutdown()
+
+    knee = find_knee(sweep["levels"], args.knee_gain, args.max_error_rate)
+    print()
+    if knee:
+        print(
+            f"Codo de saturacion: {knee['concurrency']} clientes "
+            f"({knee['throughput_rps']:.2f} req/s; siguiente nivel: {knee['reason']})"
+        )
+    else:
+        print("No se alcanzo la saturacion en el barrido (probar con mas concurrencia)")
+
+    report = {
+        "environment": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "cpu_count": os.cpu_count(),
+            "url": base_url,
+            "started_server": args.start_server,
+            "workers": args.workers if args.start_server else None,
+            "ollama_delay_ms": args.ollama_delay_ms if args.start_server else None,
+        },
+        "config": {
+            "mix": args.mix,
+            "concurrency": sorted(set(args.concurrency)),
+            "duration_s": args.duration if args.requests is None else None,
+            "requests": args.requests,
+            "warmup_s": args.warmup,
+            "text_mode": args.text_mode,
+            "text_kb": args.text_kb,
+            "image_size": args.image_size,
+            "video_frames": args.video_frames,
+            "seed": args.seed,
+        },
+        "knee": knee,
+        "levels": sweep["levels"],
+        "results": sweep["results"],
+    }
+
+    output = args.output or OUTPUT_DIR / f"load_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"\n[OK] Resultados guardados en {output}")
+
+
+if __name__ == "__main__":
+    main()